@@ -0,0 +1,123 @@
+"""Add email dedupe unique constraints
+
+Revision ID: 2f8c6e4a0b57
+Revises: 9a6d3f0b8e14
+Create Date: 2026-10-19 17:31:12.660384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8c6e4a0b57'
+down_revision: Union[str, Sequence[str], None] = '9a6d3f0b8e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _repoint_pins() -> None:
+    """Move email pins from duplicate threads to the thread that is kept.
+
+    A user who pinned several copies of one thread keeps a single pin;
+    the others are dropped and their email pinned_count lowered to match.
+    """
+    conn = op.get_bind()
+    keeper = dict(
+        conn.execute(
+            sa.text(
+                """
+                SELECT cur.id, MIN(keep.id)
+                FROM email_threads cur
+                JOIN email_threads keep
+                  ON keep.account_id = cur.account_id AND keep.thread_key = cur.thread_key AND keep.id < cur.id
+                GROUP BY cur.id
+                """
+            )
+        ).fetchall()
+    )
+    if not keeper:
+        return
+    pins = conn.execute(
+        sa.text("SELECT id, user_id, source_id FROM inbox_pins WHERE source = 'email' ORDER BY id")
+    ).fetchall()
+    taken = {(user_id, source_id) for _, user_id, source_id in pins if source_id not in keeper}
+    moved, dropped, unpinned = [], [], {}
+    for pin_id, user_id, source_id in pins:
+        if source_id not in keeper:
+            continue
+        target = (user_id, keeper[source_id])
+        if target in taken:
+            dropped.append({'pin_id': pin_id})
+            unpinned[user_id] = unpinned.get(user_id, 0) + 1
+        else:
+            taken.add(target)
+            moved.append({'pin_id': pin_id, 'thread_id': target[1]})
+    if dropped:
+        conn.execute(sa.text("DELETE FROM inbox_pins WHERE id = :pin_id"), dropped)
+    if moved:
+        conn.execute(sa.text("UPDATE inbox_pins SET source_id = :thread_id WHERE id = :pin_id"), moved)
+    if unpinned:
+        conn.execute(
+            sa.text(
+                "UPDATE inbox_counters SET pinned_count = pinned_count - :n "
+                "WHERE user_id = :user_id AND source = 'email'"
+            ),
+            [{'user_id': user_id, 'n': n} for user_id, n in unpinned.items()],
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Drop duplicate messages (keep the oldest row per Message-ID)
+    op.execute(
+        """
+        DELETE FROM email_messages
+        WHERE message_id IS NOT NULL
+          AND id NOT IN (
+            SELECT MIN(id) FROM email_messages
+            WHERE message_id IS NOT NULL
+            GROUP BY account_id, message_id
+          )
+        """
+    )
+    # Point messages and pins at the oldest thread with the same key, then drop the rest
+    op.execute(
+        """
+        UPDATE email_messages
+        SET thread_id = (
+            SELECT MIN(keep.id)
+            FROM email_threads keep
+            JOIN email_threads cur
+              ON cur.account_id = keep.account_id AND cur.thread_key = keep.thread_key
+            WHERE cur.id = email_messages.thread_id
+        )
+        WHERE thread_id IN (SELECT id FROM email_threads WHERE thread_key IS NOT NULL)
+        """
+    )
+    _repoint_pins()
+    op.execute(
+        """
+        DELETE FROM email_threads
+        WHERE thread_key IS NOT NULL
+          AND id NOT IN (
+            SELECT MIN(id) FROM email_threads
+            WHERE thread_key IS NOT NULL
+            GROUP BY account_id, thread_key
+          )
+        """
+    )
+    op.create_unique_constraint(
+        'uq_email_messages_account_message_id', 'email_messages', ['account_id', 'message_id']
+    )
+    op.create_unique_constraint(
+        'uq_email_threads_account_thread_key', 'email_threads', ['account_id', 'thread_key']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_email_threads_account_thread_key', 'email_threads', type_='unique')
+    op.drop_constraint('uq_email_messages_account_message_id', 'email_messages', type_='unique')
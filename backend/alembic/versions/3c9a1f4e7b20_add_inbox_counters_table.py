@@ -0,0 +1,44 @@
+"""Add inbox_counters table
+
+Revision ID: 3c9a1f4e7b20
+Revises: 7f3762eaadd8
+Create Date: 2026-10-19 09:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1f4e7b20'
+down_revision: Union[str, Sequence[str], None] = '7f3762eaadd8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Create inbox_counters table
+    op.create_table('inbox_counters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=50), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.Column('pinned_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'source', name='uq_inbox_counters_user_source')
+    )
+    op.create_index(op.f('ix_inbox_counters_id'), 'inbox_counters', ['id'], unique=False)
+    op.create_index(op.f('ix_inbox_counters_user_id'), 'inbox_counters', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop inbox_counters table
+    op.drop_index(op.f('ix_inbox_counters_user_id'), table_name='inbox_counters')
+    op.drop_index(op.f('ix_inbox_counters_id'), table_name='inbox_counters')
+    op.drop_table('inbox_counters')
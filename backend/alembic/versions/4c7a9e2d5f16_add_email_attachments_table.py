@@ -0,0 +1,50 @@
+"""Add email_attachments table
+
+Revision ID: 4c7a9e2d5f16
+Revises: 7b1e5d9c3a28
+Create Date: 2026-10-19 19:12:27.530418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7a9e2d5f16'
+down_revision: Union[str, Sequence[str], None] = '7b1e5d9c3a28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_attachments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=True),
+        sa.Column('account_id', sa.Integer(), nullable=True),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('content_type', sa.String(length=255), nullable=True),
+        sa.Column('content_id', sa.String(), nullable=True),
+        sa.Column('is_inline', sa.Boolean(), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['message_id'], ['email_messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_email_attachments_id'), 'email_attachments', ['id'], unique=False)
+    op.create_index(op.f('ix_email_attachments_message_id'), 'email_attachments', ['message_id'], unique=False)
+    op.create_index(op.f('ix_email_attachments_account_id'), 'email_attachments', ['account_id'], unique=False)
+    op.create_index(op.f('ix_email_attachments_sha256'), 'email_attachments', ['sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_email_attachments_sha256'), table_name='email_attachments')
+    op.drop_index(op.f('ix_email_attachments_account_id'), table_name='email_attachments')
+    op.drop_index(op.f('ix_email_attachments_message_id'), table_name='email_attachments')
+    op.drop_index(op.f('ix_email_attachments_id'), table_name='email_attachments')
+    op.drop_table('email_attachments')
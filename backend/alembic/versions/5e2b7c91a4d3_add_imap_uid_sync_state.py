@@ -0,0 +1,32 @@
+"""Add IMAP UID sync state
+
+Revision ID: 5e2b7c91a4d3
+Revises: c4e8a2d71f36
+Create Date: 2026-10-19 16:10:27.542190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b7c91a4d3'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2d71f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_accounts', sa.Column('imap_uidvalidity', sa.BigInteger(), nullable=True))
+    op.add_column('email_accounts', sa.Column('imap_last_uid', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('email_messages', sa.Column('imap_uid', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('email_messages', 'imap_uid')
+    op.drop_column('email_accounts', 'imap_last_uid')
+    op.drop_column('email_accounts', 'imap_uidvalidity')
@@ -0,0 +1,55 @@
+"""Add outbound_emails queue table
+
+Revision ID: 6d2f8b4e1a93
+Revises: 4c7a9e2d5f16
+Create Date: 2026-10-19 19:48:06.114927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f8b4e1a93'
+down_revision: Union[str, Sequence[str], None] = '4c7a9e2d5f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('outbound_emails',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=True),
+        sa.Column('batch_id', sa.String(length=36), nullable=True),
+        sa.Column('to_email', sa.String(), nullable=False),
+        sa.Column('subject', sa.String(), nullable=True),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('is_html', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('claimed_by', sa.String(length=36), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbound_emails_id'), 'outbound_emails', ['id'], unique=False)
+    op.create_index(op.f('ix_outbound_emails_account_id'), 'outbound_emails', ['account_id'], unique=False)
+    op.create_index(op.f('ix_outbound_emails_batch_id'), 'outbound_emails', ['batch_id'], unique=False)
+    op.create_index(op.f('ix_outbound_emails_status'), 'outbound_emails', ['status'], unique=False)
+    op.create_index(op.f('ix_outbound_emails_next_attempt_at'), 'outbound_emails', ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_outbound_emails_next_attempt_at'), table_name='outbound_emails')
+    op.drop_index(op.f('ix_outbound_emails_status'), table_name='outbound_emails')
+    op.drop_index(op.f('ix_outbound_emails_batch_id'), table_name='outbound_emails')
+    op.drop_index(op.f('ix_outbound_emails_account_id'), table_name='outbound_emails')
+    op.drop_index(op.f('ix_outbound_emails_id'), table_name='outbound_emails')
+    op.drop_table('outbound_emails')
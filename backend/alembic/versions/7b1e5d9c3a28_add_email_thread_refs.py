@@ -0,0 +1,96 @@
+"""Add email_thread_refs index and thread subject_key
+
+Revision ID: 7b1e5d9c3a28
+Revises: 2f8c6e4a0b57
+Create Date: 2026-10-19 18:05:43.918275
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e5d9c3a28'
+down_revision: Union[str, Sequence[str], None] = '2f8c6e4a0b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of services.email_threading.normalize_subject, so the
+# backfill doesn't change if the service does.
+_REPLY_PREFIX_RE = re.compile(r"^\s*((re|fw|fwd|aw|sv|wg)(\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+_LIST_TAG_RE = re.compile(r"^\s*\[[^\]]{1,40}\]\s*")
+_BACKFILL_BATCH = 1000
+
+
+def _subject_key(subject):
+    text = subject or ""
+    while True:
+        stripped = _LIST_TAG_RE.sub("", text, count=1)
+        m = _REPLY_PREFIX_RE.match(stripped)
+        if m:
+            stripped = stripped[m.end():]
+        if stripped == text:
+            break
+        text = stripped
+    return " ".join(text.lower().split())[:255]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_threads', sa.Column('subject_key', sa.String(length=255), nullable=True))
+    op.create_index(op.f('ix_email_threads_subject_key'), 'email_threads', ['subject_key'], unique=False)
+
+    op.create_table('email_thread_refs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.String(), nullable=False),
+        sa.Column('thread_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['email_accounts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['thread_id'], ['email_threads.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'message_id', name='uq_email_thread_refs_account_message_id')
+    )
+    op.create_index(op.f('ix_email_thread_refs_id'), 'email_thread_refs', ['id'], unique=False)
+    op.create_index(op.f('ix_email_thread_refs_thread_id'), 'email_thread_refs', ['thread_id'], unique=False)
+
+    # Seed the index with already-imported messages so replies to them join their threads
+    op.execute(
+        """
+        INSERT INTO email_thread_refs (account_id, message_id, thread_id)
+        SELECT account_id, message_id, thread_id
+        FROM email_messages
+        WHERE message_id IS NOT NULL AND thread_id IS NOT NULL
+        """
+    )
+
+    # Key existing threads too, so replies matched by subject can find them
+    threads = sa.table(
+        'email_threads',
+        sa.column('id', sa.Integer),
+        sa.column('subject', sa.String),
+        sa.column('subject_key', sa.String),
+    )
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(threads.c.id, threads.c.subject)).fetchall()
+    update = (
+        threads.update()
+        .where(threads.c.id == sa.bindparam('thread_id'))
+        .values(subject_key=sa.bindparam('key'))
+    )
+    for i in range(0, len(rows), _BACKFILL_BATCH):
+        conn.execute(
+            update,
+            [{'thread_id': id_, 'key': _subject_key(subject)} for id_, subject in rows[i : i + _BACKFILL_BATCH]],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_email_thread_refs_thread_id'), table_name='email_thread_refs')
+    op.drop_index(op.f('ix_email_thread_refs_id'), table_name='email_thread_refs')
+    op.drop_table('email_thread_refs')
+    op.drop_index(op.f('ix_email_threads_subject_key'), table_name='email_threads')
+    op.drop_column('email_threads', 'subject_key')
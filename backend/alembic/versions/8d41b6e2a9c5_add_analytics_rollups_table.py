@@ -0,0 +1,46 @@
+"""Add analytics_rollups table and tasks.created_at
+
+Revision ID: 8d41b6e2a9c5
+Revises: 3c9a1f4e7b20
+Create Date: 2026-10-19 11:03:27.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41b6e2a9c5'
+down_revision: Union[str, Sequence[str], None] = '3c9a1f4e7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing tasks have no record of when they were created, so they keep
+    # NULL (analytics skip them); only new rows get the default.
+    op.add_column('tasks', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.alter_column('tasks', 'created_at', server_default=sa.text('(CURRENT_TIMESTAMP)'))
+
+    # Create analytics_rollups table
+    op.create_table('analytics_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('metric', sa.String(length=50), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'metric', 'bucket_start', name='uq_analytics_rollups_bucket')
+    )
+    op.create_index(op.f('ix_analytics_rollups_id'), 'analytics_rollups', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop analytics_rollups table
+    op.drop_index(op.f('ix_analytics_rollups_id'), table_name='analytics_rollups')
+    op.drop_table('analytics_rollups')
+    op.drop_column('tasks', 'created_at')
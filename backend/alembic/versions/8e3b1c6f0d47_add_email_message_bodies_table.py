@@ -0,0 +1,36 @@
+"""Add email_message_bodies table
+
+Revision ID: 8e3b1c6f0d47
+Revises: 6d2f8b4e1a93
+Create Date: 2026-10-19 20:31:52.608143
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e3b1c6f0d47'
+down_revision: Union[str, Sequence[str], None] = '6d2f8b4e1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_message_bodies',
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('codec', sa.String(length=8), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('text_plain', sa.LargeBinary(), nullable=True),
+        sa.Column('text_html', sa.LargeBinary(), nullable=True),
+        sa.ForeignKeyConstraint(['message_id'], ['email_messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('message_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('email_message_bodies')
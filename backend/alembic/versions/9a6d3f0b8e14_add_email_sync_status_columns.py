@@ -0,0 +1,38 @@
+"""Add email sync status columns
+
+Revision ID: 9a6d3f0b8e14
+Revises: 5e2b7c91a4d3
+Create Date: 2026-10-19 16:48:55.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6d3f0b8e14'
+down_revision: Union[str, Sequence[str], None] = '5e2b7c91a4d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_accounts', sa.Column('sync_status', sa.String(length=16), server_default='idle', nullable=False))
+    op.add_column('email_accounts', sa.Column('last_synced_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('email_accounts', sa.Column('next_sync_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('email_accounts', sa.Column('last_sync_error', sa.Text(), nullable=True))
+    op.add_column('email_accounts', sa.Column('sync_failures', sa.Integer(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_email_accounts_next_sync_at'), 'email_accounts', ['next_sync_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_email_accounts_next_sync_at'), table_name='email_accounts')
+    op.drop_column('email_accounts', 'sync_failures')
+    op.drop_column('email_accounts', 'last_sync_error')
+    op.drop_column('email_accounts', 'next_sync_at')
+    op.drop_column('email_accounts', 'last_synced_at')
+    op.drop_column('email_accounts', 'sync_status')
@@ -0,0 +1,28 @@
+"""Add email sync pending flag
+
+Revision ID: a3c7e5d91f20
+Revises: f4d8a2b6c0e7
+Create Date: 2026-10-20 09:12:40.581306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e5d91f20'
+down_revision: Union[str, Sequence[str], None] = 'f4d8a2b6c0e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_accounts', sa.Column('sync_pending', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('email_accounts', 'sync_pending')
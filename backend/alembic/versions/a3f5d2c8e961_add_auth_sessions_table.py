@@ -0,0 +1,47 @@
+"""Add auth_sessions table
+
+Revision ID: a3f5d2c8e961
+Revises: 8e3b1c6f0d47
+Create Date: 2026-10-19 21:40:18.274051
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f5d2c8e961'
+down_revision: Union[str, Sequence[str], None] = '8e3b1c6f0d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('auth_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('user_agent', sa.String(length=255), nullable=True),
+        sa.Column('ip_address', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_auth_sessions_id'), 'auth_sessions', ['id'], unique=False)
+    op.create_index(op.f('ix_auth_sessions_jti'), 'auth_sessions', ['jti'], unique=True)
+    op.create_index(op.f('ix_auth_sessions_user_id'), 'auth_sessions', ['user_id'], unique=False)
+    op.create_index(op.f('ix_auth_sessions_revoked_at'), 'auth_sessions', ['revoked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_auth_sessions_revoked_at'), table_name='auth_sessions')
+    op.drop_index(op.f('ix_auth_sessions_user_id'), table_name='auth_sessions')
+    op.drop_index(op.f('ix_auth_sessions_jti'), table_name='auth_sessions')
+    op.drop_index(op.f('ix_auth_sessions_id'), table_name='auth_sessions')
+    op.drop_table('auth_sessions')
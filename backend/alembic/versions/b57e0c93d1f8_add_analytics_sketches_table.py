@@ -0,0 +1,42 @@
+"""Add analytics_sketches table
+
+Revision ID: b57e0c93d1f8
+Revises: 8d41b6e2a9c5
+Create Date: 2026-10-19 13:26:08.331452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b57e0c93d1f8'
+down_revision: Union[str, Sequence[str], None] = '8d41b6e2a9c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Create analytics_sketches table
+    op.create_table('analytics_sketches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(length=50), nullable=False),
+        sa.Column('segment', sa.String(length=64), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('exact_ids', sa.Text(), nullable=True),
+        sa.Column('registers', sa.LargeBinary(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('metric', 'segment', 'bucket_start', name='uq_analytics_sketches_bucket')
+    )
+    op.create_index(op.f('ix_analytics_sketches_id'), 'analytics_sketches', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop analytics_sketches table
+    op.drop_index(op.f('ix_analytics_sketches_id'), table_name='analytics_sketches')
+    op.drop_table('analytics_sketches')
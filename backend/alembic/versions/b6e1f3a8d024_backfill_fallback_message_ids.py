@@ -0,0 +1,60 @@
+"""Backfill fallback Message-IDs for email without one
+
+Revision ID: b6e1f3a8d024
+Revises: a3c7e5d91f20
+Create Date: 2026-10-20 11:03:27.194620
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1f3a8d024'
+down_revision: Union[str, Sequence[str], None] = 'a3c7e5d91f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_SUFFIX = '@no-message-id>'
+_BACKFILL_BATCH = 1000
+
+
+def _fallback_message_id(from_email, to_email, date_raw, subject, preview):
+    # Frozen copy of services.email_integration_service._fallback_message_id.
+    fields = (v or "" for v in (from_email, to_email, date_raw, subject, preview))
+    return f"<{hashlib.sha256(chr(0).join(fields).encode()).hexdigest()[:32]}{_SUFFIX}"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Give already-imported messages the key new syncs compute, so they are
+    # recognised when a UIDVALIDITY reset brings them back. Copies that were
+    # already imported twice keep a NULL Message-ID on all but the first.
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text(
+            "SELECT id, account_id, from_email, to_email, date_raw, subject, body_preview "
+            "FROM email_messages WHERE message_id IS NULL ORDER BY id"
+        )
+    ).fetchall()
+    seen = set()
+    updates = []
+    for id_, account_id, *fields in rows:
+        key = (account_id, _fallback_message_id(*fields))
+        if key in seen:
+            continue
+        seen.add(key)
+        updates.append({'id': id_, 'message_id': key[1]})
+    for i in range(0, len(updates), _BACKFILL_BATCH):
+        conn.execute(
+            sa.text("UPDATE email_messages SET message_id = :message_id WHERE id = :id"),
+            updates[i : i + _BACKFILL_BATCH],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"UPDATE email_messages SET message_id = NULL WHERE message_id LIKE '%{_SUFFIX}'")
@@ -0,0 +1,40 @@
+"""Add segment to analytics_rollups
+
+Revision ID: c4e8a2d71f36
+Revises: b57e0c93d1f8
+Create Date: 2026-10-19 15:02:41.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d71f36'
+down_revision: Union[str, Sequence[str], None] = 'b57e0c93d1f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing buckets have no per-segment rows; clear them so the startup
+    # backfill rebuilds every segment from the source tables.
+    op.execute("DELETE FROM analytics_rollups")
+    op.add_column('analytics_rollups', sa.Column('segment', sa.String(length=64), server_default='all', nullable=False))
+    op.drop_constraint('uq_analytics_rollups_bucket', 'analytics_rollups', type_='unique')
+    op.create_unique_constraint(
+        'uq_analytics_rollups_bucket', 'analytics_rollups', ['granularity', 'metric', 'segment', 'bucket_start']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM analytics_rollups WHERE segment <> 'all'")
+    op.drop_constraint('uq_analytics_rollups_bucket', 'analytics_rollups', type_='unique')
+    op.create_unique_constraint(
+        'uq_analytics_rollups_bucket', 'analytics_rollups', ['granularity', 'metric', 'bucket_start']
+    )
+    op.drop_column('analytics_rollups', 'segment')
@@ -0,0 +1,59 @@
+"""Add trigram indexes for inbox search
+
+Revision ID: c5a9d7e2f318
+Revises: b6e1f3a8d024
+Create Date: 2026-10-20 12:41:09.806153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a9d7e2f318'
+down_revision: Union[str, Sequence[str], None] = 'b6e1f3a8d024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_messages_content_trgm', 'messages', 'content'),
+    ('ix_notifications_title_trgm', 'notifications', 'title'),
+    ('ix_notifications_preview_trgm', 'notifications', 'preview'),
+    ('ix_email_threads_subject_trgm', 'email_threads', 'subject'),
+    ('ix_email_threads_snippet_trgm', 'email_threads', 'snippet'),
+    ('ix_tasks_title_trgm', 'tasks', 'title'),
+    ('ix_tasks_description_trgm', 'tasks', 'description'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GIN trigram indexes serve the inbox's ILIKE '%q%' search. Without
+    # pg_trgm (contrib) search keeps scanning, as on other databases.
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    try:
+        with conn.begin_nested():
+            conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except sa.exc.DBAPIError as e:
+        print(f"pg_trgm unavailable, skipping inbox search indexes: {e.orig}")
+        return
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name, table, [column], unique=False,
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,87 @@
+"""Add indexes for hot query paths
+
+Revision ID: f4d8a2b6c0e7
+Revises: c81e4a7f2b35
+Create Date: 2026-10-19 23:02:15.318774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4d8a2b6c0e7'
+down_revision: Union[str, Sequence[str], None] = 'c81e4a7f2b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_messages_channel_id_timestamp', 'messages', ['channel_id', 'timestamp']),
+    ('ix_messages_sender_id', 'messages', ['sender_id']),
+    ('ix_notifications_user_id_is_read_created_at', 'notifications', ['user_id', 'is_read', 'created_at']),
+    ('ix_email_messages_thread_id_is_read', 'email_messages', ['thread_id', 'is_read']),
+    ('ix_email_threads_account_id_updated_at', 'email_threads', ['account_id', 'updated_at']),
+    ('ix_tasks_assigned_user_id', 'tasks', ['assigned_user_id']),
+]
+# Leading columns of the new composite indexes.
+REDUNDANT_INDEXES = [
+    ('ix_email_messages_thread_id', 'email_messages', ['thread_id']),
+    ('ix_email_threads_account_id', 'email_threads', ['account_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep one membership per (user, channel) before adding the unique
+    # constraint; the survivor stays owner if any duplicate was.
+    op.execute(
+        """
+        UPDATE channel_members SET role = 'owner'
+        WHERE id IN (
+            SELECT MIN(id) FROM channel_members
+            GROUP BY user_id, channel_id
+            HAVING COUNT(*) > 1 AND SUM(CASE WHEN role = 'owner' THEN 1 ELSE 0 END) > 0
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM channel_members
+        WHERE id NOT IN (SELECT MIN(id) FROM channel_members GROUP BY user_id, channel_id)
+        """
+    )
+
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # CREATE INDEX CONCURRENTLY can't run in a transaction; it builds
+    # without blocking writes to these (large, busy) tables.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        if postgres:
+            op.create_index(
+                'uq_channel_members_user_channel', 'channel_members', ['user_id', 'channel_id'],
+                unique=True, postgresql_concurrently=True,
+            )
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    if postgres:
+        op.execute(
+            'ALTER TABLE channel_members ADD CONSTRAINT uq_channel_members_user_channel '
+            'UNIQUE USING INDEX uq_channel_members_user_channel'
+        )
+    else:
+        op.create_unique_constraint('uq_channel_members_user_channel', 'channel_members', ['user_id', 'channel_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_channel_members_user_channel', 'channel_members', type_='unique')
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT_INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
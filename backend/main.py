@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from database import engine, Base
+from database import engine, Base, SessionLocal, ReadYourWritesMiddleware
 from routers import auth, tasks, chat, channels, notifications
 from routers.ws_notifications import router as ws_notifications_router
 from routers.ws_chat import router as ws_chat_router
@@ -18,6 +18,11 @@ from routers.settings import router as settings_router
 from routers.analytics import router as analytics_router
 from routers.profile import router as profile_router
 from routers.users import router as users_router
+from services.analytics_rollup_service import AnalyticsRollupService, active_user_recorder
+from services.email_sync_scheduler import EMAIL_SYNC_ENABLED, email_sync_scheduler
+from services.email_idle_listener import EMAIL_IDLE_ENABLED, email_idle_listener
+from services.email_outbox import EMAIL_OUTBOX_ENABLED, email_outbox
+from services.api_keys import api_key_usage
 
 Base.metadata.create_all(bind=engine)
 
@@ -30,6 +35,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
 
 # Serve uploaded files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -56,6 +62,52 @@ app.include_router(profile_router)
 app.include_router(users_router)
 
 
+@app.on_event("startup")
+def seed_analytics_rollups():
+    db = SessionLocal()
+    try:
+        AnalyticsRollupService(db).ensure_backfilled()
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_email_sync():
+    if EMAIL_SYNC_ENABLED:
+        email_sync_scheduler.start()
+        # IDLE only makes accounts due; the scheduler does the actual sync.
+        if EMAIL_IDLE_ENABLED:
+            email_idle_listener.start()
+
+
+@app.on_event("startup")
+def start_email_outbox():
+    if EMAIL_OUTBOX_ENABLED:
+        email_outbox.start()
+
+
+@app.on_event("shutdown")
+def stop_email_sync():
+    email_idle_listener.stop()
+    email_sync_scheduler.stop()
+    email_outbox.stop()
+
+
+@app.on_event("startup")
+def start_api_key_usage():
+    api_key_usage.start()
+
+
+@app.on_event("shutdown")
+def stop_api_key_usage():
+    api_key_usage.stop()
+
+
+@app.on_event("shutdown")
+def stop_active_user_recorder():
+    active_user_recorder.stop()
+
+
 @app.get("/")
 def read_root():
     return {"message": "TeamOS Python Backend is Running! 🚀"}
\ No newline at end of file
@@ -1,10 +1,37 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Boolean, Text, LargeBinary, UniqueConstraint, Index, event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 from database import Base
 import datetime
 
 
+# Inbox search filters text columns with ILIKE '%q%', which only a trigram
+# index can serve. PostgreSQL only, and only where the pg_trgm extension
+# (contrib) can be installed; elsewhere search keeps scanning.
+@event.listens_for(Base.metadata, "before_create")
+def _create_pg_trgm(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DBAPIError as e:
+        print(f"pg_trgm unavailable, inbox search is not indexed: {e.orig}")
+
+
+def _has_pg_trgm(ddl, target, bind, **kw) -> bool:
+    return bind.dialect.name == "postgresql" and bind.exec_driver_sql(
+        "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+    ).first() is not None
+
+
+def _trigram_index(name: str, column: str) -> Index:
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}).ddl_if(
+        callable_=_has_pg_trgm
+    )
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -29,15 +56,51 @@ class User(Base):
     projects = relationship("Project", back_populates="owner", cascade="all, delete")
 
 
+class AuthSession(Base):
+    """One issued access token (by its jti), so it can be listed and revoked."""
+
+    __tablename__ = "auth_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(36), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    user_agent = Column(String(255), nullable=True)
+    ip_address = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+
+class ApiKey(Base):
+    """Long-lived key for bots and integrations; only a SHA-256 of the key is stored."""
+
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    name = Column(String(100), nullable=False)
+    # Public part of the key ("tk_<prefix>_..."), used to find the row.
+    prefix = Column(String(16), unique=True, index=True, nullable=False)
+    key_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        _trigram_index("ix_tasks_title_trgm", "title"),
+        _trigram_index("ix_tasks_description_trgm", "description"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     description = Column(String, default="")
     status = Column(String, default="TODO")  # TODO, IN_PROGRESS, DONE
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    assigned_user_id = Column(Integer, ForeignKey("users.id"))
+    assigned_user_id = Column(Integer, ForeignKey("users.id"), index=True)
     assigned_user = relationship("User", back_populates="tasks")
 
 
@@ -54,6 +117,9 @@ class Channel(Base):
 
 class ChannelMember(Base):
     __tablename__ = "channel_members"
+    __table_args__ = (
+        UniqueConstraint("user_id", "channel_id", name="uq_channel_members_user_channel"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -66,6 +132,10 @@ class ChannelMember(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_channel_id_timestamp", "channel_id", "timestamp"),
+        _trigram_index("ix_messages_content_trgm", "content"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String)
@@ -73,7 +143,7 @@ class Message(Base):
     message_type = Column(String, default="text")
     thread_id = Column(Integer, nullable=True)
 
-    sender_id = Column(Integer, ForeignKey("users.id"))
+    sender_id = Column(Integer, ForeignKey("users.id"), index=True)
     channel_id = Column(Integer, ForeignKey("channels.id"))
 
     sender = relationship("User", back_populates="messages")
@@ -96,6 +166,11 @@ class FileAttachment(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),
+        _trigram_index("ix_notifications_title_trgm", "title"),
+        _trigram_index("ix_notifications_preview_trgm", "preview"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -124,6 +199,22 @@ class InboxPin(Base):
     user = relationship("User")
 
 
+class InboxCounter(Base):
+    __tablename__ = "inbox_counters"
+    __table_args__ = (
+        UniqueConstraint("user_id", "source", name="uq_inbox_counters_user_source"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    source = Column(String(50), nullable=False)  # 'chat', 'notification', 'email', 'task'
+    unread_count = Column(Integer, default=0, nullable=False)
+    pinned_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    user = relationship("User")
+
+
 class UserPreference(Base):
     __tablename__ = "user_preferences"
 
@@ -159,6 +250,19 @@ class EmailAccount(Base):
     smtp_use_tls = Column(Boolean, default=True)
     from_email = Column(String, nullable=True)
 
+    # IMAP sync position: UIDs are only comparable within one UIDVALIDITY
+    imap_uidvalidity = Column(BigInteger, nullable=True)
+    imap_last_uid = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    # Background sync bookkeeping (see services/email_sync_scheduler.py)
+    sync_status = Column(String(16), default="idle", server_default="idle", nullable=False)  # idle, syncing, error
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    next_sync_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    last_sync_error = Column(Text, nullable=True)
+    sync_failures = Column(Integer, default=0, server_default="0", nullable=False)
+    # New mail was pushed while a sync was running; sync again when it finishes.
+    sync_pending = Column(Boolean, default=False, server_default=false(), nullable=False)
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -169,12 +273,19 @@ class EmailAccount(Base):
 
 class EmailThread(Base):
     __tablename__ = "email_threads"
+    __table_args__ = (
+        UniqueConstraint("account_id", "thread_key", name="uq_email_threads_account_thread_key"),
+        Index("ix_email_threads_account_id_updated_at", "account_id", "updated_at"),
+        _trigram_index("ix_email_threads_subject_trgm", "subject"),
+        _trigram_index("ix_email_threads_snippet_trgm", "snippet"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"), index=True)
+    account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"))
 
     thread_key = Column(String, index=True)
     subject = Column(String, default="")
+    subject_key = Column(String(255), nullable=True, index=True)  # normalized, without Re:/Fwd:
     snippet = Column(Text, default="")
     last_from = Column(String, default="")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -183,14 +294,33 @@ class EmailThread(Base):
     messages = relationship("EmailMessage", back_populates="thread", cascade="all, delete")
 
 
+class EmailThreadRef(Base):
+    """Message-ID -> thread index, including ids only seen in References."""
+
+    __tablename__ = "email_thread_refs"
+    __table_args__ = (
+        UniqueConstraint("account_id", "message_id", name="uq_email_thread_refs_account_message_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"), nullable=False)
+    message_id = Column(String, nullable=False)
+    thread_id = Column(Integer, ForeignKey("email_threads.id", ondelete="CASCADE"), nullable=False, index=True)
+
+
 class EmailMessage(Base):
     __tablename__ = "email_messages"
+    __table_args__ = (
+        UniqueConstraint("account_id", "message_id", name="uq_email_messages_account_message_id"),
+        Index("ix_email_messages_thread_id_is_read", "thread_id", "is_read"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"), index=True)
-    thread_id = Column(Integer, ForeignKey("email_threads.id", ondelete="CASCADE"), index=True)
+    thread_id = Column(Integer, ForeignKey("email_threads.id", ondelete="CASCADE"))
 
     message_id = Column(String, nullable=True, index=True)
+    imap_uid = Column(BigInteger, nullable=True)
     subject = Column(String, default="")
     from_email = Column(String, default="")
     to_email = Column(String, default="")
@@ -201,6 +331,60 @@ class EmailMessage(Base):
 
     account = relationship("EmailAccount", back_populates="messages")
     thread = relationship("EmailThread", back_populates="messages")
+    attachments = relationship("EmailAttachment", back_populates="message", passive_deletes=True)
+
+
+class EmailAttachment(Base):
+    __tablename__ = "email_attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_id = Column(Integer, ForeignKey("email_messages.id", ondelete="CASCADE"), index=True)
+    account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"), index=True)
+
+    filename = Column(String, default="")
+    content_type = Column(String(255), default="application/octet-stream")
+    content_id = Column(String, nullable=True)
+    is_inline = Column(Boolean, default=False)
+    size = Column(BigInteger, default=0)
+    # Files are stored once per content hash under EMAIL_ATTACHMENT_DIR.
+    sha256 = Column(String(64), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    message = relationship("EmailMessage", back_populates="attachments")
+
+
+class EmailMessageBody(Base):
+    """Full compressed bodies, kept apart so email_messages rows stay narrow."""
+
+    __tablename__ = "email_message_bodies"
+
+    message_id = Column(Integer, ForeignKey("email_messages.id", ondelete="CASCADE"), primary_key=True)
+    codec = Column(String(8), default="zlib")  # zlib, zstd or none
+    size = Column(Integer, default=0)  # uncompressed bytes
+    text_plain = Column(LargeBinary, nullable=True)
+    text_html = Column(LargeBinary, nullable=True)
+
+
+class OutboundEmail(Base):
+    __tablename__ = "outbound_emails"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("email_accounts.id", ondelete="CASCADE"), index=True)
+    # Set for mail-merge sends so the whole batch can be tracked together.
+    batch_id = Column(String(36), nullable=True, index=True)
+
+    to_email = Column(String, nullable=False)
+    subject = Column(String, default="")
+    body = Column(Text, default="")
+    is_html = Column(Boolean, default=False)
+
+    status = Column(String(16), default="queued", index=True)  # queued, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    claimed_by = Column(String(36), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
 
 
 class Document(Base):
@@ -334,4 +518,33 @@ class ProjectCard(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    project = relationship("Project", back_populates="cards")
\ No newline at end of file
+    project = relationship("Project", back_populates="cards")
+
+
+class AnalyticsRollup(Base):
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "metric", "segment", "bucket_start", name="uq_analytics_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(8), nullable=False)  # 'hour', 'day'
+    metric = Column(String(50), nullable=False)  # 'messages', 'documents', 'tasks', ...
+    segment = Column(String(64), nullable=False, default="all", server_default="all")  # 'all', 'channel:<id>', ...
+    bucket_start = Column(DateTime, nullable=False)  # UTC, truncated to the granularity
+    count = Column(BigInteger, default=0, nullable=False)
+
+
+class AnalyticsSketch(Base):
+    __tablename__ = "analytics_sketches"
+    __table_args__ = (
+        UniqueConstraint("metric", "segment", "bucket_start", name="uq_analytics_sketches_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    metric = Column(String(50), nullable=False)  # 'active_users'
+    segment = Column(String(64), nullable=False, default="all")  # 'all', 'channel:<id>'
+    bucket_start = Column(DateTime, nullable=False)  # UTC day
+    exact_ids = Column(Text, nullable=True)  # comma-separated ids while the set is small
+    registers = Column(LargeBinary, nullable=True)  # HyperLogLog registers once it is not
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
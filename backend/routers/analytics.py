@@ -1,126 +1,196 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
+from sqlalchemy import func, and_, literal, select, union_all
+from typing import Dict, Any, List, Optional
+from datetime import date, datetime, timedelta, timezone
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from services.analytics_rollup_service import AnalyticsRollupService, validate_segment
+from services.analytics_export_service import EXPORT_DATASETS, EXPORT_FORMATS, STREAMERS
+from services.cache import TTLCache
+from services.engagement_analytics_service import RESPONSE_TIMES_MAX_DAYS, EngagementAnalyticsService
+from services.inbox_summary_service import InboxSummaryService
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
+OVERVIEW_TTL_SECONDS = 15
+
+# Workspace-wide part of the overview, shared by every user.
+_overview_cache = TTLCache(maxsize=8, ttl=OVERVIEW_TTL_SECONDS)
+
+
+def _load_overview_snapshot(db: Session) -> Dict[str, Any]:
+    counts = db.query(
+        select(func.count(models.Task.id)).scalar_subquery(),
+        select(func.count(models.Task.id)).where(models.Task.status != 'DONE').scalar_subquery(),
+        select(func.count(models.Document.id)).scalar_subquery(),
+    ).one()
+    total_tasks, open_tasks, files_shared = counts
+
+    recent_tasks = (
+        select(
+            literal("task").label("type"),
+            models.Task.id.label("id"),
+            models.Task.title.label("title"),
+            models.Task.created_at.label("at"),
+        )
+        .where(models.Task.created_at.isnot(None))
+        .order_by(models.Task.created_at.desc())
+        .limit(5)
+        .subquery()
+    )
+    recent_messages = (
+        select(
+            literal("message").label("type"),
+            models.Message.id.label("id"),
+            models.Channel.name.label("title"),
+            models.Message.timestamp.label("at"),
+        )
+        .outerjoin(models.Channel, models.Message.channel_id == models.Channel.id)
+        .order_by(models.Message.timestamp.desc())
+        .limit(5)
+        .subquery()
+    )
+    recent_docs = (
+        select(
+            literal("file").label("type"),
+            models.Document.id.label("id"),
+            models.Document.title.label("title"),
+            models.Document.created_at.label("at"),
+        )
+        .order_by(models.Document.created_at.desc())
+        .limit(3)
+        .subquery()
+    )
+    rows = db.execute(
+        union_all(*(select(sq.c.type, sq.c.id, sq.c.title, sq.c.at) for sq in (recent_tasks, recent_messages, recent_docs)))
+    ).all()
+
+    # Merge by the real timestamp, newest first
+    activity = sorted(rows, key=lambda r: _utc(r.at) or datetime.min, reverse=True)[:10]
+
+    week = AnalyticsRollupService(db).daily_series(["tasks", "documents"], 7)
+    return {
+        "total_tasks": total_tasks,
+        "open_tasks": open_tasks,
+        "files_shared": files_shared,
+        "tasks_this_week": sum(week["tasks"]),
+        "docs_today": week["documents"][-1],
+        "recent_activity": [(r.type, r.id, r.title, _utc(r.at)) for r in activity],
+    }
+
+
 @router.get("/overview")
 def get_overview_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Get overview statistics for dashboard"""
     
-    # Get task counts
-    total_tasks = db.query(models.Task).count()
-    open_tasks = db.query(models.Task).filter(models.Task.status != 'DONE').count()
-    
-    # Get unread messages count
-    unread_messages = db.query(models.Message).filter(models.Message.is_read == False).count()
+    snapshot = _overview_cache.get_or_load("overview", lambda: _load_overview_snapshot(db))
+    open_tasks = snapshot["open_tasks"]
+    files_shared = snapshot["files_shared"]
     
-    # Get files shared count (from docs or uploads)
-    files_shared = db.query(models.Document).count()
+    # Per-user unread counts come from the incremental inbox counters
+    inbox = InboxSummaryService(db).get_summary(current_user.id)
+    unread_messages = inbox["unread_count"]
+    unread_sources = inbox["sources"]
     
-    # Get recent activity
-    recent_tasks = db.query(models.Task).order_by(models.Task.created_at.desc()).limit(5).all()
-    recent_messages = db.query(models.Message).order_by(models.Message.created_at.desc()).limit(5).all()
-    recent_docs = db.query(models.Document).order_by(models.Document.created_at.desc()).limit(3).all()
-    
-    # Combine recent activity
+    icons = {"task": "task", "message": "message", "file": "file"}
     recent_activity = []
-    
-    for task in recent_tasks:
+    for kind, item_id, title, at in snapshot["recent_activity"]:
+        if kind == "message":
+            title = f"Message in {title or 'Unknown'}"
         recent_activity.append({
-            "id": f"task_{task.id}",
-            "type": "task",
-            "title": task.title,
-            "time": format_time_ago(task.created_at),
-            "icon": "task"
+            "id": f"{'doc' if kind == 'file' else kind}_{item_id}",
+            "type": kind,
+            "title": title,
+            "time": format_time_ago(at),
+            "icon": icons[kind]
         })
     
-    for message in recent_messages:
-        recent_activity.append({
-            "id": f"message_{message.id}",
-            "type": "message", 
-            "title": f"Message in {message.channel.name if message.channel else 'Unknown'}",
-            "time": format_time_ago(message.created_at),
-            "icon": "message"
-        })
-    
-    for doc in recent_docs:
-        recent_activity.append({
-            "id": f"doc_{doc.id}",
-            "type": "file",
-            "title": doc.title,
-            "time": format_time_ago(doc.created_at),
-            "icon": "file"
-        })
-    
-    # Sort by time and limit
-    recent_activity.sort(key=lambda x: x["time"], reverse=True)
-    recent_activity = recent_activity[:10]
-    
     return {
         "overview_stats": [
-            {"title": "Open Tasks", "value": str(open_tasks), "trend": f"+{min(3, open_tasks)} this week", "color": "from-primary-500 to-primary-600"},
-            {"title": "Unread Messages", "value": str(unread_messages), "trend": f"{min(5, unread_messages)} new today", "color": "from-secondary-500 to-secondary-700"},
-            {"title": "Files Shared", "value": str(files_shared), "trend": f"{min(2, files_shared)} new uploads", "color": "from-accent-500 to-accent-600"},
+            {"title": "Open Tasks", "value": str(open_tasks), "trend": f"+{snapshot['tasks_this_week']} this week", "color": "from-primary-500 to-primary-600"},
+            {"title": "Unread Messages", "value": str(unread_messages), "trend": f"{unread_sources.get('email', {}).get('unread', 0)} email threads", "color": "from-secondary-500 to-secondary-700"},
+            {"title": "Files Shared", "value": str(files_shared), "trend": f"{snapshot['docs_today']} new today", "color": "from-accent-500 to-accent-600"},
             {"title": "Security", "value": "Healthy", "trend": "RBAC enabled", "color": "from-success-500 to-success-600"}
         ],
         "recent_activity": recent_activity
     }
 
+RANGE_DAYS = {"7d": 7, "30d": 30, "90d": 90}
+TOP_N_MAX = 50
+
+
+def _require_channel_member(db: Session, channel_id: int, user: models.User) -> None:
+    membership = db.query(models.ChannelMember.id).filter(
+        models.ChannelMember.channel_id == channel_id,
+        models.ChannelMember.user_id == user.id,
+    ).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="Not a member of this channel")
+
+
+def _parse_segment(db: Session, segment: str, user: models.User) -> str:
+    """Validate a segment and check the caller may see it.
+
+    There is no admin role, so 'user:<id>' is limited to the caller;
+    channels need a membership and projects must be the caller's own.
+    """
+    try:
+        segment = validate_segment(segment)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    kind, _, ident = segment.partition(":")
+    if kind == "channel":
+        _require_channel_member(db, int(ident), user)
+    elif kind == "user" and int(ident) != user.id:
+        raise HTTPException(status_code=403, detail="Per-user analytics are only available for yourself")
+    elif kind == "project":
+        owned = db.query(models.Project.id).filter(
+            models.Project.id == int(ident), models.Project.owner_id == user.id
+        ).first()
+        if not owned:
+            raise HTTPException(status_code=404, detail="Project not found")
+    return segment
+
+
 @router.get("/usage")
 def get_usage_analytics(
     range: str = "7d",
     segment: str = "all",
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Get detailed usage analytics"""
     
     # Calculate date range
-    days = 30 if range == "30d" else 7
-    start_date = datetime.utcnow() - timedelta(days=days)
+    days = RANGE_DAYS.get(range, 7)
+    segment = _parse_segment(db, segment, current_user)
+    rollups = AnalyticsRollupService(db)
     
-    # Get message counts
-    total_messages = db.query(models.Message).filter(
-        models.Message.created_at >= start_date
-    ).count()
+    # Per-day counters from the rollup tables (one row per metric per day and segment)
+    series = rollups.daily_series(
+        ["messages", "documents", "emails", "upload_bytes"], days, segment=segment
+    )
+    total_messages = sum(series["messages"])
+    total_docs = sum(series["documents"])
+    total_emails = sum(series["emails"])
     
-    # Get document counts
-    total_docs = db.query(models.Document).filter(
-        models.Document.created_at >= start_date
-    ).count()
+    # Distinct active users, merged from the per-day sketches
+    active_users = rollups.distinct_count("active_users", days, segments=(segment,))
     
-    # Get task counts
-    total_tasks = db.query(models.Task).filter(
-        models.Task.created_at >= start_date
-    ).count()
-    
-    # Get active users (simplified - count users with recent activity)
-    active_users = db.query(models.User).join(models.Message).filter(
-        models.Message.created_at >= start_date
-    ).distinct().count()
-    
-    # Calculate storage (simplified estimation)
-    storage_used = total_docs * 0.5  # Estimate 0.5GB per document
-    
-    # Generate sparkline data (simplified)
-    sparkline_messages = generate_sparkline_data(total_messages, days)
-    sparkline_docs = generate_sparkline_data(total_docs, days)
-    sparkline_uploads = generate_sparkline_data(storage_used, days)
+    uploads_gb = [round(b / 1024 ** 3, 3) for b in series["upload_bytes"]]
+    storage_used = sum(series["upload_bytes"]) / 1024 ** 3
     
     return {
         "active_users": active_users,
         "messages": total_messages,
-        "emails": 0,  # Not implemented yet
+        "emails": total_emails,
         "docs": total_docs,
         "uploads_gb": round(storage_used, 1),
         "security_score": "Healthy",
@@ -130,19 +200,113 @@ def get_usage_analytics(
             "storage": {"used": round(storage_used, 1), "limit": 100}
         },
         "sparklines": {
-            "messages": sparkline_messages,
-            "docs": sparkline_docs,
-            "uploads": sparkline_uploads
+            "messages": series["messages"],
+            "docs": series["documents"],
+            "uploads": uploads_gb
         }
     }
 
-def format_time_ago(dt: datetime) -> str:
+@router.get("/top-channels")
+def get_top_channels(
+    range: str = "7d",
+    n: int = 10,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Most active channels the caller belongs to, by message count"""
+    n = max(1, min(n, TOP_N_MAX))
+    channels = EngagementAnalyticsService(db).top_channels(current_user.id, RANGE_DAYS.get(range, 7), n)
+    return {"range": range, "channels": channels}
+
+@router.get("/heatmap")
+def get_activity_heatmap(
+    range: str = "30d",
+    segment: str = "all",
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Messages by weekday (Monday first) and hour of day, in UTC"""
+    segment = _parse_segment(db, segment, current_user)
+    if segment.startswith("user:"):
+        raise HTTPException(status_code=400, detail="Hourly data is not kept per user; use 'all', 'channel:<id>' or 'project:<id>'")
+    grid = EngagementAnalyticsService(db).heatmap(RANGE_DAYS.get(range, 30), segment=segment)
+    return {"range": range, "segment": segment, "timezone": "UTC", "heatmap": grid}
+
+@router.get("/response-times")
+def get_response_times(
+    range: str = "7d",
+    channel_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """How long it takes someone else to reply in the caller's channels"""
+    if RANGE_DAYS.get(range, 7) > RESPONSE_TIMES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Response times cover at most {RESPONSE_TIMES_MAX_DAYS} days")
+    if channel_id is not None:
+        _require_channel_member(db, channel_id, current_user)
+    stats = EngagementAnalyticsService(db).response_times(current_user.id, RANGE_DAYS.get(range, 7), channel_id)
+    return {"range": range, "channel_id": channel_id, **stats}
+
+@router.get("/export")
+def export_usage_data(
+    dataset: str = "messages",
+    format: str = "csv",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: models.User = Depends(get_current_user),
+):
+    """Stream the caller's usage rows between two dates (end inclusive) as CSV, NDJSON or Parquet.
+
+    Messages are limited to channels the caller belongs to; tasks,
+    documents and notifications to the caller's own rows.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=400, detail=f"Unknown dataset. Use one of: {', '.join(EXPORT_DATASETS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet export requires pyarrow to be installed")
+
+    end = end or datetime.utcnow().date()
+    start = start or (end - timedelta(days=29))
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+
+    media_type, ext = EXPORT_FORMATS[format]
+    body = STREAMERS[format](
+        dataset,
+        current_user.id,
+        datetime.combine(start, datetime.min.time()),
+        datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    )
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}-{start}-{end}.{ext}"'},
+    )
+
+def _utc(dt) -> Optional[datetime]:
+    if dt is None:
+        return None
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def format_time_ago(dt: Optional[datetime]) -> str:
     """Format datetime as 'X ago'"""
+    dt = _utc(dt)
+    if dt is None:
+        return "—"
     now = datetime.utcnow()
     diff = now - dt
     
     if diff.days > 0:
-        return f"{diff.days}h ago" if diff.days == 1 else f"{diff.days}d ago"
+        return f"{diff.days}d ago"
     elif diff.seconds > 3600:
         hours = diff.seconds // 3600
         return f"{hours}h ago"
@@ -151,20 +315,3 @@ def format_time_ago(dt: datetime) -> str:
         return f"{minutes}m ago"
     else:
         return "Just now"
-
-def generate_sparkline_data(total: int, days: int) -> List[float]:
-    """Generate simple sparkline data"""
-    if total == 0:
-        return [0] * min(7, days)
-    
-    # Simple distribution across the period
-    points = min(12, days)  # Max 12 points
-    base_value = total / points
-    
-    # Add some variation
-    sparkline = []
-    for i in range(points):
-        variation = 0.7 + (0.3 * (i % 3) / 2)  # Vary between 70% and 100%
-        sparkline.append(round(base_value * variation, 1))
-    
-    return sparkline
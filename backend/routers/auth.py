@@ -1,12 +1,17 @@
+import os
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 import models, schemas
 from database import get_db
+from services.api_keys import authenticate_api_key, is_api_key
+from services.auth_sessions import AuthSessionService, revocation_list
+from services.cache import TTLCache
+from services.password_hasher import PasswordHasherBusy, password_hasher
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
@@ -15,16 +20,31 @@ SECRET_KEY = "super-secret-key-change-me"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_hasher.context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Verified principals: user id -> column snapshot of the users row. Writers
+# call invalidate_principal(); the TTL bounds staleness across processes.
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+AUTH_PRINCIPAL_TTL_SECONDS = float(os.getenv("AUTH_PRINCIPAL_TTL_SECONDS", "60"))
+_principal_cache = TTLCache(maxsize=AUTH_PRINCIPAL_CACHE_SIZE, ttl=AUTH_PRINCIPAL_TTL_SECONDS)
+_USER_COLUMNS = [c.key for c in models.User.__table__.columns]
+
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)[0]
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts right now, please retry shortly",
+        headers={"Retry-After": "2"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -34,27 +54,75 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(token: str) -> dict:
+    """Verify a bearer token and return its claims; revoked sessions are rejected."""
+    credentials_exception = _credentials_exception()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str: str | None = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
-        user_id = int(user_id_str)
+        payload["sub"] = int(user_id_str)
     except (JWTError, ValueError):
         raise credentials_exception
+    # In-memory check; tokens issued before sessions existed carry no jti.
+    jti = payload.get("jti")
+    if jti and revocation_list.is_revoked(jti):
+        raise credentials_exception
+    return payload
+
+
+def _session_jti(token: str) -> str | None:
+    """The jti of the bearer token; API keys have no session to act on."""
+    if is_api_key(token):
+        raise HTTPException(status_code=400, detail="Session endpoints require a JWT")
+    return _decode_token(token).get("jti")
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+    if is_api_key(token):
+        # Integrations send "Authorization: Bearer tk_..." instead of a JWT.
+        user_id = authenticate_api_key(db, token)
+        if user_id is None:
+            raise _credentials_exception()
+    else:
+        user_id = _decode_token(token)["sub"]
+
+    snapshot = _principal_cache.get(user_id)
+    if snapshot is not None:
+        return _attach_principal(db, snapshot)
 
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    _principal_cache.set(user_id, {key: getattr(user, key) for key in _USER_COLUMNS})
     return user
 
 
+def _attach_principal(db: Session, snapshot: dict) -> models.User:
+    """Rebuild a persistent User in ``db`` from a cached snapshot without a SELECT.
+
+    The instance behaves like a loaded row: relationships lazy-load and
+    attribute changes are flushed as UPDATEs on commit.
+    """
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop a cached principal; call after changing the user's row."""
+    _principal_cache.invalidate(user_id)
+
+
 @router.post("/register", response_model=schemas.UserOut)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     existing_email = db.query(models.User).filter(models.User.email == user.email).first()
@@ -62,7 +130,10 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if existing_email or existing_username:
         raise HTTPException(status_code=400, detail="User already registered")
 
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = get_password_hash(user.password)
+    except PasswordHasherBusy:
+        raise _hashing_busy()
     new_user = models.User(username=user.username, email=user.email, password=hashed_password)
     db.add(new_user)
     db.commit()
@@ -71,10 +142,80 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+def login(user_credentials: schemas.UserLogin, request: Request, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == user_credentials.username).first()
-    if not user or not verify_password(user_credentials.password, user.password):
+    try:
+        valid, new_hash = password_hasher.verify(user_credentials.password, user.password if user else None)
+    except PasswordHasherBusy:
+        raise _hashing_busy()
+    if not user or not valid:
         raise HTTPException(status_code=403, detail="Invalid credentials")
-
-    access_token = create_access_token({"sub": str(user.id)})
-    return {"access_token": access_token, "token_type": "bearer", "user": user}
\ No newline at end of file
+    if new_hash:
+        # Stored hash used a different bcrypt cost; upgrade it while we have the password.
+        user.password = new_hash
+        db.commit()
+        invalidate_principal(user.id)
+
+    expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    jti, _ = AuthSessionService(db).create(
+        user.id,
+        expires_delta,
+        user_agent=request.headers.get("user-agent"),
+        ip_address=request.client.host if request.client else None,
+    )
+    access_token = create_access_token({"sub": str(user.id), "jti": jti}, expires_delta)
+    return {"access_token": access_token, "token_type": "bearer", "user": user}
+
+
+@router.post("/logout")
+def logout(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    jti = _session_jti(token)
+    sessions = db.query(models.AuthSession).filter(models.AuthSession.jti == jti).all() if jti else []
+    AuthSessionService(db).revoke(sessions)
+    return {"message": "Logged out"}
+
+
+@router.get("/sessions", response_model=List[schemas.AuthSessionOut])
+def list_sessions(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    current_jti = _session_jti(token)
+    return [
+        schemas.AuthSessionOut.model_validate(s).model_copy(update={"current": s.jti == current_jti})
+        for s in AuthSessionService(db).list_active(current_user.id)
+    ]
+
+
+@router.delete("/sessions/{session_id}")
+def revoke_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    session = (
+        db.query(models.AuthSession)
+        .filter(models.AuthSession.id == session_id, models.AuthSession.user_id == current_user.id)
+        .first()
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    AuthSessionService(db).revoke([session])
+    return {"message": "Session revoked"}
+
+
+@router.post("/sessions/revoke-others")
+def revoke_other_sessions(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    current_jti = _session_jti(token)
+    service = AuthSessionService(db)
+    others = [s for s in service.list_active(current_user.id) if s.jti != current_jti]
+    return {"revoked": service.revoke(others)}
\ No newline at end of file
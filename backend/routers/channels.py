@@ -2,15 +2,30 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db, dialect_insert
 import models, schemas
 from routers.auth import get_current_user
 
 router = APIRouter(prefix="/api/channels", tags=["Channels"])
 
 
+def _add_member(db: Session, channel_id: int, user_id: int, role: str = "member") -> models.ChannelMember:
+    """Return the user's membership, creating it if needed; safe against concurrent joins."""
+    db.execute(
+        dialect_insert(db, models.ChannelMember.__table__)
+        .values(user_id=user_id, channel_id=channel_id, role=role)
+        .on_conflict_do_nothing(index_elements=["user_id", "channel_id"])
+    )
+    db.commit()
+    return (
+        db.query(models.ChannelMember)
+        .filter(models.ChannelMember.channel_id == channel_id, models.ChannelMember.user_id == user_id)
+        .first()
+    )
+
+
 @router.get("", response_model=List[schemas.ChannelOut])
-def list_channels(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def list_channels(db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_user)):
     # Return channels the user can see: public OR where they are a member
     member_channel_ids = [
         m.channel_id for m in db.query(models.ChannelMember).filter(models.ChannelMember.user_id == current_user.id).all()
@@ -62,19 +77,7 @@ def join_channel(channel_id: int, db: Session = Depends(get_db), current_user: m
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
 
-    existing = (
-        db.query(models.ChannelMember)
-        .filter(models.ChannelMember.channel_id == channel_id, models.ChannelMember.user_id == current_user.id)
-        .first()
-    )
-    if existing:
-        return existing
-
-    membership = models.ChannelMember(user_id=current_user.id, channel_id=channel_id, role="member")
-    db.add(membership)
-    db.commit()
-    db.refresh(membership)
-    return membership
+    return _add_member(db, channel_id, current_user.id)
 
 
 @router.post("/{channel_id}/invite", response_model=schemas.ChannelMemberOut)
@@ -101,19 +104,7 @@ def invite_user_to_channel(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    existing = (
-        db.query(models.ChannelMember)
-        .filter(models.ChannelMember.channel_id == channel_id, models.ChannelMember.user_id == user.id)
-        .first()
-    )
-    if existing:
-        return existing
-
-    membership = models.ChannelMember(user_id=user.id, channel_id=channel_id, role="member")
-    db.add(membership)
-    db.commit()
-    db.refresh(membership)
-    return membership
+    return _add_member(db, channel_id, user.id)
 
 
 @router.post("/join/by-name", response_model=schemas.ChannelMemberOut)
@@ -130,19 +121,7 @@ def join_channel_by_name(
         # Require invitation/owner for private; for now just block auto-join
         raise HTTPException(status_code=403, detail="Private channel – request access")
 
-    existing = (
-        db.query(models.ChannelMember)
-        .filter(models.ChannelMember.channel_id == channel.id, models.ChannelMember.user_id == current_user.id)
-        .first()
-    )
-    if existing:
-        return existing
-
-    membership = models.ChannelMember(user_id=current_user.id, channel_id=channel.id, role="member")
-    db.add(membership)
-    db.commit()
-    db.refresh(membership)
-    return membership
+    return _add_member(db, channel.id, current_user.id)
 
 
 @router.delete("/{channel_id}/leave")
@@ -7,10 +7,11 @@ import uuid
 from datetime import datetime
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
 from services.notification_service import create_mention_notifications
 from services.email_service import EmailService
+from services.analytics_rollup_service import AnalyticsRollupService
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
@@ -20,7 +21,7 @@ def get_channel_messages(
     channel_id: int,
     limit: int = Query(50, description="Number of messages to retrieve"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     # Check if user is a member of this channel
     membership = db.query(models.ChannelMember).filter(
@@ -49,7 +50,7 @@ def find_mentions(text: str) -> Set[str]:
     return set(re.findall(mention_pattern, text))
 
 @router.post("/channels/{channel_id}/messages", response_model=schemas.MessageOut)
-async def send_channel_message(
+def send_channel_message(
     channel_id: int,
     message: schemas.MessageCreate,
     current_user: models.User = Depends(get_current_user),
@@ -74,6 +75,9 @@ async def send_channel_message(
     )
 
     db.add(new_message)
+    rollups = AnalyticsRollupService(db)
+    rollups.record("messages", segments=("all", f"channel:{channel_id}", f"user:{current_user.id}"))
+    rollups.record_active_user(current_user.id, segments=("all", f"channel:{channel_id}", f"user:{current_user.id}"))
     db.commit()
     db.refresh(new_message)
 
@@ -143,6 +147,9 @@ def upload_file_to_channel(
     )
 
     db.add(file_record)
+    AnalyticsRollupService(db).record(
+        "upload_bytes", amount=len(content), segments=("all", f"user:{current_user.id}")
+    )
     db.commit()
     db.refresh(file_record)
 
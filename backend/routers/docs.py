@@ -3,8 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from services.analytics_rollup_service import AnalyticsRollupService
 
 
 router = APIRouter(prefix="/api/docs", tags=["Docs"])
@@ -12,7 +13,7 @@ router = APIRouter(prefix="/api/docs", tags=["Docs"])
 
 @router.get("", response_model=List[schemas.DocumentOut])
 def list_docs(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     return (
@@ -31,6 +32,7 @@ def create_doc(
 ):
     doc = models.Document(owner_id=current_user.id, title=payload.title, content=payload.content)
     db.add(doc)
+    AnalyticsRollupService(db).record("documents", segments=("all", f"user:{current_user.id}"))
     db.commit()
     db.refresh(doc)
     return doc
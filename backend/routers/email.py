@@ -1,15 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
-from services.email_integration_service import EmailIntegrationService
+from services.email_body_store import EmailBodyStore
+from services.email_integration_service import EmailIntegrationService, attachment_path
+from services.email_outbox import EMAIL_OUTBOX_ENABLED, email_outbox, render_merge
+from services.email_sync_scheduler import SyncInProgress, email_sync_scheduler
+from services.inbox_summary_service import InboxSummaryService
 
 
 router = APIRouter(prefix="/api/email", tags=["Email"])
 
+BATCH_SEND_MAX = 1000
+
 
 @router.get("/accounts", response_model=List[schemas.EmailAccountOut])
 def list_accounts(
@@ -37,6 +49,29 @@ def create_account(
     return acct
 
 
+@router.post("/accounts/sync-all", response_model=schemas.EmailSyncAllResult)
+def sync_all_accounts(
+    limit: int = 25,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    account_ids = [
+        account_id
+        for (account_id,) in db.query(models.EmailAccount.id)
+        .filter(models.EmailAccount.user_id == current_user.id)
+        .order_by(models.EmailAccount.id)
+    ]
+    started = time.monotonic()
+    results = email_sync_scheduler.sync_accounts(account_ids, limit=limit)
+    return {
+        "imported": sum(r["imported"] for r in results),
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "duration_ms": int((time.monotonic() - started) * 1000),
+        "accounts": results,
+    }
+
+
 @router.post("/accounts/{account_id}/sync", response_model=schemas.EmailSyncResult)
 def sync_account(
     account_id: int,
@@ -53,12 +88,45 @@ def sync_account(
         raise HTTPException(status_code=404, detail="Account not found")
 
     try:
-        imported = EmailIntegrationService(db).sync_inbox(acct, limit=limit)
-        return {"imported": imported}
+        imported = email_sync_scheduler.sync_account(acct.id, limit=limit, force=True)
+        return {"imported": imported or 0}
+    except SyncInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/accounts/{account_id}/sync-status", response_model=schemas.EmailSyncStatus)
+def get_sync_status(
+    account_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    acct = (
+        db.query(models.EmailAccount)
+        .filter(models.EmailAccount.id == account_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not acct:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    lag = None
+    if acct.last_synced_at is not None:
+        last = acct.last_synced_at
+        if last.tzinfo is None:
+            last = last.replace(tzinfo=timezone.utc)
+        lag = max(0, int((datetime.now(timezone.utc) - last).total_seconds()))
+    return {
+        "account_id": acct.id,
+        "status": acct.sync_status or "idle",
+        "last_synced_at": acct.last_synced_at,
+        "next_sync_at": acct.next_sync_at,
+        "lag_seconds": lag,
+        "failures": acct.sync_failures or 0,
+        "last_error": acct.last_sync_error,
+    }
+
+
 @router.post("/accounts/{account_id}/test")
 def test_account(
     account_id: int,
@@ -96,15 +164,30 @@ def delete_account(
     if not acct:
         raise HTTPException(status_code=404, detail="Account not found")
 
+    summary = InboxSummaryService(db)
+    account_threads = db.query(models.EmailThread.id).filter(models.EmailThread.account_id == acct.id)
+    unread = summary.unread_threads(account_threads.scalar_subquery())
+    # Pins point at thread ids with no foreign key, so they would outlive the threads.
+    unpinned = (
+        db.query(models.InboxPin)
+        .filter(
+            models.InboxPin.user_id == current_user.id,
+            models.InboxPin.source == "email",
+            models.InboxPin.source_id.in_(account_threads.scalar_subquery()),
+        )
+        .delete(synchronize_session=False)
+    )
+    summary.adjust(current_user.id, "email", unread=-unread, pinned=-unpinned)
     db.delete(acct)
     db.commit()
+    summary.publish()
     return {"deleted": True}
 
 
 @router.get("/accounts/{account_id}/threads", response_model=List[schemas.EmailThreadOut])
 def list_threads(
     account_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     acct = (
@@ -128,7 +211,7 @@ def list_threads_paged(
     account_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     acct = (
@@ -162,10 +245,11 @@ def list_threads_paged(
     return {"items": items, "total": total, "unread_count": unread_count}
 
 
-@router.get("/threads/{thread_id}/messages", response_model=List[schemas.EmailMessageOut])
+@router.get("/threads/{thread_id}/messages", response_model=List[schemas.EmailMessageDetail])
 def list_thread_messages(
     thread_id: int,
-    db: Session = Depends(get_db),
+    with_body: bool = False,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     thread = (
@@ -177,12 +261,17 @@ def list_thread_messages(
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    return (
+    messages = (
         db.query(models.EmailMessage)
         .filter(models.EmailMessage.thread_id == thread.id)
         .order_by(models.EmailMessage.id.asc())
         .all()
     )
+    if not with_body:
+        return messages
+    # Bodies are only read (and decompressed) when the caller opens the thread.
+    bodies = EmailBodyStore(db).load_many([m.id for m in messages])
+    return [_with_body(m, bodies.get(m.id)) for m in messages]
 
 
 @router.get("/threads/{thread_id}/messages/paged", response_model=schemas.EmailMessageList)
@@ -190,7 +279,7 @@ def list_thread_messages_paged(
     thread_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     thread = (
@@ -210,6 +299,29 @@ def list_thread_messages_paged(
     return {"items": items, "total": total, "unread_count": unread_count}
 
 
+@router.get("/messages/{message_id}", response_model=schemas.EmailMessageDetail)
+def get_message(
+    message_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    msg = (
+        db.query(models.EmailMessage)
+        .join(models.EmailAccount, models.EmailMessage.account_id == models.EmailAccount.id)
+        .filter(models.EmailMessage.id == message_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    return _with_body(msg, EmailBodyStore(db).load_many([msg.id]).get(msg.id))
+
+
+def _with_body(msg: models.EmailMessage, body) -> schemas.EmailMessageDetail:
+    text, html = body or (None, None)
+    return schemas.EmailMessageDetail.model_validate(msg).model_copy(update={"body_text": text, "body_html": html})
+
+
 @router.put("/messages/{message_id}/read", response_model=schemas.EmailMessageOut)
 def mark_message_read(
     message_id: int,
@@ -226,18 +338,154 @@ def mark_message_read(
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
 
+    summary = InboxSummaryService(db)
+    unread_before = summary.unread_threads([msg.thread_id])
     msg.is_read = bool(payload.is_read)
+    summary.adjust_email(current_user.id, [msg.thread_id], unread_before)
     db.commit()
     db.refresh(msg)
+    summary.publish()
     return msg
 
 
+@router.get("/messages/{message_id}/attachments", response_model=List[schemas.EmailAttachmentOut])
+def list_message_attachments(
+    message_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    msg = (
+        db.query(models.EmailMessage)
+        .join(models.EmailAccount, models.EmailMessage.account_id == models.EmailAccount.id)
+        .filter(models.EmailMessage.id == message_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    return (
+        db.query(models.EmailAttachment)
+        .filter(models.EmailAttachment.message_id == msg.id)
+        .order_by(models.EmailAttachment.id.asc())
+        .all()
+    )
+
+
+@router.get("/attachments/{attachment_id}")
+def download_attachment(
+    attachment_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    att = (
+        db.query(models.EmailAttachment)
+        .join(models.EmailAccount, models.EmailAttachment.account_id == models.EmailAccount.id)
+        .filter(models.EmailAttachment.id == attachment_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not att:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    path = attachment_path(att.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Attachment file missing")
+    return FileResponse(path, media_type=att.content_type, filename=att.filename or f"attachment-{att.id}")
+
+
 @router.post("/accounts/{account_id}/send", response_model=schemas.EmailSendResult)
 def send_email(
     account_id: int,
     payload: schemas.EmailSendRequest,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
+):
+    acct = _smtp_account(db, account_id, current_user)
+    if not EMAIL_OUTBOX_ENABLED:
+        # No worker would ever pick a queued row up; send it now instead.
+        row = email_outbox.send_now(db, acct, payload.dict())
+        if row.status == "failed":
+            raise HTTPException(status_code=400, detail=row.last_error)
+        return {"id": row.id, "status": row.status}
+    (outbound_id,) = email_outbox.enqueue(db, acct, [payload.dict()])
+    return {"id": outbound_id, "status": "queued"}
+
+
+@router.post("/accounts/{account_id}/send-batch", response_model=schemas.EmailBatchStatus)
+def send_email_batch(
+    account_id: int,
+    payload: schemas.EmailBatchSendRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if not payload.recipients:
+        raise HTTPException(status_code=400, detail="No recipients")
+    if len(payload.recipients) > BATCH_SEND_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_SEND_MAX} recipients per batch")
+    if not EMAIL_OUTBOX_ENABLED:
+        raise HTTPException(status_code=503, detail="Batch sending needs the outbound mail worker, which is disabled")
+    acct = _smtp_account(db, account_id, current_user)
+
+    batch_id = str(uuid.uuid4())
+    messages = [
+        {
+            "to_email": r.to_email,
+            "subject": render_merge(payload.subject, {"email": r.to_email, **r.fields}),
+            "body": render_merge(payload.body, {"email": r.to_email, **r.fields}),
+            "is_html": payload.is_html,
+        }
+        for r in payload.recipients
+    ]
+    email_outbox.enqueue(db, acct, messages, batch_id=batch_id)
+    return {"batch_id": batch_id, "total": len(messages), "queued": len(messages), "sending": 0, "sent": 0, "failed": 0}
+
+
+@router.get("/outbound/batches/{batch_id}", response_model=schemas.EmailBatchStatus)
+def get_batch_status(
+    batch_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    counts = dict(
+        db.query(models.OutboundEmail.status, func.count(models.OutboundEmail.id))
+        .join(models.EmailAccount, models.OutboundEmail.account_id == models.EmailAccount.id)
+        .filter(models.OutboundEmail.batch_id == batch_id, models.EmailAccount.user_id == current_user.id)
+        .group_by(models.OutboundEmail.status)
+        .all()
+    )
+    if not counts:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {
+        "batch_id": batch_id,
+        "total": sum(counts.values()),
+        **{status: counts.get(status, 0) for status in ("queued", "sending", "sent", "failed")},
+    }
+
+
+@router.get("/outbound/{outbound_id}", response_model=schemas.OutboundEmailOut)
+def get_outbound_email(
+    outbound_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    row = (
+        db.query(models.OutboundEmail)
+        .join(models.EmailAccount, models.OutboundEmail.account_id == models.EmailAccount.id)
+        .filter(models.OutboundEmail.id == outbound_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Outbound email not found")
+    return row
+
+
+@router.get("/accounts/{account_id}/outbound", response_model=List[schemas.OutboundEmailOut])
+def list_outbound_emails(
+    account_id: int,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
 ):
     acct = (
         db.query(models.EmailAccount)
@@ -247,14 +495,20 @@ def send_email(
     if not acct:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    try:
-        EmailIntegrationService(db).send_email(
-            acct,
-            to_email=payload.to_email,
-            subject=payload.subject,
-            body=payload.body,
-            is_html=payload.is_html,
-        )
-        return {"sent": True}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    query = db.query(models.OutboundEmail).filter(models.OutboundEmail.account_id == acct.id)
+    if status:
+        query = query.filter(models.OutboundEmail.status == status)
+    return query.order_by(models.OutboundEmail.id.desc()).offset(skip).limit(limit).all()
+
+
+def _smtp_account(db: Session, account_id: int, current_user: models.User) -> models.EmailAccount:
+    acct = (
+        db.query(models.EmailAccount)
+        .filter(models.EmailAccount.id == account_id, models.EmailAccount.user_id == current_user.id)
+        .first()
+    )
+    if not acct:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if not acct.smtp_host or not acct.smtp_username or not acct.smtp_password:
+        raise HTTPException(status_code=400, detail="SMTP settings missing")
+    return acct
@@ -1,14 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import and_, case, delete, func, literal, or_, select, tuple_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timezone
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db, dialect_insert
 from routers.auth import get_current_user
+from services.inbox_summary_service import InboxSummaryService
 
 router = APIRouter(prefix="/api/inbox", tags=["Inbox"])
 
+PIN_SOURCES = ("notification", "email", "task", "chat")
+BULK_MAX_ITEMS = 500
+
 
 def _fmt_relative(dt: Optional[datetime]) -> str:
     if not dt:
@@ -31,6 +36,44 @@ def _fmt_relative(dt: Optional[datetime]) -> str:
     return f"{days}d ago"
 
 
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _text_match(like: str, *columns):
+    """ILIKE each column on its own, so their trigram indexes can serve the search."""
+    return or_(*(column.ilike(like, escape="\\") for column in columns))
+
+
+def _sort_ts(dt: Optional[datetime]) -> float:
+    if not dt:
+        return float("-inf")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _pinned_outerjoin(query, user_id: int, source: str, id_col):
+    return query.outerjoin(
+        models.InboxPin,
+        and_(
+            models.InboxPin.user_id == user_id,
+            models.InboxPin.source == source,
+            models.InboxPin.source_id == id_col,
+        ),
+    )
+
+
+def _source_stats(query, unread_expr=None):
+    """Total, pinned and unread counts for a filtered per-source query."""
+    unread_col = func.sum(case((unread_expr, 1), else_=0)) if unread_expr is not None else literal(0)
+    total, pinned, unread = query.with_entities(
+        func.count(), func.count(models.InboxPin.id), unread_col
+    ).one()
+    return total or 0, pinned or 0, int(unread or 0)
+
+
 @router.get("", response_model=schemas.InboxList)
 def list_inbox(
     source: str = "all",
@@ -38,161 +81,205 @@ def list_inbox(
     unread: bool = False,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    q_norm = (q or "").strip().lower()
-
-    pins = (
-        db.query(models.InboxPin)
-        .filter(models.InboxPin.user_id == current_user.id)
-        .all()
-    )
-    pinned_lookup = {(p.source, p.source_id): True for p in pins}
-
-    items: List[schemas.InboxItemOut] = []
-
-    # Chat messages
-    if source in ("all", "chat"):
-        if not unread:
-            msgs = (
-                db.query(models.Message)
-                .join(models.Channel, models.Message.channel_id == models.Channel.id)
-                .join(models.ChannelMember, models.ChannelMember.channel_id == models.Channel.id)
-                .filter(models.ChannelMember.user_id == current_user.id)
-                .order_by(models.Message.timestamp.desc())
-                .limit(200)
-                .all()
-            )
-            for m in msgs:
-                title = f"New message in #{m.channel.name}" if getattr(m, "channel", None) else "New message"
-                preview = m.content or ""
-                if q_norm and (q_norm not in (title + " " + preview).lower()):
-                    continue
-                items.append(
-                    schemas.InboxItemOut(
-                        id=f"chat:{m.id}",
-                        source="chat",
-                        source_id=m.id,
-                        title=title,
-                        preview=preview,
-                        meta={
-                            "channel": getattr(m.channel, "name", ""),
-                            "by": getattr(getattr(m, "sender", None), "username", "Member"),
-                            "at": _fmt_relative(m.timestamp),
-                        },
-                        unread=False,
-                        pinned=bool(pinned_lookup.get(("chat", m.id))),
-                        tags=["message"],
-                    )
+    """Merged inbox page across sources, pinned first.
+
+    ``q`` matches any one searchable field of an item (channel name or
+    message text, title, subject, snippet, description) on its own, so
+    the trigram indexes on those columns can serve it on PostgreSQL.
+    """
+    q_norm = (q or "").strip()
+    like = _like_pattern(q_norm) if q_norm else None
+    skip = max(0, skip)
+    limit = max(0, limit)
+    # Every source is filtered and ordered in SQL, so fetching the first
+    # skip + limit rows of each is enough to build the merged page.
+    window = skip + limit
+    pinned_expr = models.InboxPin.id.isnot(None)
+
+    entries = []  # (pinned, sort_ts, item)
+    total = unread_count = pinned_count = 0
+
+    # Chat messages (no read state, so excluded from unread-only views)
+    if source in ("all", "chat") and not unread:
+        base = (
+            db.query(models.Message)
+            .join(models.Channel, models.Message.channel_id == models.Channel.id)
+            .join(models.ChannelMember, models.ChannelMember.channel_id == models.Channel.id)
+            .filter(models.ChannelMember.user_id == current_user.id)
+        )
+        if like:
+            base = base.filter(
+                or_(
+                    _text_match(like, models.Message.content),
+                    models.Message.channel_id.in_(select(models.Channel.id).where(_text_match(like, models.Channel.name))),
                 )
+            )
+        base = _pinned_outerjoin(base, current_user.id, "chat", models.Message.id)
+
+        n, p, _ = _source_stats(base)
+        total += n
+        pinned_count += p
+
+        rows = (
+            base.outerjoin(models.User, models.Message.sender_id == models.User.id)
+            .with_entities(models.Message, models.Channel.name, models.User.username, pinned_expr)
+            .order_by(pinned_expr.desc(), models.Message.timestamp.desc(), models.Message.id.desc())
+            .limit(window)
+            .all()
+        ) if window else []
+        for m, channel_name, sender_name, is_pinned in rows:
+            entries.append((
+                bool(is_pinned),
+                _sort_ts(m.timestamp),
+                schemas.InboxItemOut(
+                    id=f"chat:{m.id}",
+                    source="chat",
+                    source_id=m.id,
+                    title=f"New message in #{channel_name}" if channel_name else "New message",
+                    preview=m.content or "",
+                    meta={
+                        "channel": channel_name or "",
+                        "by": sender_name or "Member",
+                        "at": _fmt_relative(m.timestamp),
+                    },
+                    unread=False,
+                    pinned=bool(is_pinned),
+                    tags=["message"],
+                ),
+            ))
 
     # Notifications
     if source in ("all", "notification"):
-        notif_q = db.query(models.Notification).filter(models.Notification.user_id == current_user.id)
+        base = db.query(models.Notification).filter(models.Notification.user_id == current_user.id)
         if unread:
-            notif_q = notif_q.filter(models.Notification.is_read == False)
-        notifs = notif_q.order_by(models.Notification.created_at.desc()).limit(200).all()
-        for n in notifs:
-            title = n.title or "Notification"
-            preview = n.preview or ""
-            if q_norm and (q_norm not in (title + " " + preview).lower()):
-                continue
-            items.append(
+            base = base.filter(models.Notification.is_read == False)
+        if like:
+            base = base.filter(_text_match(like, models.Notification.title, models.Notification.preview))
+        base = _pinned_outerjoin(base, current_user.id, "notification", models.Notification.id)
+
+        n, p, u = _source_stats(base, models.Notification.is_read == False)
+        total += n
+        pinned_count += p
+        unread_count += u
+
+        rows = (
+            base.with_entities(models.Notification, pinned_expr)
+            .order_by(pinned_expr.desc(), models.Notification.created_at.desc(), models.Notification.id.desc())
+            .limit(window)
+            .all()
+        ) if window else []
+        for n_row, is_pinned in rows:
+            entries.append((
+                bool(is_pinned),
+                _sort_ts(n_row.created_at),
                 schemas.InboxItemOut(
-                    id=f"notification:{n.id}",
+                    id=f"notification:{n_row.id}",
                     source="notification",
-                    source_id=n.id,
-                    title=title,
-                    preview=preview,
+                    source_id=n_row.id,
+                    title=n_row.title or "Notification",
+                    preview=n_row.preview or "",
                     meta={
                         "by": "System",
-                        "at": _fmt_relative(n.created_at),
+                        "at": _fmt_relative(n_row.created_at),
                     },
-                    unread=not bool(n.is_read),
-                    pinned=bool(pinned_lookup.get(("notification", n.id))),
-                    tags=[n.type] if n.type else [],
-                )
-            )
+                    unread=not bool(n_row.is_read),
+                    pinned=bool(is_pinned),
+                    tags=[n_row.type] if n_row.type else [],
+                ),
+            ))
 
-    # Email threads
+    # Email threads from all accounts owned by current user
     if source in ("all", "email"):
-        # Threads from all accounts owned by current user
-        threads = (
+        thread_unread = (
+            select(models.EmailMessage.id)
+            .where(models.EmailMessage.thread_id == models.EmailThread.id, models.EmailMessage.is_read == False)
+            .exists()
+        )
+        base = (
             db.query(models.EmailThread)
             .join(models.EmailAccount, models.EmailThread.account_id == models.EmailAccount.id)
             .filter(models.EmailAccount.user_id == current_user.id)
-            .order_by(models.EmailThread.updated_at.desc())
-            .limit(200)
-            .all()
         )
-        for t in threads:
-            unread_count = (
-                db.query(models.EmailMessage)
-                .filter(models.EmailMessage.thread_id == t.id, models.EmailMessage.is_read == False)
-                .count()
-            )
-            is_unread = unread_count > 0
-            if unread and not is_unread:
-                continue
-            title = t.subject or "(no subject)"
-            preview = t.snippet or ""
-            if q_norm and (q_norm not in (title + " " + preview).lower()):
-                continue
-            items.append(
+        if unread:
+            base = base.filter(thread_unread)
+        if like:
+            base = base.filter(_text_match(like, models.EmailThread.subject, models.EmailThread.snippet))
+        base = _pinned_outerjoin(base, current_user.id, "email", models.EmailThread.id)
+
+        n, p, u = _source_stats(base, thread_unread)
+        total += n
+        pinned_count += p
+        unread_count += u
+
+        rows = (
+            base.with_entities(models.EmailThread, thread_unread.label("is_unread"), pinned_expr)
+            .order_by(pinned_expr.desc(), models.EmailThread.updated_at.desc(), models.EmailThread.id.desc())
+            .limit(window)
+            .all()
+        ) if window else []
+        for t, is_unread, is_pinned in rows:
+            entries.append((
+                bool(is_pinned),
+                _sort_ts(t.updated_at),
                 schemas.InboxItemOut(
                     id=f"email:{t.id}",
                     source="email",
                     source_id=t.id,
-                    title=title,
-                    preview=preview,
+                    title=t.subject or "(no subject)",
+                    preview=t.snippet or "",
                     meta={
                         "by": t.last_from or "",
                         "at": _fmt_relative(t.updated_at),
                     },
-                    unread=is_unread,
-                    pinned=bool(pinned_lookup.get(("email", t.id))),
+                    unread=bool(is_unread),
+                    pinned=bool(is_pinned),
                     tags=["email"],
-                )
-            )
-
-    # Tasks
-    if source in ("all", "task"):
-        tasks = db.query(models.Task).order_by(models.Task.id.desc()).limit(200).all()
-        for t in tasks:
-            title = f"Task: {t.title}" if t.title else "Task"
-            preview = t.description or ""
-            if q_norm and (q_norm not in (title + " " + preview).lower()):
-                continue
-            # Tasks currently have no read/unread concept in backend.
-            if unread:
-                continue
-            items.append(
+                ),
+            ))
+
+    # Tasks (no read state, so excluded from unread-only views)
+    if source in ("all", "task") and not unread:
+        base = db.query(models.Task)
+        if like:
+            base = base.filter(_text_match(like, models.Task.title, models.Task.description))
+        base = _pinned_outerjoin(base, current_user.id, "task", models.Task.id)
+
+        n, p, _ = _source_stats(base)
+        total += n
+        pinned_count += p
+
+        rows = (
+            base.with_entities(models.Task, pinned_expr)
+            .order_by(pinned_expr.desc(), models.Task.id.desc())
+            .limit(window)
+            .all()
+        ) if window else []
+        for t, is_pinned in rows:
+            entries.append((
+                bool(is_pinned),
+                float("-inf"),
                 schemas.InboxItemOut(
                     id=f"task:{t.id}",
                     source="task",
                     source_id=t.id,
-                    title=title,
-                    preview=preview,
+                    title=f"Task: {t.title}" if t.title else "Task",
+                    preview=t.description or "",
                     meta={
                         "by": "System",
                         "at": "—",
                     },
                     unread=False,
-                    pinned=bool(pinned_lookup.get(("task", t.id))),
+                    pinned=bool(is_pinned),
                     tags=[t.status] if t.status else [],
-                )
-            )
-
-    # Sort pinned first, then by meta.at (already relative), so prefer original insert order.
-    items.sort(key=lambda x: (not x.pinned, x.id))
-
-    # Pagination
-    total = len(items)
-    page = items[skip : skip + limit]
+                ),
+            ))
 
-    unread_count = sum(1 for it in items if it.unread)
-    pinned_count = sum(1 for it in items if it.pinned)
+    # Pinned first, then newest first across sources.
+    entries.sort(key=lambda e: (not e[0], -e[1]))
+    page = [item for _, _, item in entries[skip : skip + limit]]
 
     return {
         "items": page,
@@ -202,6 +289,14 @@ def list_inbox(
     }
 
 
+@router.get("/summary", response_model=schemas.InboxSummary)
+def get_inbox_summary(
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return InboxSummaryService(db).get_summary(current_user.id)
+
+
 @router.put("/{source}/{source_id}/pin", response_model=schemas.InboxItemPinOut)
 def set_pin(
     source: str,
@@ -210,7 +305,7 @@ def set_pin(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    if source not in ("notification", "email", "task", "chat"):
+    if source not in PIN_SOURCES:
         raise HTTPException(status_code=400, detail="Unsupported source")
 
     existing = (
@@ -224,14 +319,18 @@ def set_pin(
     )
 
     should_pin = bool(payload.pinned)
+    summary = InboxSummaryService(db)
 
     if should_pin and not existing:
         rec = models.InboxPin(user_id=current_user.id, source=source, source_id=source_id)
         db.add(rec)
+        summary.adjust(current_user.id, source, pinned=1)
         db.commit()
     elif (not should_pin) and existing:
         db.delete(existing)
+        summary.adjust(current_user.id, source, pinned=-1)
         db.commit()
+    summary.publish()
 
     return {"source": source, "source_id": source_id, "pinned": should_pin}
 
@@ -245,6 +344,7 @@ def set_read(
     current_user: models.User = Depends(get_current_user),
 ):
     is_read = bool(payload.is_read)
+    summary = InboxSummaryService(db)
 
     if source == "notification":
         n = (
@@ -254,8 +354,11 @@ def set_read(
         )
         if not n:
             raise HTTPException(status_code=404, detail="Notification not found")
+        if bool(n.is_read) != is_read:
+            summary.adjust(current_user.id, "notification", unread=-1 if is_read else 1)
         n.is_read = is_read
         db.commit()
+        summary.publish()
         return {"source": source, "source_id": source_id, "is_read": is_read}
 
     if source == "email":
@@ -269,35 +372,178 @@ def set_read(
         if not thread:
             raise HTTPException(status_code=404, detail="Thread not found")
 
+        unread_before = summary.unread_threads([thread.id])
         db.query(models.EmailMessage).filter(models.EmailMessage.thread_id == thread.id).update(
             {"is_read": is_read}
         )
+        summary.adjust_email(current_user.id, [thread.id], unread_before)
         db.commit()
+        summary.publish()
         return {"source": source, "source_id": source_id, "is_read": is_read}
 
     raise HTTPException(status_code=400, detail="Read/unread not supported for this source")
 
 
+def _bulk_refs(items: List[schemas.InboxItemRef]) -> List[tuple]:
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_ITEMS} items per request")
+    # De-duplicate while keeping request order for the per-item results.
+    return list(dict.fromkeys((it.source, it.source_id) for it in items))
+
+
+@router.put("/bulk/pin", response_model=schemas.InboxBulkResult)
+def bulk_set_pin(
+    payload: schemas.InboxBulkPinUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    refs = _bulk_refs(payload.items)
+    valid = [r for r in refs if r[0] in PIN_SOURCES]
+    should_pin = bool(payload.pinned)
+
+    changed = set()
+    if valid:
+        if should_pin:
+            stmt = (
+                dialect_insert(db, models.InboxPin.__table__)
+                .values([{"user_id": current_user.id, "source": s, "source_id": i} for s, i in valid])
+                .on_conflict_do_nothing(index_elements=["user_id", "source", "source_id"])
+                .returning(models.InboxPin.source, models.InboxPin.source_id)
+            )
+        else:
+            stmt = (
+                delete(models.InboxPin)
+                .where(
+                    models.InboxPin.user_id == current_user.id,
+                    tuple_(models.InboxPin.source, models.InboxPin.source_id).in_(valid),
+                )
+                .returning(models.InboxPin.source, models.InboxPin.source_id)
+            )
+        changed = {(s, i) for s, i in db.execute(stmt).all()}
+
+    summary = InboxSummaryService(db)
+    for source in PIN_SOURCES:
+        n = sum(1 for s, _ in changed if s == source)
+        summary.adjust(current_user.id, source, pinned=n if should_pin else -n)
+    db.commit()
+    summary.publish()
+
+    results = []
+    for source, source_id in refs:
+        if source not in PIN_SOURCES:
+            results.append({"source": source, "source_id": source_id, "ok": False, "error": "Unsupported source"})
+        else:
+            results.append(
+                {"source": source, "source_id": source_id, "ok": True, "changed": (source, source_id) in changed}
+            )
+    return {"results": results, "updated": len(changed)}
+
+
+@router.put("/bulk/read", response_model=schemas.InboxBulkResult)
+def bulk_set_read(
+    payload: schemas.InboxBulkReadUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    refs = _bulk_refs(payload.items)
+    is_read = bool(payload.is_read)
+    summary = InboxSummaryService(db)
+
+    found = set()
+    changed = set()
+
+    notif_ids = [i for s, i in refs if s == "notification"]
+    if notif_ids:
+        rows = (
+            db.query(models.Notification.id, models.Notification.is_read)
+            .filter(models.Notification.user_id == current_user.id, models.Notification.id.in_(notif_ids))
+            .all()
+        )
+        found.update(("notification", nid) for nid, _ in rows)
+        to_change = [nid for nid, cur in rows if bool(cur) != is_read]
+        if to_change:
+            db.query(models.Notification).filter(models.Notification.id.in_(to_change)).update(
+                {"is_read": is_read}, synchronize_session=False
+            )
+            changed.update(("notification", nid) for nid in to_change)
+            summary.adjust(
+                current_user.id, "notification", unread=-len(to_change) if is_read else len(to_change)
+            )
+
+    thread_ids = [i for s, i in refs if s == "email"]
+    if thread_ids:
+        owned = [
+            tid
+            for (tid,) in db.query(models.EmailThread.id)
+            .join(models.EmailAccount, models.EmailThread.account_id == models.EmailAccount.id)
+            .filter(models.EmailThread.id.in_(thread_ids), models.EmailAccount.user_id == current_user.id)
+            .all()
+        ]
+        found.update(("email", tid) for tid in owned)
+        if owned:
+            to_change = [
+                tid
+                for (tid,) in db.query(models.EmailMessage.thread_id)
+                .filter(models.EmailMessage.thread_id.in_(owned), models.EmailMessage.is_read != is_read)
+                .distinct()
+                .all()
+            ]
+            if to_change:
+                unread_before = summary.unread_threads(to_change)
+                db.query(models.EmailMessage).filter(models.EmailMessage.thread_id.in_(to_change)).update(
+                    {"is_read": is_read}, synchronize_session=False
+                )
+                changed.update(("email", tid) for tid in to_change)
+                summary.adjust_email(current_user.id, to_change, unread_before)
+
+    db.commit()
+    summary.publish()
+
+    results = []
+    for source, source_id in refs:
+        if source not in ("notification", "email"):
+            error = "Read/unread not supported for this source"
+        elif (source, source_id) not in found:
+            error = "Not found"
+        else:
+            error = None
+        results.append(
+            {
+                "source": source,
+                "source_id": source_id,
+                "ok": error is None,
+                "changed": (source, source_id) in changed,
+                "error": error,
+            }
+        )
+    return {"results": results, "updated": len(changed)}
+
+
 @router.put("/read/all")
 def mark_all_read(
     source: str = "all",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
+    summary = InboxSummaryService(db)
+
     if source in ("all", "notification"):
-        db.query(models.Notification).filter(
+        marked = db.query(models.Notification).filter(
             models.Notification.user_id == current_user.id,
             models.Notification.is_read == False,
         ).update({"is_read": True})
+        summary.adjust(current_user.id, "notification", unread=-marked)
 
     if source in ("all", "email"):
         # Mark all messages as read for all accounts owned by user
-        msg_q = (
-            db.query(models.EmailMessage)
-            .join(models.EmailAccount, models.EmailMessage.account_id == models.EmailAccount.id)
-            .filter(models.EmailAccount.user_id == current_user.id, models.EmailMessage.is_read == False)
+        account_ids = db.query(models.EmailAccount.id).filter(models.EmailAccount.user_id == current_user.id)
+        msg_q = db.query(models.EmailMessage).filter(
+            models.EmailMessage.account_id.in_(account_ids.scalar_subquery()),
+            models.EmailMessage.is_read == False,
         )
-        msg_q.update({"is_read": True})
+        msg_q.update({"is_read": True}, synchronize_session=False)
+        summary.clear_email(current_user.id)
 
     db.commit()
+    summary.publish()
     return {"ok": True}
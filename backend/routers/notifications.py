@@ -3,9 +3,10 @@ from sqlalchemy.orm import Session
 from typing import List
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
 from services.notification_service import NotificationService
+from services.inbox_summary_service import InboxSummaryService
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
@@ -15,7 +16,7 @@ def get_notifications(
     limit: int = 50,
     unread: bool = False,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get user's notifications with pagination"""
     service = NotificationService(db)
@@ -40,7 +41,7 @@ def get_notifications(
 @router.get("/unread/count", response_model=int)
 def get_unread_count(
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get count of unread notifications"""
     return NotificationService(db).get_unread_count(current_user.id)
@@ -60,11 +61,14 @@ def mark_all_read(
     db: Session = Depends(get_db)
 ):
     """Mark all notifications as read"""
-    db.query(models.Notification).filter(
+    marked = db.query(models.Notification).filter(
         models.Notification.user_id == current_user.id,
         models.Notification.is_read == False
     ).update({"is_read": True})
+    summary = InboxSummaryService(db)
+    summary.adjust(current_user.id, "notification", unread=-marked)
     db.commit()
+    summary.publish()
     return None
 
 @router.get("/preferences", response_model=schemas.UserPreferenceOut)
@@ -8,7 +8,7 @@ from typing import Optional
 
 import models, schemas
 from database import get_db
-from routers.auth import get_current_user
+from routers.auth import get_current_user, invalidate_principal
 from sqlalchemy.orm import Session
 
 router = APIRouter(prefix="/api/profile", tags=["Profile"])
@@ -38,6 +38,7 @@ async def upload_profile_pic(
     # Update user's profile_pic in database
     current_user.profile_pic = f"/{file_path}"
     db.commit()
+    invalidate_principal(current_user.id)
     
     return {"message": "Profile picture uploaded successfully", "file_path": f"/{file_path}"}
 
@@ -79,6 +80,7 @@ async def delete_profile_pic(
     # Update database
     current_user.profile_pic = None
     db.commit()
+    invalidate_principal(current_user.id)
     
     return {"message": "Profile picture deleted successfully"}
 
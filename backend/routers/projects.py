@@ -3,14 +3,15 @@ from sqlalchemy.orm import Session
 from typing import List
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from services.analytics_rollup_service import AnalyticsRollupService
 
 router = APIRouter(prefix="/api/projects", tags=["Projects"])
 
 @router.get("", response_model=List[schemas.ProjectOut])
 def list_projects(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     return (
@@ -149,6 +150,9 @@ def create_project_card(
         order=next_order
     )
     db.add(card)
+    rollups = AnalyticsRollupService(db)
+    rollups.record("project_cards", segments=("all", f"project:{project_id}"))
+    rollups.record_active_user(current_user.id, segments=(f"project:{project_id}",))
     db.commit()
     db.refresh(card)
     return card
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
 
 
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/api/search", tags=["Search"])
 @router.get("", response_model=schemas.SearchResults)
 def unified_search(
     q: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     query = (q or "").strip()
@@ -4,7 +4,9 @@ from typing import List, Dict, Any
 
 import models, schemas
 from database import get_db
-from routers.auth import get_current_user
+from routers.auth import get_current_user, invalidate_principal
+from services.api_keys import API_KEY_PREFIX, ApiKeyService
+from services.auth_sessions import AuthSessionService
 
 router = APIRouter(prefix="/api/settings", tags=["Settings"])
 
@@ -43,6 +45,7 @@ def update_profile(
         current_user.email = profile_update.email
     
     db.commit()
+    invalidate_principal(current_user.id)
     db.refresh(current_user)
     return current_user
 
@@ -105,7 +108,7 @@ def get_security_settings(
         "sessionTimeout": 24, # hours
         "requirePasswordChange": False,
         "lastPasswordChange": current_user.created_at.isoformat() if current_user.created_at else None,
-        "activeSessions": 1,
+        "activeSessions": AuthSessionService(db).count_active(current_user.id),
         "apiKeys": []
     }
 
@@ -140,13 +143,21 @@ def change_password(
     # For now, just return success
     return {"message": "Password changed successfully"}
 
+def _api_key_out(key: models.ApiKey) -> Dict[str, Any]:
+    return {
+        "id": key.id,
+        "name": key.name,
+        "prefix": f"{API_KEY_PREFIX}{key.prefix}",
+        "createdAt": key.created_at,
+        "lastUsed": key.last_used_at,
+    }
+
 @router.get("/api-keys", response_model=List[Dict[str, Any]])
 def get_api_keys(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    # Return mock API keys - in a real app, these would be stored in the database
-    return []
+    return [_api_key_out(key) for key in ApiKeyService(db).list(current_user.id)]
 
 @router.post("/api-keys")
 def create_api_key(
@@ -154,17 +165,26 @@ def create_api_key(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    name = key_data.get("name")
+    name = (key_data.get("name") or "").strip()
     if not name:
         raise HTTPException(status_code=400, detail="API key name required")
-    
-    # In a real app, generate a real API key and store it
-    mock_key = f"tk_{current_user.id}_{hash(name) % 1000000:06d}"
-    
-    return {
-        "id": "mock-id",
-        "name": name,
-        "key": mock_key,
-        "createdAt": "2024-01-01T00:00:00Z",
-        "lastUsed": None
-    }
+
+    row, key = ApiKeyService(db).create(current_user.id, name[:100])
+    # The full key is only ever shown here; we keep just its hash.
+    return {**_api_key_out(row), "key": key}
+
+@router.delete("/api-keys/{key_id}")
+def delete_api_key(
+    key_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    key = db.query(models.ApiKey).filter(
+        models.ApiKey.id == key_id,
+        models.ApiKey.user_id == current_user.id,
+        models.ApiKey.revoked_at.is_(None)
+    ).first()
+    if not key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    ApiKeyService(db).revoke(key)
+    return {"message": "API key revoked"}
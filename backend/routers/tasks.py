@@ -3,14 +3,15 @@ from sqlalchemy.orm import Session
 from typing import List
 
 import models, schemas
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
+from services.analytics_rollup_service import AnalyticsRollupService
 
 router = APIRouter(prefix="/api/tasks", tags=["Tasks"])
 
 
 @router.get("", response_model=List[schemas.TaskOut])
-def list_tasks(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def list_tasks(db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_user)):
     return db.query(models.Task).all()
 
 
@@ -23,6 +24,7 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), current
         assigned_user_id=current_user.id,
     )
     db.add(new_task)
+    AnalyticsRollupService(db).record("tasks", segments=("all", f"user:{current_user.id}"))
     db.commit()
     db.refresh(new_task)
     return new_task
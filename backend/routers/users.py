@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 
 import models, schemas
 from database import get_db
-from routers.auth import get_current_user
+from routers.auth import get_current_user, invalidate_principal
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
@@ -44,5 +44,6 @@ def update_current_user_profile(
         current_user.profile_pic = user_update.profile_pic
     
     db.commit()
+    invalidate_principal(current_user.id)
     db.refresh(current_user)
     return current_user
@@ -1,13 +1,14 @@
 import asyncio
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Set
 
 import models, schemas
-from database import SessionLocal
-from routers.auth import SECRET_KEY, ALGORITHM
+from database import AsyncSessionLocal
+from routers.auth import _decode_token
+from services.analytics_rollup_service import AnalyticsRollupService
 
 router = APIRouter(prefix="/ws", tags=["WebSocket Chat"])
 
@@ -62,33 +63,54 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-def _get_user_from_token(token: str, db: Session) -> models.User | None:
+async def _get_user_from_token(token: str, db: AsyncSession) -> models.User | None:
+    # Same check as the HTTP routes, so a revoked session can't reconnect.
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str: str | None = payload.get("sub")
-        if not user_id_str:
-            return None
-        user_id = int(user_id_str)
-        return db.query(models.User).filter(models.User.id == user_id).first()
-    except (JWTError, ValueError):
+        user_id = _decode_token(token)["sub"]
+    except HTTPException:
         return None
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
+
+
+async def _save_message(channel_id: int, user_id: int, content: str) -> models.Message:
+    # A short session per message, so an open socket never pins a pooled connection.
+    async with AsyncSessionLocal() as db:
+        new_message = models.Message(
+            content=content,
+            message_type="text",
+            sender_id=user_id,
+            channel_id=channel_id
+        )
+        db.add(new_message)
+
+        def record(sync_db):
+            rollups = AnalyticsRollupService(sync_db)
+            rollups.record("messages", segments=("all", f"channel:{channel_id}", f"user:{user_id}"))
+            rollups.record_active_user(user_id, segments=("all", f"channel:{channel_id}", f"user:{user_id}"))
+
+        await db.run_sync(record)
+        await db.commit()
+        await db.refresh(new_message)
+        return new_message
 
 @router.websocket("/chat/{channel_id}")
 async def chat_websocket(websocket: WebSocket, channel_id: int, token: str = Query(...)):
-    db: Session = SessionLocal()
     try:
-        # Authenticate user
-        user = _get_user_from_token(token, db)
-        if not user:
-            await websocket.close(code=4401)
-            return
+        async with AsyncSessionLocal() as db:
+            # Authenticate user
+            user = await _get_user_from_token(token, db)
+            if not user:
+                await websocket.close(code=4401)
+                return
+
+            # Check if user is member of channel
+            membership = await db.scalar(
+                select(models.ChannelMember.id).where(
+                    models.ChannelMember.channel_id == channel_id,
+                    models.ChannelMember.user_id == user.id
+                )
+            )
 
-        # Check if user is member of channel
-        membership = db.query(models.ChannelMember).filter(
-            models.ChannelMember.channel_id == channel_id,
-            models.ChannelMember.user_id == user.id
-        ).first()
-        
         if not membership:
             await websocket.close(code=4403)
             return
@@ -116,16 +138,7 @@ async def chat_websocket(websocket: WebSocket, channel_id: int, token: str = Que
                 # Handle different message types
                 if message_data.get("type") == "message":
                     # Save message to database
-                    new_message = models.Message(
-                        content=message_data.get("content", ""),
-                        message_type="text",
-                        sender_id=user.id,
-                        channel_id=channel_id
-                    )
-                    
-                    db.add(new_message)
-                    db.commit()
-                    db.refresh(new_message)
+                    new_message = await _save_message(channel_id, user.id, message_data.get("content", ""))
                     
                     # Broadcast to all users in channel
                     broadcast_message = {
@@ -160,5 +173,3 @@ async def chat_websocket(websocket: WebSocket, channel_id: int, token: str = Que
     except Exception as e:
         print(f"WebSocket error: {e}")
         await websocket.close(code=4000)
-    finally:
-        db.close()
@@ -1,12 +1,11 @@
 import asyncio
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
 
 import models, schemas
-from database import SessionLocal
-from routers.auth import SECRET_KEY, ALGORITHM
+from database import AsyncSessionLocal
+from routers.auth import _decode_token
 from services.ws_manager import notification_ws_manager
 
 
@@ -15,12 +14,8 @@ router = APIRouter(prefix="/api/ws", tags=["ws"])
 
 def _get_user_id_from_token(token: str) -> int | None:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str: str | None = payload.get("sub")
-        if not user_id_str:
-            return None
-        return int(user_id_str)
-    except (JWTError, ValueError):
+        return _decode_token(token)["sub"]
+    except HTTPException:
         return None
 
 
@@ -36,28 +31,27 @@ async def notifications_ws(websocket: WebSocket):
         await websocket.close(code=4401)
         return
 
-    db: Session = SessionLocal()
+    # Only the handshake needs the database; don't hold a connection for
+    # the lifetime of the socket.
+    async with AsyncSessionLocal() as db:
+        user_exists = await db.scalar(select(models.User.id).where(models.User.id == user_id))
+    if not user_exists:
+        await websocket.close(code=4401)
+        return
+
+    await notification_ws_manager.connect(user_id, websocket)
+
+    try:
+        await websocket.send_json({"type": "connected"})
+    except Exception:
+        await notification_ws_manager.disconnect(user_id, websocket)
+        await websocket.close()
+        return
+
     try:
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if not user:
-            await websocket.close(code=4401)
-            return
-
-        await notification_ws_manager.connect(user_id, websocket)
-
-        try:
-            await websocket.send_json({"type": "connected"})
-        except Exception:
-            await notification_ws_manager.disconnect(user_id, websocket)
-            await websocket.close()
-            return
-
-        try:
-            while True:
-                await websocket.receive_text()
-        except WebSocketDisconnect:
-            pass
-        finally:
-            await notification_ws_manager.disconnect(user_id, websocket)
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
     finally:
-        db.close()
+        await notification_ws_manager.disconnect(user_id, websocket)
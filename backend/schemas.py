@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -19,6 +19,18 @@ class UserLogin(BaseModel):
     password: str
 
 
+class AuthSessionOut(BaseModel):
+    id: int
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    created_at: datetime
+    expires_at: datetime
+    current: bool = False
+
+    class Config:
+        from_attributes = True
+
+
 class UserOut(BaseModel):
     id: int
     username: str
@@ -214,6 +226,17 @@ class InboxList(BaseModel):
     pinned_count: int
 
 
+class InboxSourceCounts(BaseModel):
+    unread: int = 0
+    pinned: int = 0
+
+
+class InboxSummary(BaseModel):
+    unread_count: int
+    pinned_count: int
+    sources: Dict[str, InboxSourceCounts]
+
+
 class InboxItemPinUpdate(BaseModel):
     pinned: bool
 
@@ -234,6 +257,34 @@ class InboxItemReadOut(BaseModel):
     is_read: bool
 
 
+class InboxItemRef(BaseModel):
+    source: str
+    source_id: int
+
+
+class InboxBulkPinUpdate(BaseModel):
+    items: List[InboxItemRef]
+    pinned: bool
+
+
+class InboxBulkReadUpdate(BaseModel):
+    items: List[InboxItemRef]
+    is_read: bool
+
+
+class InboxBulkItemResult(BaseModel):
+    source: str
+    source_id: int
+    ok: bool
+    changed: bool = False
+    error: Optional[str] = None
+
+
+class InboxBulkResult(BaseModel):
+    results: List[InboxBulkItemResult]
+    updated: int
+
+
 # --------
 # Email
 # --------
@@ -276,6 +327,9 @@ class EmailAccountOut(BaseModel):
     smtp_use_tls: bool = True
     from_email: Optional[str] = None
 
+    sync_status: Optional[str] = "idle"
+    last_synced_at: Optional[datetime] = None
+
     created_at: datetime
     updated_at: datetime
 
@@ -313,10 +367,55 @@ class EmailMessageOut(BaseModel):
         from_attributes = True
 
 
+class EmailAttachmentOut(BaseModel):
+    id: int
+    message_id: int
+    filename: str
+    content_type: str
+    content_id: Optional[str] = None
+    is_inline: bool
+    size: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class EmailMessageDetail(EmailMessageOut):
+    body_text: Optional[str] = None
+    body_html: Optional[str] = None
+
+
 class EmailSyncResult(BaseModel):
     imported: int
 
 
+class EmailAccountSyncResult(BaseModel):
+    account_id: int
+    status: str  # ok, busy, error
+    imported: int = 0
+    error: Optional[str] = None
+    duration_ms: int = 0
+
+
+class EmailSyncAllResult(BaseModel):
+    imported: int
+    succeeded: int
+    failed: int
+    duration_ms: int
+    accounts: List[EmailAccountSyncResult]
+
+
+class EmailSyncStatus(BaseModel):
+    account_id: int
+    status: str
+    last_synced_at: Optional[datetime] = None
+    next_sync_at: Optional[datetime] = None
+    lag_seconds: Optional[int] = None
+    failures: int = 0
+    last_error: Optional[str] = None
+
+
 class EmailSendRequest(BaseModel):
     to_email: str
     subject: str
@@ -325,7 +424,45 @@ class EmailSendRequest(BaseModel):
 
 
 class EmailSendResult(BaseModel):
-    sent: bool
+    id: int
+    status: str
+
+
+class EmailMergeRecipient(BaseModel):
+    to_email: str
+    fields: Dict[str, str] = {}
+
+
+class EmailBatchSendRequest(BaseModel):
+    subject: str
+    body: str
+    is_html: bool = False
+    recipients: List[EmailMergeRecipient]
+
+
+class EmailBatchStatus(BaseModel):
+    batch_id: str
+    total: int
+    queued: int
+    sending: int
+    sent: int
+    failed: int
+
+
+class OutboundEmailOut(BaseModel):
+    id: int
+    account_id: int
+    batch_id: Optional[str] = None
+    to_email: str
+    subject: str
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 class EmailMessageReadUpdate(BaseModel):
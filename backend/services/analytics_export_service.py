@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import select
+
+import models
+from database import read_session
+
+
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _datasets():
+    """dataset -> (timestamp column, exported columns)."""
+    return {
+        "messages": (
+            models.Message.timestamp,
+            [
+                models.Message.id,
+                models.Message.channel_id,
+                models.Message.sender_id,
+                models.Message.message_type,
+                models.Message.thread_id,
+                models.Message.timestamp,
+                models.Message.content,
+            ],
+        ),
+        "tasks": (
+            models.Task.created_at,
+            [
+                models.Task.id,
+                models.Task.assigned_user_id,
+                models.Task.status,
+                models.Task.title,
+                models.Task.created_at,
+            ],
+        ),
+        "documents": (
+            models.Document.created_at,
+            [
+                models.Document.id,
+                models.Document.owner_id,
+                models.Document.title,
+                models.Document.created_at,
+                models.Document.updated_at,
+            ],
+        ),
+        "notifications": (
+            models.Notification.created_at,
+            [
+                models.Notification.id,
+                models.Notification.user_id,
+                models.Notification.type,
+                models.Notification.source_type,
+                models.Notification.source_id,
+                models.Notification.is_read,
+                models.Notification.created_at,
+            ],
+        ),
+    }
+
+
+EXPORT_DATASETS = tuple(_datasets().keys())
+
+
+def _visible_to(dataset: str, user_id: int):
+    """Rows of ``dataset`` the user may export: their channels' messages and their own rows."""
+    if dataset == "messages":
+        member_of = select(models.ChannelMember.channel_id).where(models.ChannelMember.user_id == user_id)
+        return models.Message.channel_id.in_(member_of)
+    if dataset == "tasks":
+        return models.Task.assigned_user_id == user_id
+    if dataset == "documents":
+        return models.Document.owner_id == user_id
+    return models.Notification.user_id == user_id
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _iter_chunks(dataset: str, user_id: int, start: datetime, end: datetime) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """Yield (column names, rows) chunks through a server-side cursor.
+
+    The session is opened here rather than taken from the request so it lives
+    exactly as long as the response body is being streamed.
+    """
+    ts_col, columns = _datasets()[dataset]
+    names = [c.key for c in columns]
+    stmt = (
+        select(*columns)
+        .where(ts_col >= start, ts_col < end, _visible_to(dataset, user_id))
+        .order_by(columns[0])
+        .execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS)
+    )
+    # Long sequential scans; let a replica serve them when there is one.
+    db = read_session()
+    try:
+        for partition in db.execute(stmt).partitions():
+            yield names, partition
+    finally:
+        db.close()
+
+
+def stream_csv(dataset: str, user_id: int, start: datetime, end: datetime) -> Iterator[bytes]:
+    header_written = False
+    for names, rows in _iter_chunks(dataset, user_id, start, end):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if not header_written:
+            writer.writerow(names)
+            header_written = True
+        writer.writerows([_cell(v) for v in row] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+    if not header_written:
+        buf = io.StringIO()
+        csv.writer(buf).writerow([c.key for c in _datasets()[dataset][1]])
+        yield buf.getvalue().encode("utf-8")
+
+
+def stream_ndjson(dataset: str, user_id: int, start: datetime, end: datetime) -> Iterator[bytes]:
+    for names, rows in _iter_chunks(dataset, user_id, start, end):
+        lines = [json.dumps(dict(zip(names, (_cell(v) for v in row))), default=str) for row in rows]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    fields = []
+    for col in columns:
+        python_type = col.type.python_type
+        if python_type is bool:
+            arrow_type = pa.bool_()
+        elif python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is datetime:
+            arrow_type = pa.timestamp("us", tz="UTC" if getattr(col.type, "timezone", False) else None)
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col.key, arrow_type))
+    return pa.schema(fields)
+
+
+def stream_parquet(dataset: str, user_id: int, start: datetime, end: datetime) -> Iterator[bytes]:
+    # pyarrow is optional; the router checks for it before streaming starts.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(_datasets()[dataset][1])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for names, rows in _iter_chunks(dataset, user_id, start, end):
+            columns = list(zip(*rows))
+            writer.write_table(pa.table({name: list(col) for name, col in zip(names, columns)}, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
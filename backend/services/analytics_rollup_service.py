@@ -0,0 +1,572 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal, dialect_insert
+from services.hyperloglog import HyperLogLog
+
+
+GRANULARITIES = ("hour", "day")
+
+# Per-user buckets are kept daily only; hourly ones would be users x hours rows.
+HOURLY_SEGMENT_TYPES = ("all", "channel", "project")
+
+# Per-day sets up to this size are stored exactly; larger ones as HyperLogLog.
+SKETCH_EXACT_LIMIT = 512
+
+# Recently recorded (day, segment, user_id) keys, so repeat activity by the
+# same user on the same day does not touch the database at all.
+_SEEN_LIMIT = 50000
+_seen_active: "OrderedDict[tuple, None]" = OrderedDict()
+_seen_lock = threading.Lock()
+
+# Session.info key for active-user marks waiting for the caller's commit.
+_PENDING_ACTIVE_USERS = "pending_active_users"
+
+# A failed active-user merge is retried after this many seconds, doubling
+# on each further failure up to ACTIVE_USER_RETRY_MAX_SECONDS.
+ACTIVE_USER_RETRY_SECONDS = float(os.getenv("ACTIVE_USER_RETRY_SECONDS", "1"))
+ACTIVE_USER_RETRY_MAX_SECONDS = float(os.getenv("ACTIVE_USER_RETRY_MAX_SECONDS", "60"))
+
+# pg_advisory_xact_lock key serializing ensure_backfilled across workers.
+_BACKFILL_LOCK_KEY = 7304192817
+
+
+_SEGMENT_RE = re.compile(r"^(all|(channel|user|project):\d+)$")
+
+
+def _rollup_sources():
+    """metric -> (timestamp column, aggregated value, segment columns) used for backfills."""
+    return {
+        "messages": (
+            models.Message.timestamp,
+            func.count(models.Message.id),
+            {"channel": models.Message.channel_id, "user": models.Message.sender_id},
+        ),
+        "documents": (models.Document.created_at, func.count(models.Document.id), {"user": models.Document.owner_id}),
+        "tasks": (models.Task.created_at, func.count(models.Task.id), {"user": models.Task.assigned_user_id}),
+        "project_cards": (
+            models.ProjectCard.created_at,
+            func.count(models.ProjectCard.id),
+            {"project": models.ProjectCard.project_id},
+        ),
+        "emails": (models.EmailMessage.created_at, func.count(models.EmailMessage.id), {}),
+        "notifications": (
+            models.Notification.created_at,
+            func.count(models.Notification.id),
+            {"user": models.Notification.user_id},
+        ),
+        "upload_bytes": (
+            models.FileAttachment.uploaded_at,
+            func.sum(models.FileAttachment.file_size),
+            {"user": models.FileAttachment.uploader_id},
+        ),
+    }
+
+
+def _segment_type(segment: str) -> str:
+    return segment.partition(":")[0]
+
+
+def validate_segment(segment: str) -> str:
+    """Accept 'all', 'channel:<id>', 'user:<id>' or 'project:<id>'."""
+    if not _SEGMENT_RE.match(segment or ""):
+        raise ValueError("Segment must be 'all', 'channel:<id>', 'user:<id>' or 'project:<id>'")
+    return segment
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to its naive-UTC bucket start."""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _parse_ids(value: Optional[str]) -> Set[int]:
+    return {int(v) for v in value.split(",") if v} if value else set()
+
+
+def _format_ids(ids: Set[int]) -> str:
+    return ",".join(str(v) for v in sorted(ids))
+
+
+def _seen_before(key: tuple) -> bool:
+    with _seen_lock:
+        if key in _seen_active:
+            _seen_active.move_to_end(key)
+            return True
+        return False
+
+
+def _remember(key: tuple) -> None:
+    with _seen_lock:
+        _seen_active[key] = None
+        if len(_seen_active) > _SEEN_LIMIT:
+            _seen_active.popitem(last=False)
+
+
+def _as_bucket(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _merged_count(rows: Iterable[tuple]) -> int:
+    """Distinct ids across (exact_ids, registers) sketch rows."""
+    exact: Set[int] = set()
+    sketches = []
+    for exact_ids, registers in rows:
+        if registers is None:
+            exact |= _parse_ids(exact_ids)
+        else:
+            sketches.append(np.frombuffer(registers, dtype=np.uint8))
+
+    if not sketches:
+        return len(exact)
+    # Register-wise max over all sketches at once, same as repeated merge().
+    merged = HyperLogLog(registers=np.maximum.reduce(sketches).tobytes())
+    merged.update(exact)
+    return merged.count()
+
+
+class AnalyticsRollupService:
+    """Hourly and daily event counters backing the analytics dashboard.
+
+    Write paths call ``record()`` inside their own transaction, which upserts
+    the matching hour and day buckets for the workspace ('all') and for any
+    per-channel/user/project segments passed in. Readers only touch the
+    bucket rows that cover the requested range.
+
+    Distinct counts (active users) are kept per day and segment in
+    ``analytics_sketches``: an exact id set while it is small, a
+    HyperLogLog sketch once it grows past ``SKETCH_EXACT_LIMIT``. Both forms
+    merge across any set of days and segments.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(
+        self,
+        metric: str,
+        at: Optional[datetime] = None,
+        amount: int = 1,
+        segments: Iterable[str] = ("all",),
+    ) -> None:
+        if not amount:
+            return
+        at = at or datetime.utcnow()
+        table = models.AnalyticsRollup.__table__
+        stmt = dialect_insert(self.db, table).values(
+            [
+                {
+                    "granularity": g,
+                    "metric": metric,
+                    "segment": segment,
+                    "bucket_start": bucket_start(at, g),
+                    "count": amount,
+                }
+                for g in GRANULARITIES
+                for segment in segments
+                if g == "day" or _segment_type(segment) in HOURLY_SEGMENT_TYPES
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "metric", "segment", "bucket_start"],
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        self.db.execute(stmt)
+
+    def daily_series(
+        self,
+        metrics: Iterable[str],
+        days: int,
+        end: Optional[datetime] = None,
+        segment: str = "all",
+    ) -> Dict[str, List[int]]:
+        """Dense per-day counts for the last ``days`` days (oldest first), today included."""
+        metrics = list(metrics)
+        first_day, last_day = self.day_range(days, end)
+
+        rows = (
+            self.db.query(models.AnalyticsRollup.metric, models.AnalyticsRollup.bucket_start, models.AnalyticsRollup.count)
+            .filter(
+                models.AnalyticsRollup.granularity == "day",
+                models.AnalyticsRollup.metric.in_(metrics),
+                models.AnalyticsRollup.segment == segment,
+                models.AnalyticsRollup.bucket_start >= first_day,
+                models.AnalyticsRollup.bucket_start <= last_day,
+            )
+            .all()
+        )
+
+        series = {m: [0] * days for m in metrics}
+        for metric, start, count in rows:
+            idx = (_as_bucket(start) - first_day).days
+            if 0 <= idx < days:
+                series[metric][idx] += count or 0
+        return series
+
+    def bucket_rows(
+        self,
+        metric: str,
+        granularity: str,
+        days: int,
+        segment: Optional[str] = "all",
+        segment_prefix: Optional[str] = None,
+        end: Optional[datetime] = None,
+    ) -> List[tuple]:
+        """Raw (segment, bucket_start, count) rows, for callers that aggregate them further."""
+        first_day, last_day = self.day_range(days, end)
+        q = self.db.query(
+            models.AnalyticsRollup.segment, models.AnalyticsRollup.bucket_start, models.AnalyticsRollup.count
+        ).filter(
+            models.AnalyticsRollup.granularity == granularity,
+            models.AnalyticsRollup.metric == metric,
+            models.AnalyticsRollup.bucket_start >= first_day,
+            models.AnalyticsRollup.bucket_start < last_day + timedelta(days=1),
+        )
+        if segment_prefix is not None:
+            # A range rather than LIKE so the unique index on (granularity, metric, segment, ...) is used.
+            q = q.filter(
+                models.AnalyticsRollup.segment >= f"{segment_prefix}:",
+                models.AnalyticsRollup.segment < f"{segment_prefix};",
+            )
+        else:
+            q = q.filter(models.AnalyticsRollup.segment == segment)
+        return q.all()
+
+    @staticmethod
+    def day_range(days: int, end: Optional[datetime] = None):
+        last_day = bucket_start(end or datetime.utcnow(), "day")
+        return last_day - timedelta(days=days - 1), last_day
+
+    def record_active_user(self, user_id: int, segments: Iterable[str] = ("all",), at: Optional[datetime] = None) -> None:
+        """Count ``user_id`` as active once the caller's transaction commits.
+
+        The sketch rows are shared by every writer, so they are not touched
+        here; ``active_user_recorder`` merges the marks afterwards in a short
+        transaction of its own. A rolled-back transaction records nothing.
+        """
+        day = bucket_start(at or datetime.utcnow(), "day")
+        keys = {(day, segment, user_id) for segment in segments}
+        keys = {key for key in keys if not _seen_before(key)}
+        if keys:
+            self.db.info.setdefault(_PENDING_ACTIVE_USERS, set()).update(keys)
+
+    def distinct_count(
+        self,
+        metric: str,
+        days: int,
+        segments: Iterable[str] = ("all",),
+        end: Optional[datetime] = None,
+    ) -> int:
+        """Distinct ids over the last ``days`` days across ``segments``.
+
+        Exact when every bucket in range is still an exact set, otherwise a
+        HyperLogLog estimate over the merged sketches.
+        """
+        first_day, last_day = self.day_range(days, end)
+        rows = (
+            self.db.query(models.AnalyticsSketch.exact_ids, models.AnalyticsSketch.registers)
+            .filter(
+                models.AnalyticsSketch.metric == metric,
+                models.AnalyticsSketch.segment.in_(list(segments)),
+                models.AnalyticsSketch.bucket_start >= first_day,
+                models.AnalyticsSketch.bucket_start <= last_day,
+            )
+            .all()
+        )
+        return _merged_count(rows)
+
+    def distinct_counts(
+        self,
+        metric: str,
+        days: int,
+        segments: Iterable[str],
+        end: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        """``distinct_count`` for each of ``segments`` separately, with one query."""
+        first_day, last_day = self.day_range(days, end)
+        by_segment: Dict[str, list] = {segment: [] for segment in segments}
+        rows = self.db.query(
+            models.AnalyticsSketch.segment, models.AnalyticsSketch.exact_ids, models.AnalyticsSketch.registers
+        ).filter(
+            models.AnalyticsSketch.metric == metric,
+            models.AnalyticsSketch.segment.in_(list(by_segment)),
+            models.AnalyticsSketch.bucket_start >= first_day,
+            models.AnalyticsSketch.bucket_start <= last_day,
+        )
+        for segment, exact_ids, registers in rows:
+            by_segment[segment].append((exact_ids, registers))
+        return {segment: _merged_count(sketch_rows) for segment, sketch_rows in by_segment.items()}
+
+    def _locked_sketch(self, metric: str, segment: str, day: datetime) -> models.AnalyticsSketch:
+        stmt = (
+            dialect_insert(self.db, models.AnalyticsSketch.__table__)
+            .values(metric=metric, segment=segment, bucket_start=day, exact_ids="")
+            .on_conflict_do_nothing(index_elements=["metric", "segment", "bucket_start"])
+        )
+        self.db.execute(stmt)
+        return (
+            self.db.query(models.AnalyticsSketch)
+            .filter(
+                models.AnalyticsSketch.metric == metric,
+                models.AnalyticsSketch.segment == segment,
+                models.AnalyticsSketch.bucket_start == day,
+            )
+            .with_for_update()
+            .one()
+        )
+
+    @staticmethod
+    def _add_to_sketch(sketch: models.AnalyticsSketch, value: int) -> None:
+        if sketch.registers is not None:
+            hll = HyperLogLog(registers=sketch.registers)
+            if hll.add(value):
+                sketch.registers = hll.to_bytes()
+            return
+
+        ids = _parse_ids(sketch.exact_ids)
+        if value in ids:
+            return
+        ids.add(value)
+        if len(ids) > SKETCH_EXACT_LIMIT:
+            hll = HyperLogLog()
+            hll.update(ids)
+            sketch.registers = hll.to_bytes()
+            sketch.exact_ids = None
+        else:
+            sketch.exact_ids = _format_ids(ids)
+
+    def merge_active_users(self, keys: Iterable[tuple]) -> None:
+        """Add (day, segment, user_id) marks to their sketches; the caller commits."""
+        grouped: Dict[tuple, Set[int]] = {}
+        for day, segment, user_id in keys:
+            grouped.setdefault((day, segment), set()).add(user_id)
+        # Same lock order in every process, so concurrent merges can't deadlock.
+        for day, segment in sorted(grouped):
+            sketch = self._locked_sketch("active_users", segment, day)
+            for user_id in sorted(grouped[(day, segment)]):
+                self._add_to_sketch(sketch, user_id)
+
+    def backfill_active_users(self) -> None:
+        """Rebuild the per-day 'all', channel and user active user sketches from chat messages."""
+        self._rebuild_active_users()
+        self.db.commit()
+
+    def _rebuild_active_users(self) -> None:
+        day = self._truncate(models.Message.timestamp, "day")
+        rows = (
+            self.db.query(day, models.Message.channel_id, models.Message.sender_id)
+            .filter(models.Message.timestamp.isnot(None), models.Message.sender_id.isnot(None))
+            .distinct()
+            .yield_per(10000)
+        )
+        buckets: Dict[tuple, Set[int]] = {}
+        for b, channel_id, sender_id in rows:
+            b = _as_bucket(b)
+            buckets.setdefault(("all", b), set()).add(sender_id)
+            buckets.setdefault((f"user:{sender_id}", b), {sender_id})
+            if channel_id is not None:
+                buckets.setdefault((f"channel:{channel_id}", b), set()).add(sender_id)
+
+        # Project sketches come from card creation, which no table records; keep them.
+        self.db.query(models.AnalyticsSketch).filter(
+            models.AnalyticsSketch.metric == "active_users",
+            ~models.AnalyticsSketch.segment.startswith("project:"),
+        ).delete(synchronize_session=False)
+        mappings = []
+        for (segment, b), ids in buckets.items():
+            sketch = models.AnalyticsSketch(metric="active_users", segment=segment, bucket_start=b, exact_ids="")
+            for user_id in ids:
+                self._add_to_sketch(sketch, user_id)
+            mappings.append(
+                {
+                    "metric": "active_users",
+                    "segment": segment,
+                    "bucket_start": b,
+                    "exact_ids": sketch.exact_ids,
+                    "registers": sketch.registers,
+                }
+            )
+        self.db.bulk_insert_mappings(models.AnalyticsSketch, mappings)
+
+    def backfill(self, metrics: Optional[Iterable[str]] = None) -> None:
+        """Rebuild buckets for the given metrics from the source tables."""
+        self._rebuild_rollups(metrics)
+        self.db.commit()
+
+    def _rebuild_rollups(self, metrics: Optional[Iterable[str]] = None) -> None:
+        sources = _rollup_sources()
+        metrics = list(metrics or sources.keys())
+
+        self.db.query(models.AnalyticsRollup).filter(models.AnalyticsRollup.metric.in_(metrics)).delete(
+            synchronize_session=False
+        )
+        for metric in metrics:
+            ts_col, value, segment_cols = sources[metric]
+            for granularity in GRANULARITIES:
+                bucket = self._truncate(ts_col, granularity)
+                for segment_type, seg_col in [("all", None)] + list(segment_cols.items()):
+                    if granularity == "hour" and segment_type not in HOURLY_SEGMENT_TYPES:
+                        continue
+                    group = [bucket] if seg_col is None else [bucket, seg_col]
+                    rows = (
+                        self.db.query(*group, value)
+                        .filter(ts_col.isnot(None))
+                        .group_by(*group)
+                        .all()
+                    )
+                    mappings = []
+                    for row in rows:
+                        if seg_col is None:
+                            b, n = row
+                            segment = "all"
+                        else:
+                            b, seg_id, n = row
+                            if seg_id is None:
+                                continue
+                            segment = f"{segment_type}:{seg_id}"
+                        if b is None:
+                            continue
+                        mappings.append(
+                            {
+                                "granularity": granularity,
+                                "metric": metric,
+                                "segment": segment,
+                                "bucket_start": _as_bucket(b),
+                                "count": int(n or 0),
+                            }
+                        )
+                    self.db.bulk_insert_mappings(models.AnalyticsRollup, mappings)
+
+    def ensure_backfilled(self) -> None:
+        """Seed the rollups from existing data the first time they are used.
+
+        Every worker calls this at startup. On PostgreSQL the check and the
+        backfill run in one transaction under an advisory lock, so only the
+        first worker backfills. The rollup tables are also locked against
+        writes, so live ``record()`` upserts wait for the rebuild instead
+        of landing in the middle of it.
+        """
+        postgres = self.db.get_bind().dialect.name == "postgresql"
+        if postgres:
+            self.db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BACKFILL_LOCK_KEY})
+        rollups = self.db.query(models.AnalyticsRollup.id).first() is None
+        sketches = self.db.query(models.AnalyticsSketch.id).first() is None
+        if rollups or sketches:
+            if postgres:
+                self.db.execute(text("LOCK TABLE analytics_rollups, analytics_sketches IN EXCLUSIVE MODE"))
+            if rollups:
+                self._rebuild_rollups()
+            if sketches:
+                self._rebuild_active_users()
+        self.db.commit()
+
+    def _truncate(self, col, granularity: str):
+        if self.db.get_bind().dialect.name == "sqlite":
+            fmt = "%Y-%m-%d %H:00:00" if granularity == "hour" else "%Y-%m-%d 00:00:00"
+            return func.strftime(fmt, col)
+        if getattr(col.type, "timezone", False):
+            col = col.op("AT TIME ZONE")("UTC")
+        return func.date_trunc(granularity, col)
+
+
+class ActiveUserRecorder:
+    """Merges committed active-user marks into the daily sketches.
+
+    Runs on its own thread so the row locks on shared sketches (the
+    workspace-wide 'all' row above all) are held only for the length of a
+    short merge transaction, never across a request's transaction or on
+    the event loop. Marks are remembered only after the merge commits;
+    a failed merge keeps them pending and is retried with backoff, and
+    ``stop`` makes a last attempt at shutdown.
+    """
+
+    def __init__(self):
+        self._pending: Set[tuple] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, keys: Iterable[tuple]) -> None:
+        with self._lock:
+            self._pending.update(keys)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="active-users", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        retry_in: Optional[float] = None
+        while not self._stop.is_set():
+            self._wake.wait(retry_in)
+            self._wake.clear()
+            try:
+                self.flush()
+                retry_in = None
+            except Exception as e:
+                retry_in = min(retry_in * 2, ACTIVE_USER_RETRY_MAX_SECONDS) if retry_in else ACTIVE_USER_RETRY_SECONDS
+                print(f"Active user merge failed, retrying in {retry_in:g}s: {e}")
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        keys = [key for key in pending if not _seen_before(key)]
+        if not keys:
+            return
+        db = SessionLocal()
+        try:
+            AnalyticsRollupService(db).merge_active_users(keys)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._pending.update(keys)
+            raise
+        finally:
+            db.close()
+        for key in keys:
+            _remember(key)
+
+
+active_user_recorder = ActiveUserRecorder()
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_active_users(session: Session) -> None:
+    keys = session.info.pop(_PENDING_ACTIVE_USERS, None)
+    if keys:
+        active_user_recorder.add(keys)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_active_users(session: Session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(_PENDING_ACTIVE_USERS, None)
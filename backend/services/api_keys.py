@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.cache import TTLCache
+
+
+API_KEY_PREFIX = "tk_"
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+API_KEY_CACHE_TTL_SECONDS = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", "60"))
+API_KEY_LAST_USED_FLUSH_SECONDS = float(os.getenv("API_KEY_LAST_USED_FLUSH_SECONDS", "60"))
+
+# sha256(key) -> (key id, user id) for keys that verified recently.
+_verified_keys = TTLCache(maxsize=API_KEY_CACHE_SIZE, ttl=API_KEY_CACHE_TTL_SECONDS)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _hash_key(key: str) -> str:
+    # Keys carry 256 bits of randomness, so a fast hash is enough (no bcrypt).
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _split_key(key: str) -> Optional[str]:
+    """Return the lookup prefix of a "tk_<prefix>_<secret>" key."""
+    if not key.startswith(API_KEY_PREFIX):
+        return None
+    prefix, sep, secret = key[len(API_KEY_PREFIX):].partition("_")
+    return prefix if sep and prefix and secret else None
+
+
+def is_api_key(token: str) -> bool:
+    return token.startswith(API_KEY_PREFIX)
+
+
+def authenticate_api_key(db: Session, key: str) -> Optional[int]:
+    """Return the owning user id for a valid, unrevoked key, or None."""
+    key_hash = _hash_key(key)
+    cached = _verified_keys.get(key_hash)
+    if cached is None:
+        prefix = _split_key(key)
+        if prefix is None:
+            return None
+        row = (
+            db.query(models.ApiKey.id, models.ApiKey.user_id, models.ApiKey.key_hash)
+            .filter(models.ApiKey.prefix == prefix, models.ApiKey.revoked_at.is_(None))
+            .first()
+        )
+        if row is None or not hmac.compare_digest(row.key_hash, key_hash):
+            return None
+        cached = (row.id, row.user_id)
+        _verified_keys.set(key_hash, cached)
+    key_id, user_id = cached
+    api_key_usage.touch(key_id)
+    return user_id
+
+
+class ApiKeyUsageTracker:
+    """Buffers per-key last-used times and writes them in one batched UPDATE.
+
+    Authentication only records the time in a dict; a background thread
+    flushes the dict every ``API_KEY_LAST_USED_FLUSH_SECONDS``, so a busy
+    integration costs one UPDATE per key per interval instead of one per
+    request.
+    """
+
+    def __init__(self, interval: float = API_KEY_LAST_USED_FLUSH_SECONDS):
+        self.interval = interval
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, key_id: int) -> None:
+        with self._lock:
+            self._pending[key_id] = _now()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="api-key-usage", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"API key usage flush failed: {e}")
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.ApiKey),
+                [{"id": key_id, "last_used_at": used_at} for key_id, used_at in pending.items()],
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+api_key_usage = ApiKeyUsageTracker()
+
+
+class ApiKeyService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, user_id: int, name: str) -> Tuple[models.ApiKey, str]:
+        """Create a key and return (row, plaintext key); the plaintext is never stored."""
+        prefix = secrets.token_hex(6)
+        key = f"{API_KEY_PREFIX}{prefix}_{secrets.token_urlsafe(32)}"
+        row = models.ApiKey(user_id=user_id, name=name, prefix=prefix, key_hash=_hash_key(key))
+        self.db.add(row)
+        self.db.commit()
+        self.db.refresh(row)
+        return row, key
+
+    def list(self, user_id: int) -> List[models.ApiKey]:
+        return (
+            self.db.query(models.ApiKey)
+            .filter(models.ApiKey.user_id == user_id, models.ApiKey.revoked_at.is_(None))
+            .order_by(models.ApiKey.created_at.desc())
+            .all()
+        )
+
+    def revoke(self, key: models.ApiKey) -> None:
+        key.revoked_at = _now()
+        self.db.commit()
+        # Other processes stop accepting it when their cache entry expires.
+        _verified_keys.invalidate(key.key_hash)
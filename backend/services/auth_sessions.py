@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "5"))
+TOKEN_REVOCATION_BLOOM_BITS = int(os.getenv("TOKEN_REVOCATION_BLOOM_BITS", str(1 << 20)))
+TOKEN_REVOCATION_BLOOM_HASHES = int(os.getenv("TOKEN_REVOCATION_BLOOM_HASHES", "7"))
+
+# Re-read a little before the watermark so revocations committed by another
+# process with a slightly skewed clock are not missed.
+_WATERMARK_OVERLAP = timedelta(seconds=30)
+_PRUNE_SECONDS = 3600
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes for timezone-aware columns.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class BloomFilter:
+    def __init__(self, bits: int = TOKEN_REVOCATION_BLOOM_BITS, hashes: int = TOKEN_REVOCATION_BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationList:
+    """Per-process copy of revoked, not-yet-expired token ids.
+
+    ``is_revoked`` is a bloom filter probe (almost always a miss) backed by
+    an exact dict for the hits, so the per-request check never touches the
+    database. Every ``TOKEN_REVOCATION_REFRESH_SECONDS`` the first request
+    to notice pulls only revocations newer than the last one it saw;
+    revocations made in this process are applied immediately. Expired
+    entries are dropped, and the filter rebuilt, once an hour.
+    """
+
+    def __init__(self, refresh_seconds: float = TOKEN_REVOCATION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, datetime] = {}
+        self._bloom = BloomFilter()
+        self._watermark: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._next_prune = time.monotonic() + _PRUNE_SECONDS
+        self._refreshing = False
+
+    def is_revoked(self, jti: str) -> bool:
+        self._maybe_refresh()
+        if jti not in self._bloom:
+            return False
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._revoked[jti] = _aware(expires_at)
+            self._bloom.add(jti)
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() < self._next_refresh:
+            return
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._next_refresh:
+                return
+            self._refreshing = True
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Token revocation refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._next_refresh = time.monotonic() + self.refresh_seconds
+
+    def refresh(self) -> None:
+        sessions = models.AuthSession
+        now = _now()
+        db = SessionLocal()
+        try:
+            query = db.query(sessions.jti, sessions.expires_at, sessions.revoked_at).filter(
+                sessions.revoked_at.isnot(None), sessions.expires_at > now
+            )
+            if self._watermark is not None:
+                query = query.filter(sessions.revoked_at >= self._watermark - _WATERMARK_OVERLAP)
+            rows = query.all()
+        finally:
+            db.close()
+
+        with self._lock:
+            for jti, expires_at, revoked_at in rows:
+                self._revoked[jti] = _aware(expires_at)
+                self._bloom.add(jti)
+                revoked_at = _aware(revoked_at)
+                if self._watermark is None or revoked_at > self._watermark:
+                    self._watermark = revoked_at
+            if self._watermark is None:
+                self._watermark = now
+            if time.monotonic() >= self._next_prune:
+                self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+                self._bloom = BloomFilter()
+                for jti in self._revoked:
+                    self._bloom.add(jti)
+                self._next_prune = time.monotonic() + _PRUNE_SECONDS
+
+
+revocation_list = RevocationList()
+
+
+class AuthSessionService:
+    """Registry of issued access tokens, keyed by their ``jti`` claim."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, user_id: int, expires_delta: timedelta, user_agent: str = None, ip_address: str = None) -> Tuple[str, datetime]:
+        jti = str(uuid.uuid4())
+        expires_at = _now() + expires_delta
+        self.db.add(
+            models.AuthSession(
+                jti=jti,
+                user_id=user_id,
+                user_agent=(user_agent or "")[:255] or None,
+                ip_address=ip_address,
+                expires_at=expires_at,
+            )
+        )
+        self.db.commit()
+        return jti, expires_at
+
+    def _active(self, user_id: int):
+        sessions = models.AuthSession
+        return self.db.query(sessions).filter(
+            sessions.user_id == user_id, sessions.revoked_at.is_(None), sessions.expires_at > _now()
+        )
+
+    def list_active(self, user_id: int) -> List[models.AuthSession]:
+        return self._active(user_id).order_by(models.AuthSession.created_at.desc()).all()
+
+    def count_active(self, user_id: int) -> int:
+        return self._active(user_id).count()
+
+    def revoke(self, sessions: List[models.AuthSession]) -> int:
+        now = _now()
+        for session in sessions:
+            session.revoked_at = now
+        self.db.commit()
+        for session in sessions:
+            revocation_list.add(session.jti, session.expires_at)
+        return len(sessions)
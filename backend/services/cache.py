@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    ``get_or_load`` guards against stampedes: only one caller per key runs
+    the loader; concurrent callers get the previous (stale) value if there
+    is one, or wait for the loader to finish if there is not.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+
+    def _lookup(self, key: Hashable, allow_stale: bool = False) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic() and not allow_stale:
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        if not load_lock.acquire(blocking=False):
+            stale = self._lookup(key, allow_stale=True)
+            if stale is not _MISSING:
+                return stale
+            load_lock.acquire()
+        try:
+            # Another caller may have refreshed it while we waited.
+            value = self._lookup(key)
+            if value is _MISSING:
+                value = loader()
+                self.set(key, value)
+            return value
+        finally:
+            load_lock.release()
+            with self._lock:
+                # A waiter may already have replaced the entry with its own lock.
+                if self._loading.get(key) is load_lock:
+                    del self._loading[key]
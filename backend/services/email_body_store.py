@@ -0,0 +1,104 @@
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+
+EMAIL_BODY_CODEC = os.getenv("EMAIL_BODY_CODEC", "zstd")
+if EMAIL_BODY_CODEC == "zstd" and zstandard is None:
+    EMAIL_BODY_CODEC = "zlib"
+EMAIL_BODY_LEVEL = int(os.getenv("EMAIL_BODY_LEVEL", "6"))
+
+
+def normalize_body(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    text = text.replace("\r\n", "\n").replace("\r", "\n").strip()
+    return text or None
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=EMAIL_BODY_LEVEL).compress(data)
+    return zlib.compress(data, EMAIL_BODY_LEVEL)
+
+
+def _decompress(codec: str, data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Stored email body uses zstd but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return raw.decode("utf-8")
+
+
+class EmailBodyStore:
+    """Full message bodies, compressed, in ``email_message_bodies``.
+
+    Bodies live outside ``email_messages`` so thread and message lists stay
+    narrow; they are only read when a client asks for message detail. Each
+    row records its codec, so switching ``EMAIL_BODY_CODEC`` never breaks
+    rows written earlier.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def save_many(self, bodies: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> None:
+        """Store (message id, plain text, html) for freshly imported messages."""
+        codec = EMAIL_BODY_CODEC
+        rows = []
+        for message_id, plain, html in bodies:
+            plain, html = normalize_body(plain), normalize_body(html)
+            if plain is None and html is None:
+                continue
+            raw = [part.encode("utf-8") if part is not None else None for part in (plain, html)]
+            packed = [_compress(codec, part) if part is not None else None for part in raw]
+            size = sum(len(part) for part in raw if part is not None)
+            if sum(len(part) for part in packed if part is not None) >= size:
+                # Very short bodies grow when compressed; keep those as-is.
+                row_codec, packed = "none", raw
+            else:
+                row_codec = codec
+            rows.append(
+                {
+                    "message_id": message_id,
+                    "codec": row_codec,
+                    "size": size,
+                    "text_plain": packed[0],
+                    "text_html": packed[1],
+                }
+            )
+        if rows:
+            self.db.execute(
+                dialect_insert(self.db, models.EmailMessageBody.__table__)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["message_id"])
+            )
+
+    def load_many(self, message_ids: List[int]) -> Dict[int, Tuple[Optional[str], Optional[str]]]:
+        """Return {message id: (plain text, html)} for the ids that have a stored body."""
+        if not message_ids:
+            return {}
+        body = models.EmailMessageBody
+        rows = self.db.query(body.message_id, body.codec, body.text_plain, body.text_html).filter(
+            body.message_id.in_(message_ids)
+        )
+        return {
+            message_id: (_decompress(codec, plain), _decompress(codec, html))
+            for message_id, codec, plain, html in rows
+        }
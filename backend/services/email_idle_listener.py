@@ -0,0 +1,254 @@
+import asyncio
+import os
+import re
+import ssl
+import threading
+from typing import Dict, Optional
+
+import models
+from database import SessionLocal
+from services.email_sync_scheduler import email_sync_scheduler
+
+
+EMAIL_IDLE_ENABLED = os.getenv("EMAIL_IDLE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_IDLE_MAX_CONNECTIONS = int(os.getenv("EMAIL_IDLE_MAX_CONNECTIONS", "200"))
+
+# RFC 2177: servers may drop an IDLE after 30 minutes, so re-issue it before that.
+_IDLE_RENEW_SECONDS = 29 * 60
+_REFRESH_ACCOUNTS_SECONDS = 60
+_COMMAND_TIMEOUT_SECONDS = 30
+_RECONNECT_MAX_SECONDS = 600
+# Servers can gain IDLE (or an account can move), so look again now and then.
+_UNSUPPORTED_RETRY_SECONDS = 6 * 3600
+
+_EXISTS_RE = re.compile(rb"^\* \d+ EXISTS")
+
+
+class IdleNotSupported(Exception):
+    pass
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class _ImapIdleConnection:
+    """Just enough of IMAP4rev1 over asyncio streams to LOGIN, EXAMINE and IDLE."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._tag = 0
+
+    @classmethod
+    async def open(cls, host: str, port: int) -> "_ImapIdleConnection":
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl.create_default_context()),
+            _COMMAND_TIMEOUT_SECONDS,
+        )
+        conn = cls(reader, writer)
+        await conn._readline()  # server greeting
+        return conn
+
+    async def _readline(self, timeout: Optional[float] = _COMMAND_TIMEOUT_SECONDS) -> bytes:
+        line = await asyncio.wait_for(self.reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("IMAP connection closed")
+        return line.rstrip(b"\r\n")
+
+    async def command(self, text: str) -> list:
+        self._tag += 1
+        tag = f"i{self._tag}".encode()
+        self.writer.write(tag + b" " + text.encode() + b"\r\n")
+        await self.writer.drain()
+        untagged = []
+        while True:
+            line = await self._readline()
+            if line.startswith(tag + b" "):
+                if not line[len(tag) + 1 :].upper().startswith(b"OK"):
+                    raise ConnectionError(line.decode(errors="replace"))
+                return untagged
+            untagged.append(line)
+
+    async def login(self, username: str, password: str) -> None:
+        caps = b" ".join(await self.command("CAPABILITY")).upper().split()
+        if b"IDLE" not in caps:
+            raise IdleNotSupported()
+        await self.command(f"LOGIN {_quote(username)} {_quote(password)}")
+        await self.command("EXAMINE INBOX")
+
+    async def idle(self) -> bool:
+        """Hold one IDLE until new mail arrives (True) or the renew timer fires (False)."""
+        self._tag += 1
+        tag = f"i{self._tag}".encode()
+        self.writer.write(tag + b" IDLE\r\n")
+        await self.writer.drain()
+        if not (await self._readline()).startswith(b"+"):
+            raise IdleNotSupported()
+
+        # The renew timer is for the whole IDLE; untagged EXPUNGE/FETCH
+        # chatter must not keep pushing it out past the server's limit.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _IDLE_RENEW_SECONDS
+        new_mail = False
+        try:
+            while not new_mail:
+                line = await self._readline(timeout=max(0, deadline - loop.time()))
+                new_mail = bool(_EXISTS_RE.match(line))
+        except asyncio.TimeoutError:
+            pass
+
+        self.writer.write(b"DONE\r\n")
+        await self.writer.drain()
+        while not (await self._readline()).startswith(tag + b" "):
+            pass
+        return new_mail
+
+    async def close(self) -> None:
+        try:
+            self.writer.write(b"z LOGOUT\r\n")
+            await self.writer.drain()
+        except Exception:
+            pass
+        self.writer.close()
+
+
+class EmailIdleListener:
+    """Push-based mail pickup using IMAP IDLE.
+
+    One asyncio event loop in a dedicated thread holds an IDLE connection
+    per account (up to ``EMAIL_IDLE_MAX_CONNECTIONS``). When the server
+    reports EXISTS, the account is made due in the sync scheduler, which
+    runs the usual incremental UID sync. While a connection is up the
+    scheduler only polls that account as a slow safety net; servers
+    without IDLE are left to regular polling and checked again every
+    ``_UNSUPPORTED_RETRY_SECONDS``. Connections are restarted when an
+    account's IMAP settings change.
+    """
+
+    def __init__(self, max_connections: int = EMAIL_IDLE_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # account id -> the settings its task was started with
+        self._creds: Dict[int, tuple] = {}
+        # account id -> (settings, loop time to try again) for servers without IDLE
+        self._unsupported: Dict[int, tuple] = {}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="email-idle", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._supervise(), self._loop)
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop = self._thread = None
+
+    async def _shutdown(self) -> None:
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _supervise(self) -> None:
+        while True:
+            try:
+                accounts = await self._loop.run_in_executor(None, self._load_accounts)
+            except Exception as e:
+                print(f"Email IDLE account refresh failed: {e}")
+                accounts = None
+
+            if accounts is not None:
+                for account_id in list(self._tasks):
+                    if accounts.get(account_id) != self._creds.get(account_id):
+                        self._creds.pop(account_id, None)
+                        self._tasks.pop(account_id).cancel()
+                now = self._loop.time()
+                for account_id, creds in accounts.items():
+                    if account_id in self._tasks:
+                        continue
+                    unsupported = self._unsupported.get(account_id)
+                    if unsupported is not None:
+                        if unsupported[0] == creds and now < unsupported[1]:
+                            continue
+                        del self._unsupported[account_id]
+                    if len(self._tasks) >= self.max_connections:
+                        break
+                    self._creds[account_id] = creds
+                    self._tasks[account_id] = asyncio.create_task(self._listen(account_id, *creds))
+
+            await asyncio.sleep(_REFRESH_ACCOUNTS_SECONDS)
+
+    def _load_accounts(self) -> Dict[int, tuple]:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(
+                    models.EmailAccount.id,
+                    models.EmailAccount.imap_host,
+                    models.EmailAccount.imap_port,
+                    models.EmailAccount.imap_username,
+                    models.EmailAccount.imap_password,
+                )
+                .filter(
+                    models.EmailAccount.imap_host.isnot(None),
+                    models.EmailAccount.imap_username.isnot(None),
+                    models.EmailAccount.imap_password.isnot(None),
+                )
+                .order_by(models.EmailAccount.last_synced_at.desc())
+                .all()
+            )
+        finally:
+            db.close()
+        return {r[0]: tuple(r[1:]) for r in rows}
+
+    async def _listen(self, account_id: int, host: str, port: int, username: str, password: str) -> None:
+        delay = 5
+        try:
+            while True:
+                conn = None
+                try:
+                    conn = await _ImapIdleConnection.open(host, port or 993)
+                    await conn.login(username, password)
+                    email_sync_scheduler.set_push_active(account_id, True)
+                    # Catch up on anything that arrived while we were not listening.
+                    await self._request_sync(account_id)
+                    delay = 5
+                    while True:
+                        if await conn.idle():
+                            await self._request_sync(account_id)
+                except IdleNotSupported:
+                    self._unsupported[account_id] = (
+                        (host, port, username, password),
+                        self._loop.time() + _UNSUPPORTED_RETRY_SECONDS,
+                    )
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Email IDLE connection for account {account_id} dropped: {e}")
+                finally:
+                    email_sync_scheduler.set_push_active(account_id, False)
+                    if conn is not None:
+                        await conn.close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _RECONNECT_MAX_SECONDS)
+        finally:
+            # A restarted listener may already have taken this slot.
+            if self._tasks.get(account_id) is asyncio.current_task():
+                del self._tasks[account_id]
+                self._creds.pop(account_id, None)
+
+    async def _request_sync(self, account_id: int) -> None:
+        await self._loop.run_in_executor(None, email_sync_scheduler.request_sync, account_id)
+
+
+email_idle_listener = EmailIdleListener()
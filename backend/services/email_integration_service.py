@@ -1,17 +1,44 @@
 from __future__ import annotations
 
+import hashlib
 import imaplib
+import os
+import re
 import smtplib
 from email.message import EmailMessage as PyEmailMessage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.parser import BytesParser
 from email.policy import default
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 import models
+from database import dialect_insert
+from services.inbox_summary_service import InboxSummaryService
+from services.analytics_rollup_service import AnalyticsRollupService
+from services.email_body_store import EmailBodyStore
+from services.email_threading import EmailThreader, normalize_subject, reference_chain
+from services.imap_pool import imap_fingerprint, imap_pool
+from services.mime_stream import StreamingMimeParser
+
+
+# UIDs per UID FETCH command, and how much of each body is pulled for the preview.
+FETCH_BATCH_SIZE = 100
+PREVIEW_FETCH_BYTES = 4096
+
+_FETCH_ITEMS = f"(UID BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{PREVIEW_FETCH_BYTES}>)"
+
+# Attachments are streamed to disk (outside the public /uploads mount) in
+# partial fetches of this size, so a sync never holds a whole message.
+EMAIL_ATTACHMENT_DIR = os.getenv("EMAIL_ATTACHMENT_DIR", "storage/email_attachments")
+STREAM_FETCH_BYTES = int(os.getenv("EMAIL_STREAM_FETCH_BYTES", str(1024 * 1024)))
+# Per-operation socket timeout for SMTP connections.
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+_UID_RE = re.compile(rb"\bUID (\d+)")
+_SECTION_RE = re.compile(rb"BODY\[(HEADER|TEXT)\]")
 
 
 def _safe_decode_header(value: str | None) -> str:
@@ -42,17 +69,148 @@ def _extract_body_preview(msg) -> str:
     return ""
 
 
+def _select_uidvalidity(imap: imaplib.IMAP4) -> Optional[int]:
+    _, data = imap.response("UIDVALIDITY")
+    try:
+        return int(data[-1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _uid_search(imap: imaplib.IMAP4, criteria: str) -> List[int]:
+    typ, data = imap.uid("SEARCH", None, criteria)
+    if typ != "OK" or not data or not data[0]:
+        return []
+    return sorted(int(u) for u in data[0].split())
+
+
+def _uid_set(uids: List[int]) -> str:
+    """Compress sorted UIDs into an IMAP sequence set, e.g. '3:7,9,12:13'."""
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid != prev + 1:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = uid
+        prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def _fetch_header_batches(imap: imaplib.IMAP4, uids: List[int]) -> Iterator[Tuple[int, bytes, bytes]]:
+    """Yield (uid, header, leading body bytes) with one UID FETCH per batch.
+
+    imaplib returns each message as one or more (prefix, literal) tuples
+    followed by a closing bytes item; the UID can appear in any of them.
+    A failed FETCH raises rather than skipping the batch, so the sync rolls
+    back instead of moving past mail it never saw.
+    """
+    for i in range(0, len(uids), FETCH_BATCH_SIZE):
+        batch = uids[i : i + FETCH_BATCH_SIZE]
+        typ, data = imap.uid("FETCH", _uid_set(batch), _FETCH_ITEMS)
+        if typ != "OK":
+            raise ValueError(f"Could not fetch messages {batch[0]}-{batch[-1]}")
+        if not data:
+            continue
+
+        wanted = set(batch)
+        uid, sections = None, {}
+        for item in data:
+            if isinstance(item, tuple):
+                prefix, literal = item
+                uid = uid or _uid_int(prefix)
+                section = _SECTION_RE.search(prefix)
+                if section:
+                    sections[section.group(1).decode()] = literal or b""
+                continue
+            uid = uid or _uid_int(item or b"")
+            if item and item.endswith(b")"):
+                if uid in wanted and sections.get("HEADER"):
+                    yield uid, sections["HEADER"], sections.get("TEXT", b"")
+                uid, sections = None, {}
+
+
+def _stream_message(imap: imaplib.IMAP4, uid: int, parser: StreamingMimeParser) -> None:
+    """Feed one full message to ``parser`` using ``BODY.PEEK[]<offset.length>`` partials."""
+    offset = 0
+    while True:
+        typ, data = imap.uid("FETCH", str(uid), f"(BODY.PEEK[]<{offset}.{STREAM_FETCH_BYTES}>)")
+        if typ != "OK":
+            raise ValueError(f"Could not fetch message {uid}")
+        chunk = b"".join(item[1] or b"" for item in data or [] if isinstance(item, tuple))
+        parser.feed(chunk)
+        if len(chunk) < STREAM_FETCH_BYTES:
+            break
+        offset += len(chunk)
+    parser.close()
+
+
+def attachment_path(sha256: str) -> str:
+    return os.path.join(EMAIL_ATTACHMENT_DIR, sha256)
+
+
+def _uid_int(data: bytes) -> Optional[int]:
+    match = _UID_RE.search(data)
+    return int(match.group(1)) if match else None
+
+
+def _parse_message(uid: int, header: bytes, text: bytes) -> dict:
+    raw = header.rstrip(b"\r\n") + b"\r\n\r\n" + text
+    parsed = BytesParser(policy=default).parsebytes(raw)
+    message_id = _safe_decode_header(parsed.get("Message-ID"))
+    subject = _safe_decode_header(parsed.get("Subject"))
+    subject_key, is_reply = normalize_subject(subject)
+    references = reference_chain(parsed.get("References"), parsed.get("In-Reply-To"))
+
+    record = {
+        "uid": uid,
+        "message_id": message_id or None,
+        "references": references,
+        "subject_key": subject_key,
+        "is_reply": is_reply or bool(references),
+        "subject": subject,
+        "from_email": _safe_decode_header(parsed.get("From")),
+        "to_email": _safe_decode_header(parsed.get("To")),
+        "date_raw": _safe_decode_header(parsed.get("Date")),
+        "preview": _extract_body_preview(parsed),
+        # A short partial fetch means we already hold the whole message.
+        "raw": raw if len(text) < PREVIEW_FETCH_BYTES else None,
+    }
+    if not record["message_id"]:
+        record["message_id"] = _fallback_message_id(record)
+    return record
+
+
+def _fallback_message_id(record: dict) -> str:
+    """Stand-in Message-ID for mail that has none, built from the stored header
+    columns and preview, so such messages still dedupe once their UIDs change."""
+    fields = (record[k] or "" for k in ("from_email", "to_email", "date_raw", "subject", "preview"))
+    digest = hashlib.sha256("\0".join(fields).encode()).hexdigest()[:32]
+    return f"<{digest}@no-message-id>"
+
+
 class EmailIntegrationService:
     def __init__(self, db: Session):
         self.db = db
 
-    def test_imap(self, account: models.EmailAccount) -> None:
+    def _connect_imap(self, account: models.EmailAccount) -> imaplib.IMAP4:
         if not account.imap_host or not account.imap_username or not account.imap_password:
             raise ValueError("IMAP settings missing")
 
         imap = imaplib.IMAP4_SSL(account.imap_host, account.imap_port)
         try:
             imap.login(account.imap_username, account.imap_password)
+        except Exception:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+            raise
+        return imap
+
+    def test_imap(self, account: models.EmailAccount) -> None:
+        imap = self._connect_imap(account)
+        try:
             imap.select("INBOX")
         finally:
             try:
@@ -64,114 +222,237 @@ class EmailIntegrationService:
         if not account.smtp_host or not account.smtp_username or not account.smtp_password:
             raise ValueError("SMTP settings missing")
 
-        with smtplib.SMTP(account.smtp_host, account.smtp_port) as server:
+        with smtplib.SMTP(account.smtp_host, account.smtp_port, timeout=SMTP_TIMEOUT_SECONDS) as server:
             if account.smtp_use_tls:
                 server.starttls()
             server.login(account.smtp_username, account.smtp_password)
 
     def sync_inbox(self, account: models.EmailAccount, limit: int = 25) -> int:
-        if not account.imap_host or not account.imap_username or not account.imap_password:
-            raise ValueError("IMAP settings missing")
-
-        imap = imaplib.IMAP4_SSL(account.imap_host, account.imap_port)
+        """Import messages that arrived since the last sync.
+
+        The account remembers the mailbox UIDVALIDITY and the highest UID
+        imported so far, so a steady-state sync only asks the server for
+        ``UID last+1:*``. The first sync (or one after UIDVALIDITY changed)
+        takes the newest ``limit`` messages; later syncs import at most
+        ``limit`` new messages, oldest first, and pick up the rest next time.
+
+        The authenticated connection is reused across syncs via ``imap_pool``.
+        """
+        fingerprint = imap_fingerprint(
+            account.imap_host, account.imap_port, account.imap_username, account.imap_password
+        )
+        imap = imap_pool.checkout(account.id, fingerprint, lambda: self._connect_imap(account))
+        healthy = True
         try:
-            imap.login(account.imap_username, account.imap_password)
-            imap.select("INBOX")
-
-            typ, data = imap.search(None, "ALL")
-            if typ != "OK" or not data or not data[0]:
+            typ, _ = imap.select("INBOX", readonly=True)
+            if typ != "OK":
+                raise ValueError("Could not open INBOX")
+
+            uidvalidity = _select_uidvalidity(imap)
+            if uidvalidity is None or uidvalidity != account.imap_uidvalidity:
+                # Mailbox was recreated (or never synced): stored UIDs mean nothing now.
+                if account.imap_uidvalidity is not None:
+                    self.db.query(models.EmailMessage).filter(
+                        models.EmailMessage.account_id == account.id
+                    ).update({models.EmailMessage.imap_uid: None}, synchronize_session=False)
+                account.imap_uidvalidity = uidvalidity
+                account.imap_last_uid = 0
+
+            last_uid = account.imap_last_uid or 0
+            if last_uid:
+                uids = _uid_search(imap, f"UID {last_uid + 1}:*")
+                # "n:*" always matches the highest UID, even when it is below n.
+                uids = [u for u in uids if u > last_uid][: max(1, limit)]
+            else:
+                uids = _uid_search(imap, "ALL")[-max(1, limit):]
+            if not uids:
+                self.db.commit()
                 return 0
 
-            ids = data[0].split()
-            newest = list(reversed(ids))[: max(1, limit)]
-
+            # Headers plus the first few KB of the body are enough to thread
+            # and preview; longer messages are streamed in full afterwards
+            # (see _store_contents).
             imported = 0
-            for uid in newest:
-                typ, msg_data = imap.fetch(uid, "(RFC822)")
-                if typ != "OK" or not msg_data:
-                    continue
-
-                raw = msg_data[0][1]
-                if not raw:
-                    continue
-
-                parsed = BytesParser(policy=default).parsebytes(raw)
-
-                message_id = _safe_decode_header(parsed.get("Message-ID"))
-                if message_id:
-                    exists = (
-                        self.db.query(models.EmailMessage)
-                        .filter(models.EmailMessage.account_id == account.id, models.EmailMessage.message_id == message_id)
-                        .first()
-                    )
-                    if exists:
-                        continue
-
-                subject = _safe_decode_header(parsed.get("Subject"))
-                from_addr = _safe_decode_header(parsed.get("From"))
-                to_addr = _safe_decode_header(parsed.get("To"))
-                date_hdr = _safe_decode_header(parsed.get("Date"))
-                preview = _extract_body_preview(parsed)
-
-                thread_key = message_id or _safe_decode_header(parsed.get("In-Reply-To"))
-                if not thread_key:
-                    thread_key = f"subj:{subject.lower()}"
-
-                thread = (
-                    self.db.query(models.EmailThread)
-                    .filter(models.EmailThread.account_id == account.id, models.EmailThread.thread_key == thread_key)
-                    .first()
-                )
-
-                if not thread:
-                    thread = models.EmailThread(
-                        account_id=account.id,
-                        thread_key=thread_key,
-                        subject=subject,
-                        snippet=preview,
-                        last_from=from_addr,
-                    )
-                    self.db.add(thread)
-                    self.db.flush()
-
-                email_msg = models.EmailMessage(
-                    account_id=account.id,
-                    thread_id=thread.id,
-                    message_id=message_id or None,
-                    subject=subject,
-                    from_email=from_addr,
-                    to_email=to_addr,
-                    date_raw=date_hdr,
-                    body_preview=preview,
-                    is_read=False,
-                )
-                self.db.add(email_msg)
-
-                thread.subject = thread.subject or subject
-                thread.snippet = preview or thread.snippet
-                thread.last_from = from_addr or thread.last_from
-
-                imported += 1
-
+            summary = InboxSummaryService(self.db)
+            batch: List[dict] = []
+            for uid, header, text in _fetch_header_batches(imap, uids):
+                batch.append(_parse_message(uid, header, text))
+                if len(batch) >= FETCH_BATCH_SIZE:
+                    imported += self._ingest_batch(imap, account, batch, summary)
+                    batch = []
+            if batch:
+                imported += self._ingest_batch(imap, account, batch, summary)
+            # Only once every batch came back; UIDs missing from a successful
+            # FETCH were expunged in between and won't reappear.
+            account.imap_last_uid = max(account.imap_last_uid or 0, uids[-1])
+
+            if imported:
+                AnalyticsRollupService(self.db).record("emails", amount=imported)
             self.db.commit()
+            summary.publish()
             return imported
+        except Exception:
+            healthy = False
+            raise
         finally:
+            imap_pool.checkin(account.id, imap, fingerprint, healthy=healthy)
+
+    def _ingest_batch(
+        self, imap: imaplib.IMAP4, account: models.EmailAccount, records: List[dict], summary: InboxSummaryService
+    ) -> int:
+        """Insert a batch of parsed messages with a fixed number of queries.
+
+        Known Message-IDs (or ``_fallback_message_id`` keys) are filtered
+        with one IN query, threads are resolved in bulk by
+        ``EmailThreader``, and messages go in with ON CONFLICT (account_id, message_id) DO NOTHING, so a concurrent
+        sync of the same account cannot create duplicates. The email
+        unread counter moves by the change in the threads the batch touched.
+        """
+        ids = {r["message_id"] for r in records if r["message_id"]}
+        known = set()
+        if ids:
+            known = {
+                mid
+                for (mid,) in self.db.query(models.EmailMessage.message_id).filter(
+                    models.EmailMessage.account_id == account.id,
+                    models.EmailMessage.message_id.in_(ids),
+                )
+            }
+        fresh, seen = [], set()
+        for r in records:
+            mid = r["message_id"]
+            if mid and (mid in known or mid in seen):
+                continue
+            seen.add(mid)
+            fresh.append(r)
+        if not fresh:
+            return 0
+
+        threader = EmailThreader(self.db, account.id, uidvalidity=account.imap_uidvalidity, summary=summary)
+        thread_ids = threader.assign(fresh)
+
+        stmt = (
+            dialect_insert(self.db, models.EmailMessage.__table__)
+            .values(
+                [
+                    {
+                        "account_id": account.id,
+                        "thread_id": thread_id,
+                        "message_id": r["message_id"],
+                        "imap_uid": r["uid"],
+                        "subject": r["subject"],
+                        "from_email": r["from_email"],
+                        "to_email": r["to_email"],
+                        "date_raw": r["date_raw"],
+                        "body_preview": r["preview"],
+                        "is_read": False,
+                    }
+                    for r, thread_id in zip(fresh, thread_ids)
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["account_id", "message_id"])
+            .returning(
+                models.EmailMessage.__table__.c.id,
+                models.EmailMessage.__table__.c.message_id,
+                models.EmailMessage.__table__.c.imap_uid,
+            )
+        )
+        inserted = {(mid, uid): row_id for row_id, mid, uid in self.db.execute(stmt)}
+        threader.index(fresh, thread_ids)
+        summary.adjust_email(account.user_id, set(thread_ids), threader.unread_before)
+        self._store_contents(
+            imap,
+            account,
+            [(inserted[(r["message_id"], r["uid"])], r) for r in fresh if (r["message_id"], r["uid"]) in inserted],
+        )
+
+        # Latest inserted message per thread becomes its snippet / last sender.
+        latest: Dict[int, dict] = {}
+        for r, thread_id in zip(fresh, thread_ids):
+            if (r["message_id"], r["uid"]) in inserted:
+                latest[thread_id] = r
+        if latest:
+            self.db.execute(
+                update(models.EmailThread),
+                [
+                    {"id": thread_id, "snippet": r["preview"], "last_from": r["from_email"]}
+                    for thread_id, r in latest.items()
+                ],
+            )
+        return len(inserted)
+
+    def _store_contents(self, imap: imaplib.IMAP4, account: models.EmailAccount, messages: List[Tuple[int, dict]]) -> None:
+        """Parse each new (message row id, record) in full: files to disk, bodies to ``EmailBodyStore``.
+
+        Messages that fit in the preview fetch are parsed from the bytes
+        already in hand; longer ones are streamed with ``_stream_message``.
+        Attachment parts are decoded straight into content-addressed files,
+        so memory use is bounded by ``STREAM_FETCH_BYTES`` per sync no
+        matter how large the message is.
+        """
+        if not messages:
+            return
+        os.makedirs(EMAIL_ATTACHMENT_DIR, exist_ok=True)
+        attachments, bodies = [], []
+        for message_row_id, record in messages:
+            parser = StreamingMimeParser(EMAIL_ATTACHMENT_DIR)
             try:
-                imap.logout()
-            except Exception:
-                pass
+                if record["raw"] is not None:
+                    parser.feed(record["raw"])
+                    parser.close()
+                else:
+                    _stream_message(imap, record["uid"], parser)
+            except (imaplib.IMAP4.abort, OSError):
+                # Connection-level failure: fail the sync so it is retried.
+                parser.abort()
+                raise
+            except Exception as e:
+                # One malformed message must not block the account; keep its
+                # header row and preview, just without a stored body.
+                parser.abort()
+                print(f"Could not parse message uid {record['uid']} for account {account.id}: {e}")
+                continue
+            attachments.extend(
+                {
+                    "message_id": message_row_id,
+                    "account_id": account.id,
+                    "filename": a["filename"],
+                    "content_type": a["content_type"],
+                    "content_id": a["content_id"],
+                    "is_inline": a["inline"],
+                    "size": a["size"],
+                    "sha256": a["sha256"],
+                }
+                for a in parser.attachments
+            )
+            bodies.append((message_row_id, parser.texts.get("text/plain"), parser.texts.get("text/html")))
+        if attachments:
+            self.db.execute(models.EmailAttachment.__table__.insert(), attachments)
+        EmailBodyStore(self.db).save_many(bodies)
+
+    def connect_smtp(self, account: models.EmailAccount) -> smtplib.SMTP:
+        """Open an authenticated SMTP session; the caller quits it."""
+        if not account.smtp_host or not account.smtp_username or not account.smtp_password:
+            raise ValueError("SMTP settings missing")
 
-    def send_email(
-        self,
+        server = smtplib.SMTP(account.smtp_host, account.smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if account.smtp_use_tls:
+                server.starttls()
+            server.login(account.smtp_username, account.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    @staticmethod
+    def build_message(
         account: models.EmailAccount,
         to_email: str,
         subject: str,
         body: str,
         is_html: bool = False,
-    ) -> None:
-        if not account.smtp_host or not account.smtp_username or not account.smtp_password:
-            raise ValueError("SMTP settings missing")
-
+    ) -> MIMEMultipart:
         msg = MIMEMultipart("alternative")
         msg["Subject"] = subject
         msg["From"] = account.from_email or account.smtp_username
@@ -179,9 +460,16 @@ class EmailIntegrationService:
 
         mime = MIMEText(body, "html" if is_html else "plain")
         msg.attach(mime)
+        return msg
 
-        with smtplib.SMTP(account.smtp_host, account.smtp_port) as server:
-            if account.smtp_use_tls:
-                server.starttls()
-            server.login(account.smtp_username, account.smtp_password)
+    def send_email(
+        self,
+        account: models.EmailAccount,
+        to_email: str,
+        subject: str,
+        body: str,
+        is_html: bool = False,
+    ) -> None:
+        msg = self.build_message(account, to_email, subject, body, is_html)
+        with self.connect_smtp(account) as server:
             server.send_message(msg)
@@ -0,0 +1,333 @@
+import hashlib
+import os
+import random
+import re
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.email_integration_service import EmailIntegrationService
+
+
+EMAIL_OUTBOX_ENABLED = os.getenv("EMAIL_OUTBOX_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "4"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETRY_SECONDS = int(os.getenv("EMAIL_OUTBOX_RETRY_SECONDS", "30"))
+EMAIL_OUTBOX_CLAIM_SIZE = int(os.getenv("EMAIL_OUTBOX_CLAIM_SIZE", "50"))
+# How long an idle SMTP session is kept open for the next message of the same account.
+SMTP_SESSION_IDLE_SECONDS = int(os.getenv("SMTP_SESSION_IDLE_SECONDS", "60"))
+
+_TICK_SECONDS = 2
+# A claimed message left in "sending" this long (worker died) is retried.
+# Each message's lease is renewed right before it is sent, so this only has
+# to cover one send (bounded by SMTP_TIMEOUT_SECONDS per operation).
+_LEASE_SECONDS = 300
+
+_MERGE_FIELD_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def render_merge(template: str, fields: Dict[str, str]) -> str:
+    """Replace ``{{ name }}`` placeholders; unknown names become empty."""
+    return _MERGE_FIELD_RE.sub(lambda m: str(fields.get(m.group(1), "")), template or "")
+
+
+def _is_transient(exc: Exception) -> bool:
+    """4xx replies and dropped connections are worth retrying; 5xx and bad settings are not."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+def _session_broken(exc: Exception) -> bool:
+    # A refused recipient or rejected message leaves the session usable.
+    return not isinstance(exc, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused))
+
+
+def _smtp_fingerprint(account: models.EmailAccount) -> Tuple:
+    password = hashlib.sha256((account.smtp_password or "").encode()).hexdigest()
+    return (account.smtp_host, account.smtp_port, account.smtp_username, password, account.smtp_use_tls)
+
+
+class EmailOutbox:
+    """Persistent outbound mail queue drained by a background worker pool.
+
+    The API only inserts ``outbound_emails`` rows and returns their ids. A
+    dispatcher thread hands each account with due messages to one worker
+    at a time, which claims up to ``EMAIL_OUTBOX_CLAIM_SIZE`` messages and
+    sends them all over a single SMTP session. Sessions are kept open for
+    ``SMTP_SESSION_IDLE_SECONDS`` so the next burst skips STARTTLS and
+    login. Transient failures (4xx, dropped connections) are retried with
+    exponential backoff up to ``EMAIL_OUTBOX_MAX_ATTEMPTS``; permanent ones
+    mark the message failed with the server's reply.
+    """
+
+    def __init__(self, workers: int = EMAIL_OUTBOX_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight: Set[int] = set()
+        self._sessions: Dict[int, Tuple[smtplib.SMTP, Tuple, float]] = {}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-outbox")
+        self._thread = threading.Thread(target=self._run, name="email-outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=_TICK_SECONDS * 2)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            sessions = [server for server, _, _ in self._sessions.values()]
+            self._sessions.clear()
+        for server in sessions:
+            self._quit(server)
+
+    def enqueue(self, db: Session, account: models.EmailAccount, messages: List[Dict], batch_id: Optional[str] = None) -> List[int]:
+        """Queue messages (dicts of to_email, subject, body, is_html) and return their ids."""
+        now = _now()
+        rows = [
+            models.OutboundEmail(account_id=account.id, batch_id=batch_id, status="queued", attempts=0, next_attempt_at=now, **m)
+            for m in messages
+        ]
+        db.add_all(rows)
+        db.flush()
+        ids = [row.id for row in rows]
+        db.commit()
+        self._wake.set()
+        return ids
+
+    def send_now(self, db: Session, account: models.EmailAccount, message: Dict) -> models.OutboundEmail:
+        """Send one message inside the request, for when the background worker is off.
+
+        The row is still written (under a lease, so a worker elsewhere leaves
+        it alone) and records the outcome.
+        """
+        row = models.OutboundEmail(
+            account_id=account.id,
+            status="sending",
+            attempts=1,
+            claimed_by=str(uuid.uuid4()),
+            next_attempt_at=_now() + timedelta(seconds=_LEASE_SECONDS),
+            **message,
+        )
+        db.add(row)
+        db.commit()
+        try:
+            EmailIntegrationService(db).send_email(account, row.to_email, row.subject, row.body, row.is_html)
+        except Exception as e:
+            row.status = "failed"
+            row.last_error = str(e)[:500]
+        else:
+            row.status = "sent"
+            row.sent_at = _now()
+        db.commit()
+        return row
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch()
+                self._reap_sessions()
+            except Exception as e:
+                print(f"Email outbox dispatcher error: {e}")
+            self._wake.wait(_TICK_SECONDS)
+            self._wake.clear()
+
+    def _dispatch(self) -> None:
+        outbound = models.OutboundEmail
+        db = SessionLocal()
+        try:
+            due = (
+                db.query(outbound.account_id)
+                .filter(outbound.status.in_(("queued", "sending")), outbound.next_attempt_at <= _now())
+                .distinct()
+                .limit(self.workers * 4)
+                .all()
+            )
+        finally:
+            db.close()
+
+        for (account_id,) in due:
+            with self._lock:
+                if account_id in self._inflight:
+                    continue
+                self._inflight.add(account_id)
+            self._pool.submit(self._drain, account_id)
+
+    def _drain(self, account_id: int) -> None:
+        try:
+            while not self._stop.is_set() and self._send_claimed(account_id):
+                pass
+        except Exception as e:
+            print(f"Email outbox failed for account {account_id}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(account_id)
+            self._wake.set()
+
+    def _send_claimed(self, account_id: int) -> bool:
+        """Send one claimed chunk over one SMTP session; True if more may be waiting."""
+        db = SessionLocal()
+        try:
+            token, rows = self._claim(db, account_id)
+            if not rows:
+                return False
+            account = db.get(models.EmailAccount, account_id)
+            service = EmailIntegrationService(db)
+            fingerprint = _smtp_fingerprint(account)
+
+            server = None
+            for i, row in enumerate(rows):
+                if not self._renew(db, row.id, token):
+                    # The lease ran out and another worker took the message over.
+                    continue
+                if server is None:
+                    try:
+                        server = self._checkout(account, fingerprint, service)
+                    except Exception as e:
+                        # Cannot connect or log in: the rest of the chunk fails the same way.
+                        for pending in rows[i:]:
+                            self._record_failure(pending, e)
+                        db.commit()
+                        return False
+                try:
+                    server.send_message(service.build_message(account, row.to_email, row.subject, row.body, row.is_html))
+                except Exception as e:
+                    if _session_broken(e):
+                        self._quit(server)
+                        server = None
+                    self._record_failure(row, e)
+                else:
+                    row.status = "sent"
+                    row.attempts = (row.attempts or 0) + 1
+                    row.sent_at = _now()
+                    row.last_error = None
+                # Commit per message so a crash never re-sends what already went out.
+                db.commit()
+
+            if server is not None:
+                self._checkin(account_id, server, fingerprint)
+            return len(rows) >= EMAIL_OUTBOX_CLAIM_SIZE
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, account_id: int) -> Tuple[str, List[models.OutboundEmail]]:
+        outbound = models.OutboundEmail
+        now = _now()
+        due = (outbound.account_id == account_id, outbound.status.in_(("queued", "sending")), outbound.next_attempt_at <= now)
+        ids = [
+            row_id
+            for (row_id,) in db.query(outbound.id).filter(*due).order_by(outbound.id).limit(EMAIL_OUTBOX_CLAIM_SIZE)
+        ]
+        if not ids:
+            return "", []
+        token = str(uuid.uuid4())
+        db.query(outbound).filter(outbound.id.in_(ids), *due).update(
+            {
+                outbound.status: "sending",
+                outbound.claimed_by: token,
+                outbound.next_attempt_at: now + timedelta(seconds=_LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return token, db.query(outbound).filter(outbound.claimed_by == token).order_by(outbound.id).all()
+
+    @staticmethod
+    def _renew(db: Session, row_id: int, token: str) -> bool:
+        """Extend the lease on a claimed message just before sending it; False if it is no longer ours."""
+        outbound = models.OutboundEmail
+        renewed = (
+            db.query(outbound)
+            .filter(outbound.id == row_id, outbound.claimed_by == token, outbound.status == "sending")
+            .update({outbound.next_attempt_at: _now() + timedelta(seconds=_LEASE_SECONDS)}, synchronize_session=False)
+        )
+        db.commit()
+        return renewed == 1
+
+    @staticmethod
+    def _record_failure(row: models.OutboundEmail, exc: Exception) -> None:
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = str(exc)[:500]
+        if _is_transient(exc) and row.attempts < EMAIL_OUTBOX_MAX_ATTEMPTS:
+            backoff = EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (row.attempts - 1)
+            row.status = "queued"
+            row.next_attempt_at = _now() + timedelta(seconds=backoff * random.uniform(0.8, 1.2))
+        else:
+            row.status = "failed"
+
+    def _checkout(self, account: models.EmailAccount, fingerprint: Tuple, service: EmailIntegrationService) -> smtplib.SMTP:
+        with self._lock:
+            entry = self._sessions.pop(account.id, None)
+        if entry is not None:
+            server, session_fingerprint, last_used = entry
+            fresh = time.monotonic() - last_used < SMTP_SESSION_IDLE_SECONDS
+            if session_fingerprint == fingerprint and fresh and self._healthy(server):
+                return server
+            self._quit(server)
+        return service.connect_smtp(account)
+
+    def _checkin(self, account_id: int, server: smtplib.SMTP, fingerprint: Tuple) -> None:
+        with self._lock:
+            previous = self._sessions.pop(account_id, None)
+            self._sessions[account_id] = (server, fingerprint, time.monotonic())
+        if previous is not None:
+            self._quit(previous[0])
+
+    def _reap_sessions(self) -> None:
+        cutoff = time.monotonic() - SMTP_SESSION_IDLE_SECONDS
+        with self._lock:
+            stale = [key for key, (_, _, last_used) in self._sessions.items() if last_used < cutoff]
+            servers = [self._sessions.pop(key)[0] for key in stale]
+        for server in servers:
+            self._quit(server)
+
+    @staticmethod
+    def _healthy(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+
+email_outbox = EmailOutbox()
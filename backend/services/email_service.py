@@ -11,6 +11,7 @@ class EmailService:
         self.smtp_user = os.getenv('SMTP_USER', 'noreply@example.com')
         self.smtp_password = os.getenv('SMTP_PASSWORD', '')
         self.from_email = os.getenv('SMTP_FROM_EMAIL', self.smtp_user)
+        self.smtp_timeout = float(os.getenv('SMTP_TIMEOUT_SECONDS', '30'))
         self.enabled = all([self.smtp_server, self.smtp_user, self.smtp_password])
 
     def send_notification_email(self, to_email: str, subject: str, html_content: str) -> bool:
@@ -47,7 +48,7 @@ class EmailService:
             msg.attach(MIMEText(html, 'html'))
 
             # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.smtp_timeout) as server:
                 server.starttls()
                 server.login(self.smtp_user, self.smtp_password)
                 server.send_message(msg)
@@ -0,0 +1,290 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import case, or_, true
+
+import models
+from database import SessionLocal
+from services.email_integration_service import EmailIntegrationService
+from services.imap_pool import imap_pool
+
+
+EMAIL_SYNC_ENABLED = os.getenv("EMAIL_SYNC_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_SYNC_INTERVAL_SECONDS = int(os.getenv("EMAIL_SYNC_INTERVAL_SECONDS", "300"))
+# Safety-net poll for accounts that currently have an IMAP IDLE connection.
+EMAIL_SYNC_PUSH_INTERVAL_SECONDS = int(os.getenv("EMAIL_SYNC_PUSH_INTERVAL_SECONDS", "1800"))
+EMAIL_SYNC_WORKERS = int(os.getenv("EMAIL_SYNC_WORKERS", "4"))
+EMAIL_SYNC_PER_HOST = int(os.getenv("EMAIL_SYNC_PER_HOST", "2"))
+EMAIL_SYNC_BATCH_LIMIT = int(os.getenv("EMAIL_SYNC_BATCH_LIMIT", "200"))
+EMAIL_SYNC_RETRY_SECONDS = int(os.getenv("EMAIL_SYNC_RETRY_SECONDS", "60"))
+EMAIL_SYNC_MAX_BACKOFF_SECONDS = int(os.getenv("EMAIL_SYNC_MAX_BACKOFF_SECONDS", "3600"))
+EMAIL_SYNC_JITTER = float(os.getenv("EMAIL_SYNC_JITTER", "0.2"))
+
+# How often the dispatcher looks for due accounts, and how long a claimed
+# sync may run before another worker (or process) is allowed to take over.
+_TICK_SECONDS = 5
+_LEASE_SECONDS = 600
+
+# Shared by every /sync-all request, so concurrent requests queue for the
+# same EMAIL_SYNC_WORKERS threads instead of each starting a pool.
+_manual_sync_pool = ThreadPoolExecutor(max_workers=EMAIL_SYNC_WORKERS, thread_name_prefix="email-sync-manual")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _jittered(seconds: float) -> timedelta:
+    return timedelta(seconds=seconds * random.uniform(1 - EMAIL_SYNC_JITTER, 1 + EMAIL_SYNC_JITTER))
+
+
+class SyncInProgress(Exception):
+    pass
+
+
+class EmailSyncScheduler:
+    """Background IMAP sync for every configured email account.
+
+    A dispatcher thread picks accounts whose ``next_sync_at`` is due and
+    hands them to a bounded thread pool, never running more than
+    ``EMAIL_SYNC_PER_HOST`` syncs against the same IMAP host at once.
+    Successful syncs are rescheduled one (jittered) interval later, or
+    immediately if the batch limit was hit; failures back off
+    exponentially up to ``EMAIL_SYNC_MAX_BACKOFF_SECONDS``.
+
+    Before syncing, an account is claimed with a conditional UPDATE that
+    pushes ``next_sync_at`` out by a lease, so several API processes can
+    each run a scheduler without syncing the same account twice.
+    """
+
+    def __init__(self, workers: int = EMAIL_SYNC_WORKERS, per_host: int = EMAIL_SYNC_PER_HOST):
+        self.workers = workers
+        self.per_host = per_host
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight: Set[int] = set()
+        self._push_active: Set[int] = set()
+        self._host_slots: Dict[str, threading.Semaphore] = {}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-sync")
+        self._thread = threading.Thread(target=self._run, name="email-sync-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=_TICK_SECONDS * 2)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        imap_pool.close_all()
+
+    def request_sync(self, account_id: int) -> None:
+        """Make an account due now and wake the dispatcher.
+
+        If a sync is running, it may already be past the new mail, so the
+        account is flagged instead and synced again as soon as it finishes.
+        """
+        account = models.EmailAccount
+        syncing = account.sync_status == "syncing"
+        db = SessionLocal()
+        try:
+            # One statement, so a sync finishing concurrently can't slip between the cases.
+            db.query(account).filter(account.id == account_id).update(
+                {
+                    account.next_sync_at: case((syncing, account.next_sync_at), else_=_now()),
+                    account.sync_pending: case((syncing, true()), else_=account.sync_pending),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._wake.set()
+
+    def set_push_active(self, account_id: int, active: bool) -> None:
+        """Mark whether new mail for an account is being pushed (IMAP IDLE)."""
+        with self._lock:
+            if active:
+                self._push_active.add(account_id)
+            else:
+                self._push_active.discard(account_id)
+
+    def sync_account(self, account_id: int, limit: Optional[int] = None, force: bool = False) -> Optional[int]:
+        """Claim and sync one account; returns the number imported, or None if not due.
+
+        ``force`` ignores the schedule (manual syncs) but still refuses to
+        run while another sync holds the account, raising ``SyncInProgress``.
+        """
+        limit = limit or EMAIL_SYNC_BATCH_LIMIT
+        db = SessionLocal()
+        try:
+            if not self._claim(db, account_id, force):
+                if force:
+                    raise SyncInProgress("A sync is already running for this account")
+                return None
+
+            account = db.get(models.EmailAccount, account_id)
+            try:
+                imported = EmailIntegrationService(db).sync_inbox(account, limit=limit)
+            except Exception as e:
+                db.rollback()
+                account.sync_failures = (account.sync_failures or 0) + 1
+                account.sync_status = "error"
+                account.last_sync_error = str(e)[:500]
+                backoff = min(
+                    EMAIL_SYNC_MAX_BACKOFF_SECONDS,
+                    EMAIL_SYNC_RETRY_SECONDS * 2 ** (account.sync_failures - 1),
+                )
+                account.next_sync_at = _now() + _jittered(backoff)
+                db.commit()
+                raise
+
+            now = _now()
+            account.sync_status = "idle"
+            account.sync_failures = 0
+            account.last_sync_error = None
+            account.last_synced_at = now
+            # A full batch means more mail is waiting; go again right away.
+            with self._lock:
+                pushed = account_id in self._push_active
+            interval = EMAIL_SYNC_PUSH_INTERVAL_SECONDS if pushed else EMAIL_SYNC_INTERVAL_SECONDS
+            account.next_sync_at = now if imported >= limit else now + _jittered(interval)
+            db.commit()
+            self._honour_pending(db, account_id)
+            return imported
+        finally:
+            db.close()
+
+    def sync_accounts(self, account_ids: List[int], limit: Optional[int] = None) -> List[Dict]:
+        """Sync several accounts concurrently (shared bounded pool, per-host limits) and report each result."""
+        db = SessionLocal()
+        try:
+            hosts = dict(
+                db.query(models.EmailAccount.id, models.EmailAccount.imap_host)
+                .filter(models.EmailAccount.id.in_(account_ids))
+                .all()
+            )
+        finally:
+            db.close()
+
+        def run(account_id: int) -> Dict:
+            slot = self._host_slot(hosts.get(account_id))
+            started = time.monotonic()
+            with slot:
+                try:
+                    imported = self.sync_account(account_id, limit=limit, force=True)
+                    result = {"status": "ok", "imported": imported or 0, "error": None}
+                except SyncInProgress as e:
+                    result = {"status": "busy", "imported": 0, "error": str(e)}
+                except Exception as e:
+                    result = {"status": "error", "imported": 0, "error": str(e)[:500]}
+            result.update(account_id=account_id, duration_ms=int((time.monotonic() - started) * 1000))
+            return result
+
+        if not account_ids:
+            return []
+        return list(_manual_sync_pool.map(run, account_ids))
+
+    def _host_slot(self, host: Optional[str]) -> threading.Semaphore:
+        with self._lock:
+            return self._host_slots.setdefault((host or "").lower(), threading.Semaphore(self.per_host))
+
+    def _honour_pending(self, db, account_id: int) -> None:
+        """Make the account due again if new mail was pushed during its sync."""
+        resync = (
+            db.query(models.EmailAccount)
+            .filter(models.EmailAccount.id == account_id, models.EmailAccount.sync_pending.is_(True))
+            .update(
+                {models.EmailAccount.sync_pending: False, models.EmailAccount.next_sync_at: _now()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if resync:
+            self._wake.set()
+
+    def _claim(self, db, account_id: int, force: bool) -> bool:
+        now = _now()
+        account = models.EmailAccount
+        query = db.query(account).filter(account.id == account_id)
+        due = or_(account.next_sync_at.is_(None), account.next_sync_at <= now)
+        if force:
+            query = query.filter(or_(account.sync_status != "syncing", due))
+        else:
+            query = query.filter(due)
+        claimed = query.update(
+            {
+                account.sync_status: "syncing",
+                account.sync_pending: False,
+                account.next_sync_at: now + timedelta(seconds=_LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return claimed == 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch()
+                imap_pool.reap()
+            except Exception as e:
+                print(f"Email sync dispatcher error: {e}")
+            self._wake.wait(_TICK_SECONDS)
+            self._wake.clear()
+
+    def _dispatch(self) -> None:
+        db = SessionLocal()
+        try:
+            due = (
+                db.query(models.EmailAccount.id, models.EmailAccount.imap_host)
+                .filter(
+                    models.EmailAccount.imap_host.isnot(None),
+                    or_(models.EmailAccount.next_sync_at.is_(None), models.EmailAccount.next_sync_at <= _now()),
+                )
+                .order_by(models.EmailAccount.next_sync_at)
+                .limit(self.workers * 4)
+                .all()
+            )
+        finally:
+            db.close()
+
+        for account_id, host in due:
+            with self._lock:
+                if account_id in self._inflight:
+                    continue
+                slot = self._host_slots.setdefault((host or "").lower(), threading.Semaphore(self.per_host))
+                if not slot.acquire(blocking=False):
+                    continue
+                self._inflight.add(account_id)
+            self._pool.submit(self._sync_in_background, account_id, slot)
+
+    def _sync_in_background(self, account_id: int, slot: threading.Semaphore) -> None:
+        try:
+            self.sync_account(account_id)
+        except Exception as e:
+            print(f"Email sync failed for account {account_id}: {e}")
+        finally:
+            slot.release()
+            with self._lock:
+                self._inflight.discard(account_id)
+            # A host slot just freed up; look for more due accounts now.
+            self._wake.set()
+
+
+email_sync_scheduler = EmailSyncScheduler()
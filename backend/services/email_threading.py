@@ -0,0 +1,262 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+from services.inbox_summary_service import InboxSummaryService
+
+
+_MSG_ID_RE = re.compile(r"<[^<>\s]+>")
+_REPLY_PREFIX_RE = re.compile(r"^\s*((re|fw|fwd|aw|sv|wg)(\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+_LIST_TAG_RE = re.compile(r"^\s*\[[^\]]{1,40}\]\s*")
+
+
+def parse_message_ids(value: Optional[str]) -> List[str]:
+    return _MSG_ID_RE.findall(value or "")
+
+
+def reference_chain(references: Optional[str], in_reply_to: Optional[str]) -> List[str]:
+    """Ancestors of a message, oldest first (References, then In-Reply-To)."""
+    chain = parse_message_ids(references)
+    for parent in parse_message_ids(in_reply_to)[-1:]:
+        if parent not in chain:
+            chain.append(parent)
+    return chain
+
+
+def normalize_subject(subject: Optional[str]) -> Tuple[str, bool]:
+    """Strip list tags and Re:/Fwd: prefixes; returns (key, was_reply)."""
+    text = subject or ""
+    was_reply = False
+    while True:
+        stripped = _LIST_TAG_RE.sub("", text, count=1)
+        m = _REPLY_PREFIX_RE.match(stripped)
+        if m:
+            was_reply = True
+            stripped = stripped[m.end():]
+        if stripped == text:
+            break
+        text = stripped
+    return " ".join(text.lower().split())[:255], was_reply
+
+
+class _Nodes:
+    """Union-find over existing threads ('t', id) and not-yet-created ones ('n', index)."""
+
+    def __init__(self):
+        self.parent: Dict[tuple, tuple] = {}
+
+    def find(self, node: tuple) -> tuple:
+        self.parent.setdefault(node, node)
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    def union(self, a: tuple, b: tuple) -> tuple:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        # Existing threads win over new ones, and the oldest existing thread wins.
+        keep, drop = (ra, rb) if self._rank(ra) <= self._rank(rb) else (rb, ra)
+        self.parent[drop] = keep
+        return keep
+
+    @staticmethod
+    def _rank(node: tuple):
+        return (0 if node[0] == "t" else 1, node[1])
+
+
+class EmailThreader:
+    """JWZ-style conversation threading backed by a persistent id index.
+
+    ``email_thread_refs`` maps every Message-ID an account has seen, either
+    as a message or only as a reference, to its thread. A message joins the
+    thread of any id in its own Message-ID / References / In-Reply-To chain;
+    if the chain touches several threads they are merged into the oldest.
+    Messages with no known ancestors but a reply-style subject ("Re: ...")
+    fall back to the most recent thread with the same normalized subject.
+
+    ``assign`` resolves a whole batch with two IN queries, and ``index``
+    records the batch's ids once its messages are inserted.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        account_id: int,
+        uidvalidity: Optional[int] = None,
+        summary: Optional[InboxSummaryService] = None,
+    ):
+        self.db = db
+        self.account_id = account_id
+        self.uidvalidity = uidvalidity
+        self.summary = summary or InboxSummaryService(db)
+        # Unread threads among the existing ones the last ``assign`` joined
+        # or merged, counted before merging (for the inbox counters).
+        self.unread_before = 0
+
+    def assign(self, records: List[dict]) -> List[int]:
+        """Return the thread id for each record, creating and merging threads as needed."""
+        refs = models.EmailThreadRef
+        all_ids = {mid for r in records for mid in self._ids(r)}
+        known: Dict[str, int] = {}
+        if all_ids:
+            known = dict(
+                self.db.query(refs.message_id, refs.thread_id).filter(
+                    refs.account_id == self.account_id, refs.message_id.in_(all_ids)
+                )
+            )
+
+        subject_keys = {r["subject_key"] for r in records if r["subject_key"]}
+        by_subject: Dict[str, int] = {}
+        if subject_keys:
+            rows = (
+                self.db.query(models.EmailThread.subject_key, models.EmailThread.id)
+                .filter(
+                    models.EmailThread.account_id == self.account_id,
+                    models.EmailThread.subject_key.in_(subject_keys),
+                )
+                .order_by(models.EmailThread.updated_at)
+            )
+            by_subject = dict(rows)  # later (more recent) rows win
+
+        nodes = _Nodes()
+        local_ids: Dict[str, tuple] = {}
+        local_subjects: Dict[str, tuple] = {}
+        assigned: List[tuple] = []
+        for i, r in enumerate(records):
+            hits = []
+            for mid in self._ids(r):
+                if mid in local_ids:
+                    hits.append(local_ids[mid])
+                elif mid in known:
+                    hits.append(("t", known[mid]))
+            if not hits and r["is_reply"] and r["subject_key"]:
+                if r["subject_key"] in local_subjects:
+                    hits.append(local_subjects[r["subject_key"]])
+                elif r["subject_key"] in by_subject:
+                    hits.append(("t", by_subject[r["subject_key"]]))
+
+            node = nodes.find(("n", i))
+            for hit in hits:
+                node = nodes.union(node, hit)
+            assigned.append(node)
+            for mid in self._ids(r):
+                local_ids[mid] = node
+            if r["subject_key"]:
+                local_subjects.setdefault(r["subject_key"], node)
+
+        roots = [nodes.find(n) for n in assigned]
+        new_ids = self._create_threads(records, {root for root in roots if root[0] == "n"})
+        # "New" threads can resolve to existing ones through thread_key, so count after creating.
+        touched = {node[1] for node in nodes.parent if node[0] == "t"} | set(new_ids.values())
+        self.unread_before = self.summary.unread_threads(touched)
+        self._merge(nodes)
+
+        return [new_ids[root] if root[0] == "n" else root[1] for root in roots]
+
+    def index(self, records: List[dict], thread_ids: List[int]) -> None:
+        rows = {}
+        for r, thread_id in zip(records, thread_ids):
+            for mid in self._ids(r):
+                rows.setdefault(mid, thread_id)
+        if not rows:
+            return
+        self.db.execute(
+            dialect_insert(self.db, models.EmailThreadRef.__table__)
+            .values([{"account_id": self.account_id, "message_id": mid, "thread_id": tid} for mid, tid in rows.items()])
+            .on_conflict_do_nothing(index_elements=["account_id", "message_id"])
+        )
+
+    @staticmethod
+    def _ids(record: dict) -> List[str]:
+        ids = list(record["references"])
+        if record["message_id"] and record["message_id"] not in ids:
+            ids.append(record["message_id"])
+        return ids
+
+    def _create_threads(self, records: List[dict], roots) -> Dict[tuple, int]:
+        if not roots:
+            return {}
+        thread = models.EmailThread
+        keys = {}
+        for root in roots:
+            r = records[root[1]]
+            # The conversation root id is stable, so a concurrent sync creating
+            # the same conversation collides on (account_id, thread_key). UIDs
+            # restart when the mailbox is recreated, hence the UIDVALIDITY.
+            chain = self._ids(r)
+            keys[root] = chain[0] if chain else f"uid:{self.uidvalidity}:{r['uid']}"
+        self.db.execute(
+            dialect_insert(self.db, thread.__table__)
+            .values(
+                [
+                    {
+                        "account_id": self.account_id,
+                        "thread_key": keys[root],
+                        "subject": records[root[1]]["subject"],
+                        "subject_key": records[root[1]]["subject_key"],
+                        "snippet": records[root[1]]["preview"],
+                        "last_from": records[root[1]]["from_email"],
+                    }
+                    for root in roots
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["account_id", "thread_key"])
+        )
+        found = dict(
+            self.db.query(thread.thread_key, thread.id).filter(
+                thread.account_id == self.account_id, thread.thread_key.in_(set(keys.values()))
+            )
+        )
+        return {root: found[key] for root, key in keys.items()}
+
+    def _merge(self, nodes: _Nodes) -> None:
+        """Fold existing threads that turned out to be one conversation into the oldest.
+
+        Messages, refs and inbox pins move to the surviving thread; a pin
+        on a losing thread whose winner is already pinned is dropped. The
+        unread counter is settled by the caller (see ``unread_before``).
+        """
+        losers: Dict[int, int] = {}
+        for node in list(nodes.parent):
+            root = nodes.find(node)
+            if node[0] == "t" and root != node and root[0] == "t":
+                losers[node[1]] = root[1]
+        if not losers:
+            return
+        for loser, winner in losers.items():
+            self.db.execute(
+                update(models.EmailMessage).where(models.EmailMessage.thread_id == loser).values(thread_id=winner)
+            )
+            self.db.execute(
+                update(models.EmailThreadRef).where(models.EmailThreadRef.thread_id == loser).values(thread_id=winner)
+            )
+        self._merge_pins(losers)
+        self.db.execute(delete(models.EmailThread).where(models.EmailThread.id.in_(list(losers))))
+
+    def _merge_pins(self, losers: Dict[int, int]) -> None:
+        pin = models.InboxPin
+        pins = (
+            self.db.query(pin.id, pin.user_id, pin.source_id)
+            .filter(pin.source == "email", pin.source_id.in_(list(losers) + list(set(losers.values()))))
+            .all()
+        )
+        pinned = {(user_id, thread_id) for _, user_id, thread_id in pins}
+        dropped = []
+        for pin_id, user_id, thread_id in pins:
+            if thread_id not in losers:
+                continue
+            target = (user_id, losers[thread_id])
+            if target in pinned:
+                dropped.append(pin_id)
+                self.summary.adjust(user_id, "email", pinned=-1)
+            else:
+                pinned.add(target)
+                self.db.execute(update(pin).where(pin.id == pin_id).values(source_id=target[1]))
+        if dropped:
+            self.db.execute(delete(pin).where(pin.id.in_(dropped)))
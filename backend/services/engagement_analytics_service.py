@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from services.analytics_rollup_service import AnalyticsRollupService
+
+
+# Upper bounds (seconds) of the response-time histogram bins; the last bin is open-ended.
+RESPONSE_TIME_BINS = (60, 300, 900, 3600, 4 * 3600, 24 * 3600)
+RESPONSE_TIME_LABELS = ("<1m", "1-5m", "5-15m", "15-60m", "1-4h", "4-24h")
+
+# A reply later than this is treated as a new conversation, not a response.
+MAX_RESPONSE_GAP_SECONDS = 24 * 3600
+# response_times reads raw messages, so its window is capped.
+RESPONSE_TIMES_MAX_DAYS = 30
+
+_RESPONSE_FETCH_ROWS = 100000
+
+
+def _member_channels(user_id: int):
+    return select(models.ChannelMember.channel_id).where(models.ChannelMember.user_id == user_id)
+
+
+def _segment_ids(segments: List[str]) -> np.ndarray:
+    return np.fromiter((int(s.partition(":")[2]) for s in segments), dtype=np.int64, count=len(segments))
+
+
+class EngagementAnalyticsService:
+    """Per-channel/user/project breakdowns of the analytics rollups.
+
+    Rows are pulled as a few flat columns and aggregated with NumPy
+    (bincount / argpartition / diff) instead of looping over them in
+    Python, so the cost is dominated by fetching compact rollup rows.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.rollups = AnalyticsRollupService(db)
+
+    def top_channels(self, user_id: int, days: int, n: int = 10) -> List[Dict]:
+        """Busiest channels the user is a member of."""
+        rows = self.rollups.bucket_rows("messages", "day", days, segment_prefix="channel")
+        if not rows:
+            return []
+        segments, _, counts = zip(*rows)
+        channel_ids = _segment_ids(segments)
+        counts = np.asarray(counts, dtype=np.int64)
+        visible = np.isin(channel_ids, [cid for (cid,) in self.db.execute(_member_channels(user_id))])
+        if not visible.any():
+            return []
+        channel_ids, counts = channel_ids[visible], counts[visible]
+
+        unique_ids, inverse = np.unique(channel_ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=counts).astype(np.int64)
+        n = min(n, len(unique_ids))
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top], kind="stable")]
+
+        ids = [int(i) for i in unique_ids[top]]
+        names = dict(
+            self.db.query(models.Channel.id, models.Channel.name).filter(models.Channel.id.in_(ids)).all()
+        )
+        active = self.rollups.distinct_counts("active_users", days, [f"channel:{channel_id}" for channel_id in ids])
+        return [
+            {
+                "channel_id": channel_id,
+                "name": names.get(channel_id),
+                "messages": int(total),
+                "active_users": active[f"channel:{channel_id}"],
+            }
+            for channel_id, total in zip(ids, totals[top])
+        ]
+
+    def heatmap(self, days: int, metric: str = "messages", segment: str = "all") -> List[List[int]]:
+        """7x24 matrix of event counts by UTC weekday (Monday first) and hour."""
+        rows = self.rollups.bucket_rows(metric, "hour", days, segment=segment)
+        if not rows:
+            return np.zeros((7, 24), dtype=np.int64).tolist()
+        _, starts, counts = zip(*rows)
+        hours = np.array(starts, dtype="datetime64[h]").astype(np.int64)
+        # 1970-01-01 was a Thursday (weekday 3 with Monday == 0).
+        cells = ((hours // 24 + 3) % 7) * 24 + hours % 24
+        grid = np.bincount(cells, weights=np.asarray(counts, dtype=np.int64), minlength=7 * 24)
+        return grid.astype(np.int64).reshape(7, 24).tolist()
+
+    def response_times(self, user_id: int, days: int, channel_id: Optional[int] = None) -> Dict:
+        """Distribution of the gap between a message and the next one by someone else in the channel.
+
+        Only channels the user is a member of are counted. Covers at most
+        ``RESPONSE_TIMES_MAX_DAYS`` days.
+        """
+        channels, senders, seconds = self._message_columns(
+            user_id, min(days, RESPONSE_TIMES_MAX_DAYS), channel_id
+        )
+
+        same_channel = channels[1:] == channels[:-1]
+        other_sender = senders[1:] != senders[:-1]
+        gaps = np.diff(seconds)
+        gaps = gaps[same_channel & other_sender & (gaps >= 0) & (gaps <= MAX_RESPONSE_GAP_SECONDS)]
+
+        hist, _ = np.histogram(gaps, bins=(0,) + RESPONSE_TIME_BINS)
+        if gaps.size:
+            p50, p90, p99 = (float(round(v, 1)) for v in np.percentile(gaps, [50, 90, 99]))
+        else:
+            p50 = p90 = p99 = None
+        return {
+            "responses": int(gaps.size),
+            "p50_seconds": p50,
+            "p90_seconds": p90,
+            "p99_seconds": p99,
+            "mean_seconds": float(round(gaps.mean(), 1)) if gaps.size else None,
+            "histogram": [{"bucket": label, "count": int(c)} for label, c in zip(RESPONSE_TIME_LABELS, hist)],
+        }
+
+    def _message_columns(self, user_id: int, days: int, channel_id: Optional[int]):
+        ts = models.Message.timestamp
+        if self.db.get_bind().dialect.name == "sqlite":
+            epoch = (func.julianday(ts) - 2440587.5) * 86400.0
+        else:
+            epoch = func.extract("epoch", ts)
+        since = datetime.utcnow() - timedelta(days=days)
+        stmt = (
+            select(models.Message.channel_id, models.Message.sender_id, epoch)
+            .where(
+                ts >= since,
+                models.Message.channel_id.in_(_member_channels(user_id)),
+                models.Message.sender_id.isnot(None),
+            )
+            .order_by(models.Message.channel_id, ts)
+            .execution_options(stream_results=True, yield_per=_RESPONSE_FETCH_ROWS)
+        )
+        if channel_id is not None:
+            stmt = stmt.where(models.Message.channel_id == channel_id)
+
+        # Core execution on the session's connection skips ORM row processing.
+        chunks = [
+            np.fromiter(chain.from_iterable(partition), dtype=np.float64, count=3 * len(partition)).reshape(-1, 3)
+            for partition in self.db.connection().execute(stmt).partitions()
+        ]
+        data = np.concatenate(chunks) if chunks else np.empty((0, 3))
+        return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
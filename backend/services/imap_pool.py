@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Tuple
+
+import imaplib
+
+
+IMAP_POOL_IDLE_SECONDS = int(os.getenv("IMAP_POOL_IDLE_SECONDS", "600"))
+IMAP_POOL_MAX_CONNECTIONS = int(os.getenv("IMAP_POOL_MAX_CONNECTIONS", "100"))
+
+
+def imap_fingerprint(host: str, port: int, username: str, password: str) -> Tuple:
+    """Identifies the credentials a pooled connection was opened with."""
+    return (host, port, username, hashlib.sha256((password or "").encode()).hexdigest())
+
+
+class ImapConnectionPool:
+    """Keeps one authenticated IMAP connection per account between syncs.
+
+    A connection is checked out for the duration of a sync and checked back
+    in afterwards. On checkout it is health-checked with NOOP and replaced
+    if it fails, has been idle longer than ``IMAP_POOL_IDLE_SECONDS`` (well
+    under the 30 minute server autologout), or the account's credentials
+    changed. At most ``IMAP_POOL_MAX_CONNECTIONS`` idle connections are
+    kept; the least recently used are logged out first.
+    """
+
+    def __init__(self, max_connections: int = IMAP_POOL_MAX_CONNECTIONS, idle_seconds: float = IMAP_POOL_IDLE_SECONDS):
+        self.max_connections = max_connections
+        self.idle_seconds = idle_seconds
+        self._idle: "OrderedDict[Hashable, Tuple[imaplib.IMAP4, Tuple, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, key: Hashable, fingerprint: Tuple, connect: Callable[[], imaplib.IMAP4]) -> imaplib.IMAP4:
+        with self._lock:
+            entry = self._idle.pop(key, None)
+        if entry is not None:
+            conn, conn_fingerprint, last_used = entry
+            fresh = time.monotonic() - last_used < self.idle_seconds
+            if conn_fingerprint == fingerprint and fresh and self._healthy(conn):
+                return conn
+            self._close(conn)
+        return connect()
+
+    def checkin(self, key: Hashable, conn: imaplib.IMAP4, fingerprint: Tuple, healthy: bool = True) -> None:
+        if not healthy:
+            self._close(conn)
+            return
+        evicted: List[imaplib.IMAP4] = []
+        with self._lock:
+            previous = self._idle.pop(key, None)
+            if previous is not None:
+                evicted.append(previous[0])
+            self._idle[key] = (conn, fingerprint, time.monotonic())
+            while len(self._idle) > self.max_connections:
+                evicted.append(self._idle.popitem(last=False)[1][0])
+        for old in evicted:
+            self._close(old)
+
+    def reap(self) -> None:
+        """Log out connections that have been idle too long."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            stale = [key for key, (_, _, last_used) in self._idle.items() if last_used < cutoff]
+            conns = [self._idle.pop(key)[0] for key in stale]
+        for conn in conns:
+            self._close(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns = [conn for conn, _, _ in self._idle.values()]
+            self._idle.clear()
+        for conn in conns:
+            self._close(conn)
+
+    @staticmethod
+    def _healthy(conn: imaplib.IMAP4) -> bool:
+        try:
+            typ, _ = conn.noop()
+            return typ == "OK"
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn: imaplib.IMAP4) -> None:
+        try:
+            conn.logout()
+        except Exception:
+            pass
+
+
+imap_pool = ImapConnectionPool()
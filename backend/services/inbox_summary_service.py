@@ -0,0 +1,185 @@
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+from services.ws_manager import notification_ws_manager
+
+
+INBOX_SOURCES = ("chat", "notification", "email", "task")
+
+
+class InboxSummaryService:
+    """Per-user unread/pinned counters for the inbox badge.
+
+    Counters live in ``inbox_counters`` and are adjusted in the same
+    transaction as the change that affects them, so reading the summary is a
+    single indexed lookup instead of a full inbox build. A user's rows are
+    seeded from the source tables the first time the summary is requested.
+    The email counter counts threads with an unread message; callers pass
+    the threads they touch to ``adjust_email`` rather than recounting.
+
+    Callers adjust counters before ``db.commit()`` and call ``publish()``
+    after it, which pushes the accumulated deltas over the notification
+    WebSocket.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._deltas: List[Tuple[int, str, int, int]] = []
+
+    def get_summary(self, user_id: int) -> Dict:
+        rows = (
+            self.db.query(models.InboxCounter)
+            .filter(models.InboxCounter.user_id == user_id)
+            .all()
+        )
+        if len(rows) < len(INBOX_SOURCES):
+            rows = self.seed(user_id)
+
+        sources = {
+            r.source: {"unread": max(0, r.unread_count or 0), "pinned": max(0, r.pinned_count or 0)}
+            for r in rows
+        }
+        return {
+            "unread_count": sum(c["unread"] for c in sources.values()),
+            "pinned_count": sum(c["pinned"] for c in sources.values()),
+            "sources": sources,
+        }
+
+    def seed(self, user_id: int) -> List[models.InboxCounter]:
+        """Create a user's missing counter rows from the source tables.
+
+        Concurrent first requests may both seed; ON CONFLICT DO NOTHING
+        keeps the rows that landed first instead of failing on
+        ``uq_inbox_counters_user_source``.
+        """
+        return self._write_counts(user_id, overwrite=False)
+
+    def rebuild(self, user_id: int) -> List[models.InboxCounter]:
+        """Recompute a user's counters from the source tables."""
+        return self._write_counts(user_id, overwrite=True)
+
+    def _write_counts(self, user_id: int, overwrite: bool) -> List[models.InboxCounter]:
+        # Count on the primary even from a read session: values seeded from a
+        # lagging replica would never be corrected by later deltas.
+        if getattr(self.db, "replica", None) is not None:
+            self.db.replica = None
+        unread = {
+            "notification": self._notification_unread(user_id),
+            "email": self._email_unread(user_id),
+        }
+        pinned = dict(
+            self.db.query(models.InboxPin.source, func.count(models.InboxPin.id))
+            .filter(models.InboxPin.user_id == user_id)
+            .group_by(models.InboxPin.source)
+            .all()
+        )
+
+        stmt = dialect_insert(self.db, models.InboxCounter.__table__).values(
+            [
+                {
+                    "user_id": user_id,
+                    "source": source,
+                    "unread_count": unread.get(source, 0),
+                    "pinned_count": pinned.get(source, 0),
+                }
+                for source in INBOX_SOURCES
+            ]
+        )
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "source"],
+                set_={"unread_count": stmt.excluded.unread_count, "pinned_count": stmt.excluded.pinned_count},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "source"])
+        self.db.execute(stmt)
+        self.db.commit()
+        return (
+            self.db.query(models.InboxCounter)
+            .filter(models.InboxCounter.user_id == user_id)
+            .all()
+        )
+
+    def adjust(self, user_id: int, source: str, unread: int = 0, pinned: int = 0) -> None:
+        """Apply a delta to a user's counters.
+
+        Users whose counters were never seeded have no rows; the update is a
+        no-op for them and the next ``get_summary`` seeds exact values.
+        """
+        if not unread and not pinned:
+            return
+        self.db.query(models.InboxCounter).filter(
+            models.InboxCounter.user_id == user_id,
+            models.InboxCounter.source == source,
+        ).update(
+            {
+                models.InboxCounter.unread_count: models.InboxCounter.unread_count + unread,
+                models.InboxCounter.pinned_count: models.InboxCounter.pinned_count + pinned,
+            },
+            synchronize_session=False,
+        )
+        self._deltas.append((user_id, source, unread, pinned))
+
+    def unread_threads(self, thread_ids: Iterable[int]) -> int:
+        """How many of ``thread_ids`` (a list or a subquery) have an unread message."""
+        if isinstance(thread_ids, (list, tuple, set, frozenset)):
+            thread_ids = list(thread_ids)
+            if not thread_ids:
+                return 0
+        self.db.flush()
+        return (
+            self.db.query(func.count(func.distinct(models.EmailMessage.thread_id)))
+            .filter(models.EmailMessage.thread_id.in_(thread_ids), models.EmailMessage.is_read == False)
+            .scalar()
+            or 0
+        )
+
+    def adjust_email(self, user_id: int, thread_ids: Iterable[int], unread_before: int) -> None:
+        """Move the email counter by how ``thread_ids`` changed since ``unread_threads`` gave ``unread_before``."""
+        self.adjust(user_id, "email", unread=self.unread_threads(thread_ids) - unread_before)
+
+    def clear_email(self, user_id: int) -> None:
+        """Zero the email counter after every message of the user was marked read."""
+        current = (
+            self.db.query(models.InboxCounter.unread_count)
+            .filter(models.InboxCounter.user_id == user_id, models.InboxCounter.source == "email")
+            .scalar()
+        )
+        if current:
+            self.adjust(user_id, "email", unread=-current)
+
+    def publish(self) -> None:
+        by_user: Dict[int, List[Dict]] = {}
+        for user_id, source, unread, pinned in self._deltas:
+            by_user.setdefault(user_id, []).append({"source": source, "unread": unread, "pinned": pinned})
+        self._deltas = []
+
+        for user_id, deltas in by_user.items():
+            try:
+                notification_ws_manager.send_to_user_sync(
+                    user_id,
+                    {"type": "inbox.summary", "data": {"deltas": deltas}},
+                )
+            except Exception:
+                pass
+
+    def _notification_unread(self, user_id: int) -> int:
+        return (
+            self.db.query(func.count(models.Notification.id))
+            .filter(models.Notification.user_id == user_id, models.Notification.is_read == False)
+            .scalar()
+            or 0
+        )
+
+    def _email_unread(self, user_id: int) -> int:
+        return (
+            self.db.query(func.count(func.distinct(models.EmailMessage.thread_id)))
+            .join(models.EmailAccount, models.EmailMessage.account_id == models.EmailAccount.id)
+            .filter(models.EmailAccount.user_id == user_id, models.EmailMessage.is_read == False)
+            .scalar()
+            or 0
+        )
@@ -0,0 +1,282 @@
+import binascii
+import hashlib
+import os
+import tempfile
+from email.parser import BytesHeaderParser
+from email.policy import default
+from typing import Dict, List, Optional
+
+
+# Text bodies kept in memory per message, per type; the rest is dropped.
+TEXT_PART_LIMIT = 1024 * 1024
+# Longest run without a newline we buffer before passing it through as content.
+_MAX_LINE = 64 * 1024
+_MAX_HEADER_BYTES = 256 * 1024
+_TEXT_TYPES = ("text/plain", "text/html")
+
+
+class _TextSink:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        room = self.limit - self.size
+        if room > 0 and data:
+            data = data[:room]
+            self.chunks.append(data)
+            self.size += len(data)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+class _FileSink:
+    """Streams decoded bytes to a temp file, then stores it under its SHA-256."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix=".part-", delete=False)
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        if data:
+            self._file.write(data)
+            self._hash.update(data)
+            self.size += len(data)
+
+    def finish(self) -> str:
+        self._file.close()
+        digest = self._hash.hexdigest()
+        final = os.path.join(self.directory, digest)
+        if os.path.exists(final):
+            os.remove(self._file.name)  # same content already stored
+        else:
+            os.replace(self._file.name, final)
+        return digest
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except OSError:
+            pass
+
+
+class _Base64Decoder:
+    def __init__(self, sink):
+        self.sink = sink
+        self._rest = b""
+
+    def write(self, data: bytes) -> None:
+        data = self._rest + data.translate(None, b" \t\r\n")
+        usable = len(data) - len(data) % 4
+        self._rest = data[usable:]
+        if usable:
+            self.sink.write(_a2b_base64(data[:usable]))
+
+    def close(self) -> None:
+        if self._rest:
+            self.sink.write(_a2b_base64(self._rest + b"=" * (-len(self._rest) % 4)))
+            self._rest = b""
+
+
+class _QuotedPrintableDecoder:
+    def __init__(self, sink):
+        self.sink = sink
+        self._line = b""
+
+    def write(self, data: bytes) -> None:
+        data = self._line + data
+        cut = data.rfind(b"\n") + 1
+        self._line = data[cut:]
+        if cut:
+            self.sink.write(binascii.a2b_qp(data[:cut]))
+        if len(self._line) > _MAX_LINE:
+            self.sink.write(binascii.a2b_qp(self._line))
+            self._line = b""
+
+    def close(self) -> None:
+        if self._line:
+            self.sink.write(binascii.a2b_qp(self._line))
+            self._line = b""
+
+
+class _RawDecoder:
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write(self, data: bytes) -> None:
+        self.sink.write(data)
+
+    def close(self) -> None:
+        pass
+
+
+def _a2b_base64(data: bytes) -> bytes:
+    try:
+        return binascii.a2b_base64(data)
+    except binascii.Error:
+        return b""
+
+
+def _decode_text(data: bytes, charset: Optional[str]) -> str:
+    # Senders declare charsets Python doesn't know (e.g. "x-unknown-8bit");
+    # fall back to utf-8 rather than failing the whole message.
+    try:
+        return data.decode(charset or "utf-8", errors="replace")
+    except (LookupError, UnicodeDecodeError):
+        return data.decode("utf-8", errors="replace")
+
+
+def _decoder(encoding: str, sink):
+    encoding = (encoding or "7bit").strip().lower()
+    if encoding == "base64":
+        return _Base64Decoder(sink)
+    if encoding == "quoted-printable":
+        return _QuotedPrintableDecoder(sink)
+    return _RawDecoder(sink)
+
+
+class StreamingMimeParser:
+    """Incremental MIME parser for messages of any size.
+
+    Feed raw message bytes in chunks of any size. Attachment (non-text or
+    ``Content-Disposition: attachment``) parts are decoded on the fly and
+    written to ``attachment_dir`` named by their SHA-256; the first
+    text/plain and text/html bodies are kept in memory up to
+    ``text_limit`` bytes each. Memory use is bounded by the chunk size plus
+    those limits, regardless of message size.
+    """
+
+    def __init__(self, attachment_dir: str, text_limit: int = TEXT_PART_LIMIT):
+        self.attachment_dir = attachment_dir
+        self.text_limit = text_limit
+        self.attachments: List[Dict] = []
+        self.texts: Dict[str, str] = {}
+
+        self._buf = b""
+        self._state = "headers"  # headers, body, skip
+        self._header = bytearray()
+        self._boundaries: List[bytes] = []
+        self._decoder = None
+        self._part: Optional[Dict] = None
+        self._pending_eol = b""
+        self._midline = False
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+        while True:
+            nl = self._buf.find(b"\n")
+            if nl < 0:
+                if len(self._buf) > _MAX_LINE and self._state != "headers":
+                    # A long line cannot be a boundary; pass it through as content.
+                    self._content(self._buf, b"")
+                    self._buf = b""
+                    self._midline = True
+                return
+            line, self._buf = self._buf[: nl + 1], self._buf[nl + 1 :]
+            self._line(line)
+            self._midline = False
+
+    def close(self) -> None:
+        if self._buf:
+            self._line(self._buf)
+            self._buf = b""
+        if self._state == "headers" and self._header:
+            self._start_part()
+        self._finish_part()
+
+    def abort(self) -> None:
+        if self._part is not None and isinstance(self._part.get("sink"), _FileSink):
+            self._part["sink"].abort()
+        self._part = self._decoder = None
+
+    def _line(self, line: bytes) -> None:
+        content = line.rstrip(b"\r\n")
+        eol = line[len(content) :]
+
+        if self._state == "headers":
+            if content:
+                if len(self._header) < _MAX_HEADER_BYTES:
+                    self._header += line
+                return
+            self._start_part()
+            return
+
+        if not self._midline and self._boundaries and content.startswith(b"--"):
+            marker = content.rstrip(b" \t")
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = b"--" + self._boundaries[depth]
+                if marker == boundary:
+                    self._finish_part()
+                    del self._boundaries[depth + 1 :]
+                    self._state = "headers"
+                    return
+                if marker == boundary + b"--":
+                    self._finish_part()
+                    del self._boundaries[depth:]
+                    self._state = "skip"  # epilogue, up to an outer boundary
+                    return
+
+        if self._state == "body":
+            self._content(content, eol)
+
+    def _content(self, data: bytes, eol: bytes) -> None:
+        if self._decoder is not None:
+            self._decoder.write(self._pending_eol + data)
+        # The line break before a boundary belongs to the boundary, so hold it back.
+        self._pending_eol = eol
+
+    def _start_part(self) -> None:
+        headers = BytesHeaderParser(policy=default).parsebytes(bytes(self._header) + b"\r\n")
+        self._header = bytearray()
+        self._pending_eol = b""
+
+        content_type = headers.get_content_type()
+        if headers.get_content_maintype() == "multipart":
+            boundary = headers.get_boundary()
+            if boundary:
+                self._boundaries.append(boundary.encode("latin-1", "replace"))
+                self._state = "skip"  # preamble
+                return
+
+        self._state = "body"
+        filename = headers.get_filename()
+        disposition = headers.get_content_disposition()
+        encoding = headers.get("Content-Transfer-Encoding", "7bit")
+        if content_type in _TEXT_TYPES and disposition != "attachment" and not filename:
+            if content_type in self.texts:
+                self._part = self._decoder = None  # only the first body of each type
+                return
+            sink = _TextSink(self.text_limit)
+            self._part = {"kind": "text", "content_type": content_type, "charset": headers.get_content_charset(), "sink": sink}
+        else:
+            sink = _FileSink(self.attachment_dir)
+            self._part = {
+                "kind": "file",
+                "content_type": content_type,
+                "filename": filename or "",
+                "content_id": (headers.get("Content-ID") or "").strip("<> ") or None,
+                "inline": disposition == "inline",
+                "sink": sink,
+            }
+        self._decoder = _decoder(encoding, sink)
+
+    def _finish_part(self) -> None:
+        part, decoder = self._part, self._decoder
+        self._part = self._decoder = None
+        self._pending_eol = b""
+        if part is None:
+            return
+        decoder.close()
+        sink = part.pop("sink")
+        if part["kind"] == "text":
+            self.texts[part["content_type"]] = _decode_text(sink.getvalue(), part["charset"])
+        else:
+            part["sha256"] = sink.finish()
+            part["size"] = sink.size
+            del part["kind"]
+            self.attachments.append(part)
@@ -6,6 +6,8 @@ from fastapi import HTTPException
 import models, schemas
 from database import get_db
 from services.email_service import EmailService
+from services.inbox_summary_service import InboxSummaryService
+from services.analytics_rollup_service import AnalyticsRollupService
 from services.ws_manager import notification_ws_manager
 
 class NotificationService:
@@ -15,8 +17,14 @@ class NotificationService:
     def create_notification(self, notification: schemas.NotificationCreate) -> models.Notification:
         db_notification = models.Notification(**notification.dict())
         self.db.add(db_notification)
+        summary = InboxSummaryService(self.db)
+        summary.adjust(notification.user_id, "notification", unread=1)
+        AnalyticsRollupService(self.db).record(
+            "notifications", segments=("all", f"user:{notification.user_id}")
+        )
         self.db.commit()
         self.db.refresh(db_notification)
+        summary.publish()
 
         try:
             notification_ws_manager.send_to_user_sync(
@@ -87,10 +95,14 @@ class NotificationService:
         
         if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
-            
+
+        summary = InboxSummaryService(self.db)
+        if not notification.is_read:
+            summary.adjust(user_id, "notification", unread=-1)
         notification.is_read = True
         self.db.commit()
         self.db.refresh(notification)
+        summary.publish()
         return notification
 
     def get_unread_count(self, user_id: int) -> int:
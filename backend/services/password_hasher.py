@@ -0,0 +1,81 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hash jobs allowed to wait for a worker; anything beyond is rejected at once.
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "8"))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Re-hash on login when a stored hash was made with a different cost.
+PASSWORD_REHASH = os.getenv("PASSWORD_REHASH", "true").lower() in ("1", "true", "yes")
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def build_context(rounds: int = BCRYPT_ROUNDS, rehash: bool = PASSWORD_REHASH) -> CryptContext:
+    settings = {"bcrypt__default_rounds": rounds}
+    if rehash:
+        # Hashes outside [rounds, rounds] are reported by verify_and_update.
+        settings.update(bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", **settings)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool with a hard queue limit.
+
+    bcrypt releases the GIL, so hashing on these threads does not block the
+    interpreter, but each hash burns ~100-300 ms of CPU. Running it on the
+    request threadpool lets a login burst occupy every request thread; here
+    at most ``workers`` hashes run at once and ``queue`` more may wait.
+    Callers beyond that get ``PasswordHasherBusy`` immediately, which the
+    API turns into a 503.
+    """
+
+    def __init__(
+        self,
+        context: CryptContext,
+        workers: int = PASSWORD_HASH_WORKERS,
+        queue: int = PASSWORD_HASH_QUEUE,
+        timeout: float = PASSWORD_HASH_TIMEOUT_SECONDS,
+    ):
+        self.context = context
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def hash(self, password: str) -> str:
+        return self._run(self.context.hash, password)
+
+    def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Return (matches, new_hash); new_hash is set when the stored hash should be replaced."""
+        if not hashed:
+            return False, None
+        return self._run(self.context.verify_and_update, password, hashed)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.queue:
+                raise PasswordHasherBusy("Password hashing is saturated")
+            self._pending += 1
+        future: Future = self._pool.submit(fn, *args)
+        # Release the slot when the job finishes, not when we stop waiting,
+        # so timed-out jobs still count against the limit.
+        future.add_done_callback(self._release)
+        return future.result(timeout=self.timeout)
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+
+password_hasher = PasswordHasher(build_context())
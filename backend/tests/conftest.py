@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app imports its modules top-level ("import models"), and database.py
+# binds its engine at import time, so both must be set up before any import.
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _BACKEND_DIR)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="teamos-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ.setdefault("EMAIL_SYNC_ENABLED", "false")
+os.environ.setdefault("EMAIL_IDLE_ENABLED", "false")
+os.environ.setdefault("EMAIL_OUTBOX_ENABLED", "false")
+os.environ.setdefault("EMAIL_ATTACHMENT_DIR", os.path.join(_TMP_DIR, "attachments"))
+
+import database  # noqa: E402
+import models  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    database.Base.metadata.create_all(database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        database.Base.metadata.drop_all(database.engine)
+
+
+@pytest.fixture
+def user(db):
+    row = models.User(username="alice", email="alice@example.com", password="x")
+    db.add(row)
+    db.commit()
+    return row
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def auth_headers():
+    """Build a bearer header for a user."""
+    from routers.auth import create_access_token
+
+    def headers(user):
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+    return headers
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    """A FakeMailbox that every imaplib.IMAP4_SSL connection talks to."""
+    import imaplib
+
+    from services.imap_pool import imap_pool
+    from tests.fake_imap import FakeIMAP4, FakeMailbox
+
+    box = FakeMailbox()
+    connections = []
+
+    def connect(host, port=993):
+        conn = FakeIMAP4(box)
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(imaplib, "IMAP4_SSL", connect)
+    box.connections = connections
+    yield box
+    imap_pool.close_all()
+
+
+@pytest.fixture
+def account(db, user):
+    row = models.EmailAccount(
+        user_id=user.id,
+        email_address="alice@example.com",
+        imap_host="imap.example.com",
+        imap_username="alice",
+        imap_password="secret",
+    )
+    db.add(row)
+    db.commit()
+    return row
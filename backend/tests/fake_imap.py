@@ -0,0 +1,123 @@
+"""In-process stand-in for imaplib.IMAP4, covering what the sync code uses."""
+import re
+from typing import Dict, List, Optional, Tuple
+
+_PARTIAL_RE = re.compile(r"<(\d+)\.(\d+)>")
+
+
+class FakeMailbox:
+    def __init__(self, uidvalidity: int = 1):
+        self.uidvalidity = uidvalidity
+        self.messages: Dict[int, bytes] = {}
+        self.next_uid = 1
+        # Number of upcoming UID FETCH commands to answer with NO.
+        self.failing_fetches = 0
+
+    def add(self, raw: bytes) -> int:
+        uid = self.next_uid
+        self.messages[uid] = raw
+        self.next_uid += 1
+        return uid
+
+    def recreate(self) -> None:
+        """Simulate the server recreating the mailbox: new UIDVALIDITY, UIDs restart."""
+        messages = list(self.messages.values())
+        self.uidvalidity += 1
+        self.messages = {}
+        self.next_uid = 1
+        for raw in messages:
+            self.add(raw)
+
+
+class FakeIMAP4:
+    """Answers SELECT, UID SEARCH and UID FETCH from a FakeMailbox; records every UID command."""
+
+    def __init__(self, mailbox: FakeMailbox):
+        self.mailbox = mailbox
+        self.commands: List[Tuple] = []
+        self._responses: Dict[str, list] = {}
+
+    def login(self, user: str, password: str):
+        return "OK", [b"LOGIN completed"]
+
+    def logout(self):
+        return "BYE", [b""]
+
+    def noop(self):
+        return "OK", [b""]
+
+    def select(self, mailbox: str = "INBOX", readonly: bool = False):
+        self._responses["UIDVALIDITY"] = [str(self.mailbox.uidvalidity).encode()]
+        return "OK", [str(len(self.mailbox.messages)).encode()]
+
+    def response(self, code: str):
+        return code, self._responses.pop(code, [None])
+
+    def uid(self, command: str, *args):
+        self.commands.append((command,) + args)
+        if command == "SEARCH":
+            return "OK", [" ".join(str(u) for u in self._search(args[-1])).encode()]
+        if command == "FETCH":
+            if self.mailbox.failing_fetches:
+                self.mailbox.failing_fetches -= 1
+                return "NO", [b"FETCH failed"]
+            return "OK", self._fetch(*args)
+        raise NotImplementedError(command)
+
+    def _search(self, criteria: str) -> List[int]:
+        if criteria == "ALL":
+            return sorted(self.mailbox.messages)
+        return self._uid_set(criteria.split()[1])
+
+    def _uid_set(self, spec: str) -> List[int]:
+        uids = sorted(self.mailbox.messages)
+        highest = uids[-1] if uids else 0
+        found: List[int] = []
+        for part in spec.split(","):
+            if ":" not in part:
+                found += [int(part)] if int(part) in self.mailbox.messages else []
+                continue
+            lo, hi = part.split(":")
+            lo, hi = int(lo), highest if hi == "*" else int(hi)
+            lo, hi = min(lo, hi), max(lo, hi)
+            # RFC 3501: "n:*" always includes the highest UID.
+            found += [u for u in uids if lo <= u <= hi] or ([highest] if uids and part.endswith(":*") else [])
+        return found
+
+    def _fetch(self, spec: str, items: str) -> list:
+        data: list = []
+        for uid in self._uid_set(spec):
+            raw = self.mailbox.messages[uid]
+            partial: Optional[re.Match] = _PARTIAL_RE.search(items)
+            if "BODY.PEEK[]" in items and partial:
+                offset, length = map(int, partial.groups())
+                chunk = raw[offset : offset + length]
+                data += [(f"{uid} (UID {uid} BODY[]<{offset}> {{{len(chunk)}}}".encode(), chunk), b")"]
+                continue
+            split = raw.find(b"\r\n\r\n") + 4
+            header, text = raw[:split], raw[split:]
+            if partial:
+                text = text[: int(partial.group(2))]
+            data += [
+                (f"{uid} (UID {uid} BODY[HEADER] {{{len(header)}}}".encode(), header),
+                (f" BODY[TEXT]<0> {{{len(text)}}}".encode(), text),
+                b")",
+            ]
+        return data
+
+
+def make_message(
+    message_id: Optional[str], subject: str = "Hello", body: str = "Hi there", references: str = "", in_reply_to: str = ""
+) -> bytes:
+    headers = [f"Message-ID: <{message_id}>"] if message_id else []
+    headers += [
+        f"Subject: {subject}",
+        "From: sender@example.com",
+        "To: alice@example.com",
+        "Date: Mon, 1 Jan 2024 00:00:00 +0000",
+    ]
+    if references:
+        headers.append(f"References: {references}")
+    if in_reply_to:
+        headers.append(f"In-Reply-To: {in_reply_to}")
+    return ("\r\n".join(headers) + "\r\n\r\n" + body).encode()
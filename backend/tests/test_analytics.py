@@ -0,0 +1,94 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import models
+from services import analytics_rollup_service
+from services.analytics_rollup_service import ActiveUserRecorder, AnalyticsRollupService, bucket_start
+
+
+@pytest.fixture
+def bob(db):
+    row = models.User(username="bob", email="bob@example.com", password="x")
+    db.add(row)
+    db.commit()
+    return row
+
+
+@pytest.fixture
+def channels(db, user, bob):
+    """'shared' has both users, 'private' only alice; each has one message today."""
+    shared, private = models.Channel(name="shared"), models.Channel(name="private")
+    db.add_all([shared, private])
+    db.flush()
+    db.add_all(
+        [
+            models.ChannelMember(user_id=user.id, channel_id=shared.id),
+            models.ChannelMember(user_id=bob.id, channel_id=shared.id),
+            models.ChannelMember(user_id=user.id, channel_id=private.id),
+        ]
+    )
+    rollups = AnalyticsRollupService(db)
+    for channel in (shared, private):
+        rollups.record("messages", segments=("all", f"channel:{channel.id}", f"user:{user.id}"))
+    db.commit()
+    return shared, private
+
+
+def test_top_channels_lists_only_member_channels(client, user, bob, channels, auth_headers):
+    def names(u):
+        return {c["name"] for c in client.get("/api/analytics/top-channels", headers=auth_headers(u)).json()["channels"]}
+
+    assert names(user) == {"shared", "private"}
+    assert names(bob) == {"shared"}
+
+
+def test_channel_segments_require_membership(client, bob, channels, auth_headers):
+    _, private = channels
+    for path in (
+        f"/api/analytics/usage?segment=channel:{private.id}",
+        f"/api/analytics/heatmap?segment=channel:{private.id}",
+        f"/api/analytics/response-times?channel_id={private.id}",
+    ):
+        assert client.get(path, headers=auth_headers(bob)).status_code == 403
+
+
+def test_user_segment_is_limited_to_the_caller(client, user, bob, channels, auth_headers):
+    assert client.get(f"/api/analytics/usage?segment=user:{user.id}", headers=auth_headers(bob)).status_code == 403
+    mine = client.get(f"/api/analytics/usage?segment=user:{user.id}", headers=auth_headers(user))
+    assert mine.status_code == 200
+    assert mine.json()["messages"] == 2
+
+
+def test_project_segment_requires_ownership(client, db, user, bob, auth_headers):
+    project = models.Project(name="launch", owner_id=user.id)
+    db.add(project)
+    db.commit()
+    assert client.get(f"/api/analytics/usage?segment=project:{project.id}", headers=auth_headers(bob)).status_code == 404
+    assert client.get(f"/api/analytics/usage?segment=project:{project.id}", headers=auth_headers(user)).status_code == 200
+
+
+def test_active_user_recorder_retries_failed_merge(db, user, monkeypatch):
+    monkeypatch.setattr(analytics_rollup_service, "ACTIVE_USER_RETRY_SECONDS", 0.05)
+    merge = AnalyticsRollupService.merge_active_users
+    calls = []
+
+    def flaky_merge(self, keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        merge(self, keys)
+
+    monkeypatch.setattr(AnalyticsRollupService, "merge_active_users", flaky_merge)
+    recorder = ActiveUserRecorder()
+    recorder.add([(bucket_start(datetime.utcnow(), "day"), "channel:4242", user.id)])
+    try:
+        deadline = time.monotonic() + 5
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Retried on its own, without waiting for another add() or stop().
+        assert len(calls) == 2
+    finally:
+        recorder.stop()
+    assert AnalyticsRollupService(db).distinct_count("active_users", 1, segments=("channel:4242",)) == 1
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import models
+from routers.auth import create_access_token
+from services.api_keys import ApiKeyService
+from services.auth_sessions import AuthSessionService
+
+
+def _login(db, user):
+    jti, _ = AuthSessionService(db).create(user.id, timedelta(minutes=5))
+    return jti, create_access_token({"sub": str(user.id), "jti": jti}, timedelta(minutes=5))
+
+
+def _revoke(db, jti):
+    session = db.query(models.AuthSession).filter(models.AuthSession.jti == jti).one()
+    AuthSessionService(db).revoke([session])
+
+
+def test_notifications_ws_accepts_live_session(client, db, user):
+    _, token = _login(db, user)
+    with client.websocket_connect(f"/api/ws/notifications?token={token}") as ws:
+        assert ws.receive_json() == {"type": "connected"}
+
+
+@pytest.mark.parametrize("path", ["/api/ws/notifications", "/ws/chat/1"])
+def test_ws_handshake_refuses_revoked_session(client, db, user, path):
+    jti, token = _login(db, user)
+    _revoke(db, jti)
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect(f"{path}?token={token}"):
+            pass
+    assert exc.value.code == 4401
+
+
+@pytest.mark.parametrize(
+    "method,path",
+    [("post", "/api/auth/logout"), ("get", "/api/auth/sessions"), ("post", "/api/auth/sessions/revoke-others")],
+)
+def test_session_endpoints_reject_api_keys(client, db, user, method, path):
+    _, key = ApiKeyService(db).create(user.id, "ci")
+    response = client.request(method, path, headers={"Authorization": f"Bearer {key}"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Session endpoints require a JWT"
@@ -0,0 +1,202 @@
+import smtplib
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import database
+import models
+from services import email_outbox as outbox_module
+from services.email_outbox import EmailOutbox
+
+
+class FakeSMTP:
+    """Records what is sent; ``failures`` maps a recipient to the exceptions its next sends raise."""
+
+    def __init__(self, server, host, port=0, timeout=None):
+        self.server = server
+        self.closed = False
+        server.connections.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return (250, b"OK")
+
+    def send_message(self, msg):
+        to = msg["To"]
+        if self.server.on_send is not None:
+            self.server.on_send(to)
+        pending = self.server.failures.get(to)
+        if pending:
+            raise pending.pop(0)
+        self.server.sent.append(to)
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = SimpleNamespace(connections=[], sent=[], failures={}, on_send=None)
+    monkeypatch.setattr(smtplib, "SMTP", lambda *args, **kwargs: FakeSMTP(server, *args, **kwargs))
+    return server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Pin the outbox's notion of now; tests move it forward by hand."""
+    now = [datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)]
+    monkeypatch.setattr(outbox_module, "_now", lambda: now[0])
+    monkeypatch.setattr(outbox_module.random, "uniform", lambda a, b: 1.0)
+    return now
+
+
+@pytest.fixture
+def outbox(smtp):
+    box = EmailOutbox(workers=1)
+    yield box
+    box.stop()
+
+
+@pytest.fixture
+def smtp_account(db, account):
+    account.smtp_host = "smtp.example.com"
+    account.smtp_port = 587
+    account.smtp_username = "alice"
+    account.smtp_password = "secret"
+    db.commit()
+    return account
+
+
+def _queue(db, account, *recipients, attempts=0):
+    rows = [
+        models.OutboundEmail(
+            account_id=account.id, to_email=to, subject="s", body="b", status="queued", attempts=attempts,
+            next_attempt_at=datetime(2026, 1, 1, 11, 0, tzinfo=timezone.utc),
+        )
+        for to in recipients
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+
+def _rows(db, ids):
+    db.expire_all()
+    return [db.get(models.OutboundEmail, row_id) for row_id in ids]
+
+
+def _naive(dt):
+    return dt.replace(tzinfo=None)
+
+
+def test_transient_failures_are_retried_with_backoff(db, smtp_account, smtp, outbox, clock):
+    ids = _queue(db, smtp_account, "busy@x", "gone@x", "drop@x", "ok@x")
+    smtp.failures = {
+        "busy@x": [smtplib.SMTPResponseException(451, b"try later")],
+        "gone@x": [smtplib.SMTPResponseException(550, b"no such user")],
+        "drop@x": [smtplib.SMTPServerDisconnected("lost")],
+    }
+
+    assert outbox._send_claimed(smtp_account.id) is False
+    busy, gone, drop, ok = _rows(db, ids)
+    retry = timedelta(seconds=outbox_module.EMAIL_OUTBOX_RETRY_SECONDS)
+    assert (busy.status, busy.attempts, _naive(busy.next_attempt_at)) == ("queued", 1, _naive(clock[0] + retry))
+    assert (gone.status, gone.attempts, gone.last_error) == ("failed", 1, "(550, b'no such user')")
+    assert (drop.status, drop.attempts) == ("queued", 1)
+    assert (ok.status, ok.attempts) == ("sent", 1)
+    # A 4xx reply keeps the session; a dropped connection forces a new one for the rest.
+    assert smtp.sent == ["ok@x"]
+    assert len(smtp.connections) == 2 and smtp.connections[0].closed
+
+    # Nothing is due until the backoff has passed.
+    assert outbox._send_claimed(smtp_account.id) is False
+    assert smtp.sent == ["ok@x"]
+
+    clock[0] += retry
+    smtp.failures = {"drop@x": [smtplib.SMTPServerDisconnected("lost again")]}
+    outbox._send_claimed(smtp_account.id)
+    busy, _, drop, _ = _rows(db, ids)
+    assert (busy.status, busy.attempts, busy.last_error) == ("sent", 2, None)
+    # The second failure doubles the delay.
+    assert (drop.status, drop.attempts, _naive(drop.next_attempt_at)) == ("queued", 2, _naive(clock[0] + 2 * retry))
+
+
+def test_transient_failure_gives_up_after_max_attempts(db, smtp_account, smtp, outbox, clock):
+    (row_id,) = _queue(db, smtp_account, "busy@x", attempts=outbox_module.EMAIL_OUTBOX_MAX_ATTEMPTS - 1)
+    smtp.failures = {"busy@x": [smtplib.SMTPResponseException(421, b"closing")]}
+
+    outbox._send_claimed(smtp_account.id)
+    (row,) = _rows(db, [row_id])
+    assert (row.status, row.attempts) == ("failed", outbox_module.EMAIL_OUTBOX_MAX_ATTEMPTS)
+
+
+def test_lease_is_renewed_before_each_send(db, smtp_account, smtp, outbox, clock):
+    ids = _queue(db, smtp_account, "a@x", "b@x", "c@x")
+    lease = timedelta(seconds=outbox_module._LEASE_SECONDS)
+    leases = []
+
+    def on_send(to):
+        # Each send takes most of a lease; the next message must still be covered.
+        check = database.SessionLocal()
+        try:
+            row = check.query(models.OutboundEmail).filter_by(to_email=to).one()
+            leases.append(_naive(row.next_attempt_at) - _naive(clock[0]))
+        finally:
+            check.close()
+        clock[0] += lease - timedelta(seconds=10)
+
+    smtp.on_send = on_send
+    outbox._send_claimed(smtp_account.id)
+
+    assert smtp.sent == ["a@x", "b@x", "c@x"]
+    assert leases == [lease, lease, lease]
+    assert [row.status for row in _rows(db, ids)] == ["sent"] * 3
+
+
+def test_message_taken_over_after_lease_expiry_is_skipped(db, smtp_account, smtp, outbox, clock):
+    ids = _queue(db, smtp_account, "a@x", "b@x", "c@x")
+
+    def on_send(to):
+        if to == "a@x":
+            # Another worker reclaimed b@x while a@x was being sent.
+            other = database.SessionLocal()
+            try:
+                other.query(models.OutboundEmail).filter_by(to_email="b@x").update({"claimed_by": "other-worker"})
+                other.commit()
+            finally:
+                other.close()
+
+    smtp.on_send = on_send
+    outbox._send_claimed(smtp_account.id)
+
+    a, b, c = _rows(db, ids)
+    assert smtp.sent == ["a@x", "c@x"]
+    assert (a.status, c.status) == ("sent", "sent")
+    assert (b.status, b.claimed_by, b.attempts) == ("sending", "other-worker", 0)
+
+
+def test_expired_lease_is_reclaimed(db, smtp_account, smtp, outbox, clock):
+    # A worker died mid-chunk: the row is stuck in "sending" under its token.
+    (row_id,) = _queue(db, smtp_account, "a@x")
+    (row,) = _rows(db, [row_id])
+    row.status = "sending"
+    row.claimed_by = "dead-worker"
+    row.next_attempt_at = clock[0] + timedelta(seconds=outbox_module._LEASE_SECONDS)
+    db.commit()
+
+    outbox._send_claimed(smtp_account.id)
+    assert smtp.sent == []
+
+    clock[0] += timedelta(seconds=outbox_module._LEASE_SECONDS)
+    outbox._send_claimed(smtp_account.id)
+    (row,) = _rows(db, [row_id])
+    assert smtp.sent == ["a@x"]
+    assert row.status == "sent" and row.claimed_by != "dead-worker"
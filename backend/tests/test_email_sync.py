@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+import models
+from services.email_integration_service import EmailIntegrationService
+from services.email_sync_scheduler import EMAIL_SYNC_WORKERS, email_sync_scheduler
+from tests.fake_imap import make_message
+
+
+def _fetches(mailbox):
+    return [c for conn in mailbox.connections for c in conn.commands if c[0] == "FETCH"]
+
+
+def _message_ids(db):
+    return sorted(m for (m,) in db.query(models.EmailMessage.message_id))
+
+
+def test_first_sync_imports_everything_and_remembers_position(db, mailbox, account):
+    for i in range(3):
+        mailbox.add(make_message(f"m{i}@example.com"))
+
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 3
+    assert _message_ids(db) == ["<m0@example.com>", "<m1@example.com>", "<m2@example.com>"]
+    assert account.imap_uidvalidity == 1
+    assert account.imap_last_uid == 3
+
+
+def test_steady_state_sync_fetches_only_new_uids(db, mailbox, account):
+    mailbox.add(make_message("old@example.com"))
+    EmailIntegrationService(db).sync_inbox(account, limit=100)
+
+    before = len(_fetches(mailbox))
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 0
+    assert len(_fetches(mailbox)) == before
+
+    mailbox.add(make_message("new@example.com"))
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 1
+    assert _fetches(mailbox)[-1][1] == "2"
+    assert account.imap_last_uid == 2
+
+
+def test_uidvalidity_change_resyncs_without_duplicates(db, mailbox, account):
+    for i in range(2):
+        mailbox.add(make_message(f"m{i}@example.com"))
+    EmailIntegrationService(db).sync_inbox(account, limit=100)
+
+    mailbox.recreate()
+    mailbox.add(make_message("m2@example.com"))
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 1
+    assert account.imap_uidvalidity == 2
+    assert _message_ids(db) == ["<m0@example.com>", "<m1@example.com>", "<m2@example.com>"]
+
+
+def test_first_sync_takes_newest_then_new_mail_in_batches(db, mailbox, account):
+    for i in range(5):
+        mailbox.add(make_message(f"m{i}@example.com"))
+
+    assert EmailIntegrationService(db).sync_inbox(account, limit=2) == 2
+    assert _message_ids(db) == ["<m3@example.com>", "<m4@example.com>"]
+
+    for i in range(5, 8):
+        mailbox.add(make_message(f"m{i}@example.com"))
+    assert EmailIntegrationService(db).sync_inbox(account, limit=2) == 2
+    assert EmailIntegrationService(db).sync_inbox(account, limit=2) == 1
+    assert EmailIntegrationService(db).sync_inbox(account, limit=2) == 0
+    assert account.imap_last_uid == 8
+
+
+def test_failed_fetch_aborts_sync_without_skipping_mail(db, mailbox, account, monkeypatch):
+    monkeypatch.setattr("services.email_integration_service.FETCH_BATCH_SIZE", 2)
+    for i in range(4):
+        mailbox.add(make_message(f"m{i}@example.com"))
+    mailbox.failing_fetches = 1
+
+    with pytest.raises(ValueError):
+        EmailIntegrationService(db).sync_inbox(account, limit=100)
+    db.rollback()
+    assert not account.imap_last_uid
+
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 4
+    assert _message_ids(db) == [f"<m{i}@example.com>" for i in range(4)]
+
+
+def test_messages_without_message_id_survive_uidvalidity_reset(db, mailbox, account):
+    mailbox.add(make_message(None, subject="Cron report", body="all good"))
+    mailbox.add(make_message(None, subject="Cron report", body="disk full"))
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 2
+
+    mailbox.recreate()
+    assert EmailIntegrationService(db).sync_inbox(account, limit=100) == 0
+    assert db.query(models.EmailMessage).count() == 2
+
+
+def test_sync_all_shares_one_bounded_pool(db, mailbox, account, monkeypatch):
+    mailbox.add(make_message("m0@example.com"))
+    names = set()
+    original = email_sync_scheduler.sync_account
+
+    def sync_account(*args, **kwargs):
+        names.add(threading.current_thread().name)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(email_sync_scheduler, "sync_account", sync_account)
+    for _ in range(EMAIL_SYNC_WORKERS + 2):
+        (result,) = email_sync_scheduler.sync_accounts([account.id])
+        assert result["status"] == "ok"
+    assert len(names) <= EMAIL_SYNC_WORKERS
+    assert all(name.startswith("email-sync-manual") for name in names)
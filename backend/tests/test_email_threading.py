@@ -0,0 +1,94 @@
+import pytest
+
+import models
+from services.email_integration_service import EmailIntegrationService
+from services.email_threading import normalize_subject, reference_chain
+from services.inbox_summary_service import InboxSummaryService
+from tests.fake_imap import make_message
+
+
+def _sync(db, account):
+    return EmailIntegrationService(db).sync_inbox(account, limit=100)
+
+
+def _thread_of(db, message_id):
+    return (
+        db.query(models.EmailMessage.thread_id)
+        .filter(models.EmailMessage.message_id == f"<{message_id}>")
+        .scalar()
+    )
+
+
+def _pin(db, user, thread_id):
+    db.add(models.InboxPin(user_id=user.id, source="email", source_id=thread_id))
+    db.commit()
+
+
+def _email_counts(db, user):
+    db.expire_all()
+    return InboxSummaryService(db).get_summary(user.id)["sources"]["email"]
+
+
+def test_reference_chain_appends_in_reply_to():
+    assert reference_chain("<a@x> <b@x>", "<c@x>") == ["<a@x>", "<b@x>", "<c@x>"]
+    assert reference_chain("<a@x> <b@x>", "<b@x>") == ["<a@x>", "<b@x>"]
+    assert reference_chain(None, "<a@x>") == ["<a@x>"]
+
+
+def test_normalize_subject_strips_prefixes_and_list_tags():
+    assert normalize_subject("Re: [dev] Fwd:  Build   Broken") == ("build broken", True)
+    assert normalize_subject("Build broken") == ("build broken", False)
+
+
+def test_replies_join_by_references_and_in_reply_to(db, mailbox, account):
+    mailbox.add(make_message("root@x", subject="Plan"))
+    mailbox.add(make_message("r1@x", subject="Re: Plan", in_reply_to="<root@x>"))
+    mailbox.add(make_message("r2@x", subject="Re: Plan", references="<root@x> <r1@x>"))
+    mailbox.add(make_message("other@x", subject="Plan"))
+    _sync(db, account)
+
+    root = _thread_of(db, "root@x")
+    assert _thread_of(db, "r1@x") == root
+    assert _thread_of(db, "r2@x") == root
+    assert _thread_of(db, "other@x") != root
+
+
+def test_reply_arriving_before_its_parent_shares_a_thread(db, mailbox, account):
+    mailbox.add(make_message("r1@x", subject="Re: Plan", references="<root@x>"))
+    _sync(db, account)
+    mailbox.add(make_message("root@x", subject="Plan"))
+    _sync(db, account)
+
+    assert _thread_of(db, "root@x") == _thread_of(db, "r1@x")
+    assert db.query(models.EmailThread).count() == 1
+
+
+def test_subject_fallback_only_for_replies(db, mailbox, account):
+    mailbox.add(make_message("a@x", subject="Budget"))
+    _sync(db, account)
+    mailbox.add(make_message("b@x", subject="RE: budget"))
+    mailbox.add(make_message("c@x", subject="Budget"))
+    _sync(db, account)
+
+    assert _thread_of(db, "b@x") == _thread_of(db, "a@x")
+    assert _thread_of(db, "c@x") != _thread_of(db, "a@x")
+
+
+@pytest.mark.parametrize("pinned", [("b",), ("a", "b")])
+def test_merge_carries_pins_to_surviving_thread(db, mailbox, account, user, pinned):
+    mailbox.add(make_message("a@x", subject="One"))
+    mailbox.add(make_message("b@x", subject="Two"))
+    _sync(db, account)
+    threads = {name: _thread_of(db, f"{name}@x") for name in ("a", "b")}
+    for name in pinned:
+        _pin(db, user, threads[name])
+    assert _email_counts(db, user) == {"unread": 2, "pinned": len(pinned)}
+
+    # A message referencing both shows they are one conversation.
+    mailbox.add(make_message("c@x", subject="Re: One", references="<a@x> <b@x>"))
+    _sync(db, account)
+
+    survivor = _thread_of(db, "a@x")
+    assert {_thread_of(db, f"{name}@x") for name in ("a", "b", "c")} == {survivor}
+    assert [p.source_id for p in db.query(models.InboxPin)] == [survivor]
+    assert _email_counts(db, user) == {"unread": 1, "pinned": 1}
@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import models
+from services.inbox_summary_service import InboxSummaryService
+
+
+@pytest.fixture
+def email_threads(db, user):
+    """Two threads on one account, each with an unread message; both pinned."""
+    account = models.EmailAccount(user_id=user.id, email_address="alice@example.com")
+    db.add(account)
+    db.flush()
+    threads = [models.EmailThread(account_id=account.id, thread_key=f"t{i}") for i in range(2)]
+    db.add_all(threads)
+    db.flush()
+    for i, thread in enumerate(threads):
+        db.add(models.EmailMessage(account_id=account.id, thread_id=thread.id, message_id=f"<m{i}@example.com>"))
+        db.add(models.InboxPin(user_id=user.id, source="email", source_id=thread.id))
+    db.commit()
+    return account, threads
+
+
+def _email_counts(db, user):
+    db.expire_all()
+    return InboxSummaryService(db).get_summary(user.id)["sources"]["email"]
+
+
+def test_summary_seeds_from_primary_not_replica(db, user, email_threads, tmp_path):
+    # An empty database stands in for a replica that hasn't caught up.
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    database.Base.metadata.create_all(replica)
+    read_db = database.read_session(use_replica=False)
+    read_db.replica = replica
+    try:
+        assert InboxSummaryService(read_db).get_summary(user.id)["sources"]["email"] == {"unread": 2, "pinned": 2}
+    finally:
+        read_db.close()
+        replica.dispose()
+
+
+def test_delete_account_drops_thread_pins(client, db, user, email_threads, auth_headers):
+    account, _ = email_threads
+    assert _email_counts(db, user) == {"unread": 2, "pinned": 2}
+
+    assert client.delete(f"/api/email/accounts/{account.id}", headers=auth_headers(user)).status_code == 200
+    assert db.query(models.InboxPin).count() == 0
+    assert _email_counts(db, user) == {"unread": 0, "pinned": 0}
+
+
+@pytest.fixture
+def notifications(db, user):
+    """An unread notification for alice and one belonging to someone else."""
+    other = models.User(username="bob", email="bob@example.com", password="x")
+    db.add(other)
+    db.flush()
+    mine = models.Notification(user_id=user.id, type="system", title="Hello")
+    theirs = models.Notification(user_id=other.id, type="system", title="Private")
+    db.add_all([mine, theirs])
+    db.commit()
+    return mine, theirs
+
+
+def _results(response):
+    assert response.status_code == 200
+    body = response.json()
+    return [(r["source"], r["source_id"], r["ok"], r["changed"], r["error"]) for r in body["results"]], body["updated"]
+
+
+def test_bulk_pin_with_mixed_items(client, db, user, notifications, auth_headers):
+    mine, _ = notifications
+    items = [
+        {"source": "notification", "source_id": mine.id},
+        {"source": "calendar", "source_id": 1},
+        {"source": "task", "source_id": 77},
+        {"source": "notification", "source_id": mine.id},
+    ]
+    InboxSummaryService(db).get_summary(user.id)
+
+    results, updated = _results(client.put("/api/inbox/bulk/pin", json={"items": items, "pinned": True}, headers=auth_headers(user)))
+    assert results == [
+        ("notification", mine.id, True, True, None),
+        ("calendar", 1, False, False, "Unsupported source"),
+        ("task", 77, True, True, None),
+    ]
+    assert updated == 2
+
+    # Pinning again changes nothing; unpinning drops both pins.
+    results, updated = _results(client.put("/api/inbox/bulk/pin", json={"items": items, "pinned": True}, headers=auth_headers(user)))
+    assert updated == 0 and not any(changed for *_, changed, _ in results)
+    db.expire_all()
+    assert InboxSummaryService(db).get_summary(user.id)["pinned_count"] == 2
+
+    _, updated = _results(client.put("/api/inbox/bulk/pin", json={"items": items, "pinned": False}, headers=auth_headers(user)))
+    assert updated == 2
+    db.expire_all()
+    assert InboxSummaryService(db).get_summary(user.id)["pinned_count"] == 0
+    assert db.query(models.InboxPin).count() == 0
+
+
+def test_bulk_read_with_mixed_items(client, db, user, notifications, email_threads, auth_headers):
+    mine, theirs = notifications
+    _, threads = email_threads
+    assert InboxSummaryService(db).get_summary(user.id)["unread_count"] == 3
+
+    items = [
+        {"source": "notification", "source_id": mine.id},
+        {"source": "notification", "source_id": theirs.id},
+        {"source": "email", "source_id": threads[0].id},
+        {"source": "email", "source_id": 9999},
+        {"source": "task", "source_id": 1},
+    ]
+    results, updated = _results(client.put("/api/inbox/bulk/read", json={"items": items, "is_read": True}, headers=auth_headers(user)))
+    assert results == [
+        ("notification", mine.id, True, True, None),
+        ("notification", theirs.id, False, False, "Not found"),
+        ("email", threads[0].id, True, True, None),
+        ("email", 9999, False, False, "Not found"),
+        ("task", 1, False, False, "Read/unread not supported for this source"),
+    ]
+    assert updated == 2
+
+    db.expire_all()
+    assert db.get(models.Notification, theirs.id).is_read is False
+    summary = InboxSummaryService(db).get_summary(user.id)
+    assert summary["sources"]["notification"]["unread"] == 0
+    assert summary["sources"]["email"]["unread"] == 1
+    assert summary["unread_count"] == 1
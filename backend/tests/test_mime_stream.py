@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from services.mime_stream import StreamingMimeParser
+
+
+def _parse(raw: bytes, directory, chunk: int = 977, **kwargs) -> StreamingMimeParser:
+    parser = StreamingMimeParser(str(directory), **kwargs)
+    for i in range(0, len(raw), chunk):
+        parser.feed(raw[i : i + chunk])
+    parser.close()
+    return parser
+
+
+def _multipart(*parts: bytes) -> bytes:
+    body = b"".join(b"--b1\r\n" + part + b"\r\n" for part in parts)
+    return (
+        b"Subject: hi\r\nMIME-Version: 1.0\r\n"
+        b'Content-Type: multipart/mixed; boundary="b1"\r\n\r\n'
+        b"preamble\r\n" + body + b"--b1--\r\nepilogue\r\n"
+    )
+
+
+def _base64_part(headers: bytes, payload: bytes) -> bytes:
+    encoded = base64.encodebytes(payload).replace(b"\n", b"\r\n")
+    return headers + b"Content-Transfer-Encoding: base64\r\n\r\n" + encoded.rstrip(b"\r\n")
+
+
+def test_attachments_spill_to_disk_by_sha256(tmp_path):
+    payload = os.urandom(300 * 1024)
+    raw = _multipart(
+        b"Content-Type: text/plain; charset=utf-8\r\n\r\nSee attached.",
+        _base64_part(b'Content-Type: application/pdf\r\nContent-Disposition: attachment; filename="a.pdf"\r\n', payload),
+        _base64_part(b"Content-Type: image/png\r\nContent-Disposition: inline\r\nContent-ID: <logo@x>\r\n", payload),
+    )
+    parser = _parse(raw, tmp_path)
+
+    digest = hashlib.sha256(payload).hexdigest()
+    assert parser.texts == {"text/plain": "See attached."}
+    assert parser.attachments == [
+        {"content_type": "application/pdf", "filename": "a.pdf", "content_id": None, "inline": False, "sha256": digest, "size": len(payload)},
+        {"content_type": "image/png", "filename": "", "content_id": "logo@x", "inline": True, "sha256": digest, "size": len(payload)},
+    ]
+    # Identical content is stored once and no temp files are left behind.
+    assert os.listdir(tmp_path) == [digest]
+    assert (tmp_path / digest).read_bytes() == payload
+
+
+def test_long_unbroken_attachment_lines_are_not_buffered_whole(tmp_path):
+    payload = b"x" * (200 * 1024) + b"\r\n--b1 is not a boundary mid-file"
+    raw = _multipart(b"Content-Type: application/octet-stream\r\n\r\n" + payload)
+    parser = _parse(raw, tmp_path, chunk=4096)
+
+    (attachment,) = parser.attachments
+    assert (tmp_path / attachment["sha256"]).read_bytes() == payload
+
+
+def test_abort_removes_partial_attachment(tmp_path):
+    raw = _multipart(_base64_part(b"Content-Type: application/zip\r\n", os.urandom(64 * 1024)))
+    parser = StreamingMimeParser(str(tmp_path))
+    parser.feed(raw[: len(raw) // 2])
+    assert len(os.listdir(tmp_path)) == 1  # the .part- temp file
+
+    parser.abort()
+    assert os.listdir(tmp_path) == []
+    assert parser.attachments == []
+
+
+@pytest.mark.parametrize(
+    "charset,body,expected",
+    [
+        ("iso-8859-1", "café".encode("latin-1"), "café"),
+        ("x-unknown-8bit", "café".encode("utf-8"), "café"),
+        ("x-unknown-8bit", b"caf\xe9", "caf�"),
+        (None, "naïve".encode("utf-8"), "naïve"),
+    ],
+)
+def test_text_charset_fallback(tmp_path, charset, body, expected):
+    content_type = b"text/plain" + (f"; charset={charset}".encode() if charset else b"")
+    raw = b"Subject: hi\r\nContent-Type: " + content_type + b"\r\nContent-Transfer-Encoding: 8bit\r\n\r\n" + body
+    parser = _parse(raw, tmp_path)
+
+    assert parser.texts == {"text/plain": expected}
+    assert parser.attachments == []
+
+
+def test_text_bodies_are_capped_and_first_of_each_type_wins(tmp_path):
+    raw = _multipart(
+        b"Content-Type: text/plain\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n" + b"ab=3D" * 10,
+        b"Content-Type: text/plain\r\n\r\nsecond body",
+        b"Content-Type: text/html\r\n\r\n<p>hi</p>",
+    )
+    parser = _parse(raw, tmp_path, chunk=7, text_limit=8)
+
+    assert parser.texts == {"text/plain": "ab=ab=ab", "text/html": "<p>hi</p"}
+    assert os.listdir(tmp_path) == []
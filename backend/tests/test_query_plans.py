@@ -0,0 +1,121 @@
+"""EXPLAIN the hot router queries on PostgreSQL and fail on sequential scans.
+
+Needs an empty scratch database: set TEST_POSTGRES_URL (e.g.
+postgresql://postgres@localhost/teamos_plans). The inbox search checks
+also need the pg_trgm extension (contrib) and are skipped without it. Tables are created from
+the models, filled with enough rows that the planner prefers an index
+whenever a usable one exists, and dropped afterwards.
+"""
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine, or_, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+# Tables large enough in the fixture that a Seq Scan on them is a regression.
+LARGE_TABLES = {"messages", "channel_members", "notifications", "email_messages", "email_threads", "tasks"}
+
+FIXTURE_SQL = """
+INSERT INTO users (id, username, email, password)
+    SELECT i, 'user' || i, 'user' || i || '@example.com', '' FROM generate_series(1, 2000) i;
+INSERT INTO channels (id, name, is_private)
+    SELECT i, 'channel' || i, false FROM generate_series(1, 500) i;
+INSERT INTO channel_members (user_id, channel_id, role)
+    SELECT u, c, 'member' FROM generate_series(1, 2000) u, generate_series(1, 20) k,
+        LATERAL (SELECT 1 + (u * 7 + k * 31) % 500 AS c) p;
+INSERT INTO messages (content, timestamp, message_type, sender_id, channel_id)
+    SELECT 'hello', now() - (i || ' seconds')::interval, 'text', 1 + i % 2000, 1 + i % 500
+    FROM generate_series(1, 200000) i;
+INSERT INTO notifications (user_id, type, title, is_read, created_at)
+    SELECT 1 + i % 2000, 'message', 'n', i % 3 = 0, now() - (i || ' seconds')::interval
+    FROM generate_series(1, 200000) i;
+INSERT INTO tasks (title, status, assigned_user_id)
+    SELECT 'task', 'TODO', 1 + i % 2000 FROM generate_series(1, 100000) i;
+INSERT INTO email_accounts (id, user_id, email_address)
+    SELECT i, i, 'user' || i || '@example.com' FROM generate_series(1, 2000) i;
+INSERT INTO email_threads (id, account_id, thread_key, subject, updated_at)
+    SELECT i, 1 + i % 2000, 'key' || i, 'subject', now() - (i || ' seconds')::interval
+    FROM generate_series(1, 100000) i;
+INSERT INTO email_messages (account_id, thread_id, message_id, subject, is_read)
+    SELECT 1 + (i % 100000) % 2000, 1 + i % 100000, '<' || i || '@example.com>', 's', i % 4 <> 0
+    FROM generate_series(1, 200000) i;
+"""
+
+
+@pytest.fixture(scope="module")
+def pg():
+    engine = create_engine(TEST_POSTGRES_URL)
+    database.Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as conn:
+            for statement in FIXTURE_SQL.split(";"):
+                if statement.strip():
+                    conn.execute(text(statement))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE"))
+        with Session(engine) as session:
+            yield session
+    finally:
+        database.Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def _seq_scans(plan: dict) -> set:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan":
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= _seq_scans(child)
+    return found
+
+
+m = models
+
+# name -> query as the routers build it, on hot paths covered by an index.
+HOT_QUERIES = {
+    "chat.channel_messages": lambda db: db.query(m.Message)
+    .filter(m.Message.channel_id == 7)
+    .order_by(m.Message.timestamp.desc())
+    .limit(50),
+    "chat.membership": lambda db: db.query(m.ChannelMember).filter(
+        m.ChannelMember.channel_id == 7, m.ChannelMember.user_id == 42
+    ),
+    "channels.for_user": lambda db: db.query(m.ChannelMember.channel_id).filter(m.ChannelMember.user_id == 42),
+    "users.messages_by_sender": lambda db: db.query(m.Message.id).filter(m.Message.sender_id == 42),
+    "notifications.unread": lambda db: db.query(m.Notification)
+    .filter(m.Notification.user_id == 42, m.Notification.is_read == False)  # noqa: E712
+    .order_by(m.Notification.created_at.desc())
+    .limit(50),
+    "email.account_threads": lambda db: db.query(m.EmailThread)
+    .filter(m.EmailThread.account_id == 42)
+    .order_by(m.EmailThread.updated_at.desc())
+    .limit(50),
+    "inbox.unread_threads": lambda db: db.query(m.EmailMessage.thread_id)
+    .filter(m.EmailMessage.thread_id.in_([1, 2, 3]), m.EmailMessage.is_read == False)  # noqa: E712
+    .distinct(),
+    "tasks.assigned": lambda db: db.query(m.Task).filter(m.Task.assigned_user_id == 42),
+    "inbox.search_messages": lambda db: db.query(m.Message.id).filter(m.Message.content.ilike("%zebra%")),
+    "inbox.search_tasks": lambda db: db.query(m.Task.id).filter(
+        or_(m.Task.title.ilike("%zebra%"), m.Task.description.ilike("%zebra%"))
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(pg, name):
+    if name.startswith("inbox.search") and not pg.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+        pytest.skip("pg_trgm is not available on this server")
+    query = HOT_QUERIES[name](pg)
+    sql = str(query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    (plan,) = pg.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    scanned = _seq_scans(plan["Plan"]) & LARGE_TABLES
+    assert not scanned, f"{name} seq-scans {sorted(scanned)}:\n{json.dumps(plan, indent=1)}"
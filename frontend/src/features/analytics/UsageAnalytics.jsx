@@ -11,7 +11,7 @@ import {
   Calendar,
   Filter,
 } from 'lucide-react';
-import { getUsageAnalytics } from '../../services/analyticsService';
+import { getUsageAnalytics, getTopChannels } from '../../services/analyticsService';
 
 function Pill({ children, tone = 'neutral' }) {
   const cls =
@@ -89,6 +89,13 @@ export default function UsageAnalytics() {
   const [segment, setSegment] = useState('all');
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [channels, setChannels] = useState([]);
+
+  useEffect(() => {
+    getTopChannels(range)
+      .then((res) => setChannels(res.channels || []))
+      .catch((error) => console.error('Failed to load top channels:', error));
+  }, [range]);
 
   useEffect(() => {
     const loadAnalytics = async () => {
@@ -146,8 +153,11 @@ export default function UsageAnalytics() {
                 className="px-3 py-2 rounded-xl border border-secondary-200 dark:border-secondary-700 bg-white dark:bg-secondary-800 text-secondary-900 dark:text-white"
               >
                 <option value="all">All users</option>
-                <option value="admins">Admins</option>
-                <option value="guests">Guests</option>
+                {channels.map((c) => (
+                  <option key={c.channel_id} value={`channel:${c.channel_id}`}>
+                    #{c.name || c.channel_id}
+                  </option>
+                ))}
               </select>
             </div>
 
@@ -160,6 +170,7 @@ export default function UsageAnalytics() {
               >
                 <option value="7d">Last 7 days</option>
                 <option value="30d">Last 30 days</option>
+                <option value="90d">Last 90 days</option>
               </select>
             </div>
 
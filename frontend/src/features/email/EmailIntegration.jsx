@@ -182,7 +182,7 @@ export default function EmailIntegration() {
     setIsLoading(true);
     setError('');
     try {
-      const data = await listThreadMessages(threadId);
+      const data = await listThreadMessages(threadId, true);
       setThreadMessages(data || []);
     } catch (e) {
       setError('Failed to load message.');
@@ -346,7 +346,7 @@ export default function EmailIntegration() {
     }
 
     const bodyText = (threadMessages || [])
-      .map((m) => m.body_preview)
+      .map((m) => m.body_text || m.body_preview)
       .filter(Boolean)
       .join('\n\n');
 
@@ -9,3 +9,26 @@ export const getUsageAnalytics = async (range = '7d', segment = 'all') => {
   const res = await api.get(`/analytics/usage?range=${range}&segment=${segment}`);
   return res.data;
 };
+
+export const getTopChannels = async (range = '7d', n = 10) => {
+  const res = await api.get('/analytics/top-channels', { params: { range, n } });
+  return res.data;
+};
+
+export const getActivityHeatmap = async (range = '30d', segment = 'all') => {
+  const res = await api.get('/analytics/heatmap', { params: { range, segment } });
+  return res.data;
+};
+
+export const getResponseTimes = async (range = '7d', channelId) => {
+  const res = await api.get('/analytics/response-times', { params: { range, channel_id: channelId } });
+  return res.data;
+};
+
+export const exportUsageData = async ({ dataset = 'messages', format = 'csv', start, end } = {}) => {
+  const res = await api.get('/analytics/export', {
+    params: { dataset, format, start, end },
+    responseType: 'blob',
+  });
+  return res.data;
+};
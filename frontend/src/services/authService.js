@@ -39,6 +39,11 @@ export const getCurrentUser = () => {
 };
 
 export const logoutUser = () => {
+  const token = localStorage.getItem('access_token');
+  if (token) {
+    // Revoke the session server-side; local sign-out does not wait for it.
+    api.post('/auth/logout', null, { headers: { Authorization: `Bearer ${token}` } }).catch(() => {});
+  }
   localStorage.removeItem('access_token');
   localStorage.removeItem('currentUser');
   localStorage.removeItem('darkMode');
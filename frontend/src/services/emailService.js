@@ -20,6 +20,16 @@ export const syncEmailAccount = async (accountId, limit = 25) => {
   return res.data;
 };
 
+export const syncAllEmailAccounts = async (limit = 25) => {
+  const res = await api.post(`/email/accounts/sync-all?limit=${limit}`);
+  return res.data;
+};
+
+export const getEmailSyncStatus = async (accountId) => {
+  const res = await api.get(`/email/accounts/${accountId}/sync-status`);
+  return res.data;
+};
+
 export const listEmailThreads = async (accountId) => {
   const res = await api.get(`/email/accounts/${accountId}/threads`);
   return res.data;
@@ -30,8 +40,8 @@ export const listEmailThreadsPaged = async (accountId, skip = 0, limit = 50) =>
   return res.data;
 };
 
-export const listThreadMessages = async (threadId) => {
-  const res = await api.get(`/email/threads/${threadId}/messages`);
+export const listThreadMessages = async (threadId, withBody = false) => {
+  const res = await api.get(`/email/threads/${threadId}/messages${withBody ? '?with_body=true' : ''}`);
   return res.data;
 };
 
@@ -40,6 +50,11 @@ export const listThreadMessagesPaged = async (threadId, skip = 0, limit = 100) =
   return res.data;
 };
 
+export const getEmailMessage = async (messageId) => {
+  const res = await api.get(`/email/messages/${messageId}`);
+  return res.data;
+};
+
 export const markEmailMessageRead = async (messageId, isRead = true) => {
   const res = await api.put(`/email/messages/${messageId}/read`, { is_read: isRead });
   return res.data;
@@ -21,3 +21,24 @@ export const markAllInboxRead = async ({ source = 'all' } = {}) => {
   const res = await api.put('/inbox/read/all', null, { params: { source } });
   return res.data;
 };
+
+export const getInboxSummary = async () => {
+  const res = await api.get('/inbox/summary');
+  return res.data;
+};
+
+export const setInboxItemsPinned = async (items, pinned) => {
+  const res = await api.put('/inbox/bulk/pin', {
+    items: items.map(({ source, sourceId }) => ({ source, source_id: sourceId })),
+    pinned: Boolean(pinned),
+  });
+  return res.data;
+};
+
+export const setInboxItemsRead = async (items, isRead) => {
+  const res = await api.put('/inbox/bulk/read', {
+    items: items.map(({ source, sourceId }) => ({ source, source_id: sourceId })),
+    is_read: Boolean(isRead),
+  });
+  return res.data;
+};
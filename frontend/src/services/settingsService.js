@@ -59,3 +59,8 @@ export const createApiKey = async (keyData) => {
   const response = await api.post('/settings/api-keys', keyData);
   return response.data;
 };
+
+export const deleteApiKey = async (keyId) => {
+  const response = await api.delete(`/settings/api-keys/${keyId}`);
+  return response.data;
+};